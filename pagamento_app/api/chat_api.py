@@ -3,16 +3,81 @@ API para o Assistente Virtual de Pagamentos.
 Responsável por expor endpoints para interação com o assistente.
 """
 
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 from ..services.dialog_manager import DialogManager
+from ..integrations.streaming import evento_sse
+from ..middleware import verificar_equipe
 from ..services.payment_service import PaymentService
+from ..utils.metrics import metrics
 
-# Inicializar serviços
+# Inicializar serviços (os modelos de NLP são carregados sob demanda)
 dialog_manager = DialogManager()
 payment_service = PaymentService()
 
+def _dados_sessao(request):
+    """
+    Obtém o ID da sessão (criando-a se necessário) e os dados do usuário.
+    
+    Args:
+        request: Requisição HTTP
+        
+    Returns:
+        tuple: (session_id, user_data)
+    """
+    session_id = request.session.session_key or request.session.create()
+    user_data = {
+        "nome": request.session.get("nome", "Usuário"),
+        "email": request.session.get("email")
+    }
+    return session_id, user_data
+
+def _processar_acoes_pagamento(resposta, user_data):
+    """
+    Gera os dados de pagamento (PIX ou boleto) pedidos nas ações da resposta.
+    
+    Args:
+        resposta (dict): Resposta do gerenciador de diálogos
+        user_data (dict): Dados do usuário
+    """
+    if resposta.get("acoes", {}).get("payment_required"):
+        # Processar ações de pagamento
+        acoes = resposta["acoes"]
+        metodo = acoes.get("payment_method")
+        plano_id = acoes.get("plan_id")
+
+        # Preparar resposta com dados de pagamento
+        if metodo == "pix":
+            # Processar pagamento PIX
+            resultado_pix = payment_service.processar_pagamento(
+                "pix", 
+                plano_id, 
+                user_data
+            )
+
+            if resultado_pix["sucesso"]:
+                # Adicionar dados do PIX à resposta
+                acoes["pix_code"] = resultado_pix["dados"]["codigo_pix"]
+                acoes["qr_code"] = resultado_pix["dados"]["qr_code"]
+                acoes["transaction_id"] = resultado_pix["dados"]["transaction_id"]
+
+        elif metodo == "boleto":
+            # Processar pagamento Boleto
+            resultado_boleto = payment_service.processar_pagamento(
+                "boleto", 
+                plano_id, 
+                user_data
+            )
+
+            if resultado_boleto["sucesso"]:
+                # Adicionar dados do boleto à resposta
+                acoes["barcode"] = resultado_boleto["dados"]["codigo_barras"]
+                acoes["payment_url"] = resultado_boleto["dados"]["url_boleto"]
+                acoes["transaction_id"] = resultado_boleto["dados"]["transaction_id"]
+
 @csrf_exempt
 def chatbot_response(request):
     """
@@ -25,14 +90,7 @@ def chatbot_response(request):
         JsonResponse: Resposta do assistente
     """
     if request.method == "POST":
-        # Obter ID da sessão
-        session_id = request.session.session_key or request.session.create()
-        
-        # Obter dados do usuário da sessão
-        user_data = {
-            "nome": request.session.get("nome", "Usuário"),
-            "email": request.session.get("email")
-        }
+        session_id, user_data = _dados_sessao(request)
         
         try:
             # Processar dados da requisição
@@ -47,45 +105,64 @@ def chatbot_response(request):
             )
             
             # Verificar se há ações de pagamento
-            if resposta.get("acoes", {}).get("payment_required"):
-                # Processar ações de pagamento
-                acoes = resposta["acoes"]
-                metodo = acoes.get("payment_method")
-                plano_id = acoes.get("plan_id")
-                
-                # Preparar resposta com dados de pagamento
-                if metodo == "pix":
-                    # Processar pagamento PIX
-                    resultado_pix = payment_service.processar_pagamento(
-                        "pix", 
-                        plano_id, 
-                        user_data
-                    )
-                    
-                    if resultado_pix["sucesso"]:
-                        # Adicionar dados do PIX à resposta
-                        acoes["pix_code"] = resultado_pix["dados"]["codigo_pix"]
-                        acoes["qr_code"] = resultado_pix["dados"]["qr_code"]
-                        acoes["transaction_id"] = resultado_pix["dados"]["transaction_id"]
-                
-                elif metodo == "boleto":
-                    # Processar pagamento Boleto
-                    resultado_boleto = payment_service.processar_pagamento(
-                        "boleto", 
-                        plano_id, 
-                        user_data
-                    )
-                    
-                    if resultado_boleto["sucesso"]:
-                        # Adicionar dados do boleto à resposta
-                        acoes["barcode"] = resultado_boleto["dados"]["codigo_barras"]
-                        acoes["payment_url"] = resultado_boleto["dados"]["url_boleto"]
-                        acoes["transaction_id"] = resultado_boleto["dados"]["transaction_id"]
+            _processar_acoes_pagamento(resposta, user_data)
             
             # Retornar resposta formatada
             return JsonResponse({
                 "resposta": resposta["texto"],
-                "acoes": resposta.get("acoes", {})
+                "acoes": resposta.get("acoes", {}),
+                "camada": resposta.get("camada")
+            })
+            
+        except json.JSONDecodeError:
+            return JsonResponse({
+                "resposta": "Erro ao processar a mensagem. Formato JSON inválido.",
+                "acoes": {}
+            })
+        except Exception as e:
+            print(f"Erro ao processar a mensagem: {e}")
+            return JsonResponse({
+                "resposta": f"Desculpe, ocorreu um erro ao processar sua mensagem. Por favor, tente novamente.",
+                "acoes": {}
+            })
+    
+    return JsonResponse({
+        "resposta": "Use o chat para enviar mensagens.",
+        "acoes": {}
+    })
+
+async def chatbot_response_async(request):
+    """
+    Versão assíncrona do endpoint do chatbot, para execução sob ASGI.
+    
+    A sessão e a análise da mensagem rodam em threads; a chamada à API de
+    LLM é aguardada no laço de eventos, sem ocupar uma thread por conversa.
+    
+    Args:
+        request: Requisição HTTP
+        
+    Returns:
+        JsonResponse: Resposta do assistente
+    """
+    if request.method == "POST":
+        session_id, user_data = await sync_to_async(_dados_sessao)(request)
+        
+        try:
+            data = json.loads(request.body)
+            entrada_usuario = data.get("mensagem", "")
+            
+            resposta = await dialog_manager.aprocessar_mensagem(
+                entrada_usuario, 
+                session_id, 
+                user_data
+            )
+            
+            await sync_to_async(_processar_acoes_pagamento)(resposta, user_data)
+            
+            return JsonResponse({
+                "resposta": resposta["texto"],
+                "acoes": resposta.get("acoes", {}),
+                "camada": resposta.get("camada")
             })
             
         except json.JSONDecodeError:
@@ -105,6 +182,100 @@ def chatbot_response(request):
         "acoes": {}
     })
 
+# O decorador csrf_exempt do Django 3.2 não preserva views assíncronas
+chatbot_response_async.csrf_exempt = True
+
+@csrf_exempt
+def chatbot_response_stream(request):
+    """
+    Endpoint que entrega a resposta do chatbot em fluxo (Server-Sent Events).
+    
+    Eventos enviados, nesta ordem:
+        inicio: intenção, camada e ações da resposta
+        trecho: parte do texto, à medida que é gerada
+        campo: campo do envelope da API de LLM (nome e valor), assim que concluído
+        fim: texto completo da resposta
+    Em caso de erro, um evento `erro` encerra o fluxo.
+    
+    Args:
+        request: Requisição HTTP
+        
+    Returns:
+        StreamingHttpResponse: Fluxo `text/event-stream`
+    """
+    if request.method != "POST":
+        return JsonResponse({
+            "resposta": "Use o chat para enviar mensagens.",
+            "acoes": {}
+        })
+    
+    session_id, user_data = _dados_sessao(request)
+    
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({
+            "resposta": "Erro ao processar a mensagem. Formato JSON inválido.",
+            "acoes": {}
+        })
+    entrada_usuario = data.get("mensagem", "")
+    
+    def eventos():
+        """Gera os eventos SSE da resposta."""
+        try:
+            resposta, eventos_resposta = dialog_manager.processar_mensagem_stream(
+                entrada_usuario, 
+                session_id, 
+                user_data
+            )
+            _processar_acoes_pagamento(resposta, user_data)
+            
+            yield evento_sse("inicio", {
+                "intencao": resposta.get("intencao"),
+                "camada": resposta.get("camada"),
+                "acoes": resposta.get("acoes", {})
+            })
+            
+            texto = []
+            for evento in eventos_resposta:
+                if evento[0] == "resposta":
+                    texto.append(evento[1])
+                    yield evento_sse("trecho", {"texto": evento[1]})
+                else:
+                    yield evento_sse("campo", {"nome": evento[1], "valor": evento[2]})
+            
+            yield evento_sse("fim", {"resposta": "".join(texto)})
+        except Exception as e:
+            print(f"Erro ao processar a mensagem: {e}")
+            yield evento_sse("erro", {
+                "resposta": "Desculpe, ocorreu um erro ao processar sua mensagem. Por favor, tente novamente."
+            })
+    
+    response = StreamingHttpResponse(eventos(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Impede que proxies como o nginx acumulem o fluxo antes de repassá-lo
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+def metricas(request):
+    """
+    Endpoint para consultar as métricas do processo.
+    
+    Os contadores revelam detalhes internos (endpoints, filas, erros), então
+    só a equipe tem acesso, a menos que `METRICAS_PUBLICAS` esteja ativo.
+    
+    Args:
+        request: Requisição HTTP
+        
+    Returns:
+        JsonResponse: Contadores, latências e indicadores, ou erro 401/403
+    """
+    if not getattr(settings, 'METRICAS_PUBLICAS', False):
+        erro = verificar_equipe(request)
+        if erro is not None:
+            return erro
+    return JsonResponse(metrics.snapshot())
+
 @csrf_exempt
 def process_payment(request):
     """
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class PagamentoAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pagamento_app'
+
+    def ready(self):
+        # Aquecer os modelos de NLP em segundo plano, sem bloquear a inicialização
+        if getattr(settings, 'NLP_WARMUP_ON_STARTUP', False):
+            from .utils.model_registry import registry
+            from .utils import nlp_processor  # noqa: F401 - registra os loaders
+            registry.warm_up()
@@ -3,9 +3,40 @@ Integração com modelos de linguagem natural avançados para o Assistente Virtu
 """
 
 import os
-import requests
 import json
+import time
 from django.conf import settings
+from .circuit_breaker import get_llm_circuit_breaker
+from .fallback_rules import build_fallback_rules
+from .http_client import get_llm_async_http_client, get_llm_http_client
+from .llm_router import get_llm_router
+from .prompt_builder import build_prompt_builder
+from .response_cache import get_llm_response_cache
+from .single_flight import get_llm_single_flight
+from .streaming import EnvelopeParser, iterar_deltas_sse
+from ..utils.metrics import metrics
+
+# Instruções de formato enviadas ao final de cada análise
+INSTRUCOES_FORMATO = """
+            Analise a mensagem do usuário e forneça uma resposta no seguinte formato JSON:
+            {
+                "intencao": "nome_da_intencao",
+                "entidades": {
+                    "plano": "nome_do_plano_se_mencionado",
+                    "metodo_pagamento": "metodo_se_mencionado",
+                    "outras_entidades": "valores"
+                },
+                "resposta": "sua_resposta_natural_ao_usuario",
+                "acoes_sugeridas": {
+                    "acao": "valor"
+                }
+            }
+            
+            Intenções possíveis: saudacao, info_plano, pagamento, metodo_pagamento, historico, cancelamento, desconhecido
+            """
+
+# Identificação das respostas dadas pelas regras locais em vez da API de LLM
+MOTOR_FALLBACK = "fallback"
 
 class AdvancedNLPProcessor:
     """
@@ -13,20 +44,35 @@ class AdvancedNLPProcessor:
     para compreensão de intenções e geração de respostas naturais.
     """
     
-    def __init__(self, api_key=None, model=None):
+    def __init__(self, api_key=None, model=None, http_client=None, circuit_breaker=None,
+                 async_http_client=None, response_cache=None, single_flight=None,
+                 roteador=None):
         """
         Inicializa o processador com configurações para API de LLM.
         
         Args:
             api_key (str, optional): Chave de API para o serviço de LLM
             model (str, optional): Nome do modelo a ser utilizado
+            http_client (HTTPClient, optional): Cliente HTTP; por padrão, o pool compartilhado
+            circuit_breaker (CircuitBreaker, optional): Disjuntor da API; por padrão, o compartilhado
+            async_http_client (AsyncHTTPClient, optional): Cliente das chamadas assíncronas;
+                por padrão, o do laço de eventos atual
+            response_cache (SemanticResponseCache, optional): Cache das análises; por padrão, o compartilhado
+            single_flight (SingleFlight, optional): Coalescedor das análises simultâneas; por padrão, o compartilhado
+            roteador (LLMRouter, optional): Roteador entre os endpoints da API; por padrão, o compartilhado
         """
         self.api_key = api_key or os.environ.get('LLM_API_KEY') or getattr(settings, 'LLM_API_KEY', None)
         self.model = model or os.environ.get('LLM_MODEL') or getattr(settings, 'LLM_MODEL', 'gpt-3.5-turbo')
-        self.api_url = os.environ.get('LLM_API_URL') or getattr(settings, 'LLM_API_URL', 'https://api.openai.com/v1/chat/completions')
+        self.roteador = roteador or get_llm_router()
+        self.http_client = http_client or get_llm_http_client()
+        self.circuit_breaker = circuit_breaker or get_llm_circuit_breaker()
+        self._async_http_client = async_http_client
+        self.response_cache = response_cache if response_cache is not None else get_llm_response_cache()
+        self.single_flight = single_flight or get_llm_single_flight()
         
-        # Definir sistema de fallback para quando a API não estiver disponível
+        # Forçar o sistema de fallback manualmente; falhas da API são tratadas pelo disjuntor
         self.use_fallback = False
+        self.fallback_rules = build_fallback_rules()
         
         # Contexto do sistema para o assistente
         self.system_context = """
@@ -39,11 +85,53 @@ class AdvancedNLPProcessor:
         
         Seja sempre cordial, objetivo e forneça informações precisas.
         """
+        
+        # Partes fixas dos prompts montadas e contadas uma única vez
+        self.prompt_analise = build_prompt_builder(self.system_context, INSTRUCOES_FORMATO, self.model)
+        self.prompt_geracao = build_prompt_builder(self.system_context, modelo=self.model)
+    
+    @property
+    def motor(self):
+        """Identificação das respostas dadas pela API de LLM."""
+        return f"llm:{self.model}"
+    
+    @property
+    def llm_disponivel(self):
+        """Indica se há API de LLM configurada e não forçada ao fallback."""
+        return bool(self.api_key) and not self.use_fallback
     
     def process_message(self, message, context=None):
         """
         Processa uma mensagem do usuário usando LLM avançado.
         
+        Args:
+            message (str): Mensagem do usuário
+            context (dict, optional): Contexto da conversa
+            
+        Returns:
+            dict: Resultado do processamento com intenção, entidades e resposta sugerida;
+            `motor` indica quem respondeu ("llm:<modelo>" ou "fallback")
+        """
+        if not self.llm_disponivel:
+            return self._process_with_fallback(message, context)
+        
+        # Perguntas repetidas (ou quase) são respondidas sem chamar a API
+        resultado = self._buscar_no_cache(message, context)
+        if resultado is not None:
+            return resultado
+        
+        # Mensagens iguais chegando ao mesmo tempo compartilham uma única chamada
+        resultado, compartilhado = self.single_flight.do(
+            self.response_cache.chave(message, context), self._analisar_com_api, message, context
+        )
+        if compartilhado:
+            resultado["prompt_tokens"] = 0
+        return resultado
+    
+    async def aprocess_message(self, message, context=None):
+        """
+        Versão assíncrona de `process_message`: a chamada à API é aguardada no laço de eventos.
+        
         Args:
             message (str): Mensagem do usuário
             context (dict, optional): Contexto da conversa
@@ -51,15 +139,182 @@ class AdvancedNLPProcessor:
         Returns:
             dict: Resultado do processamento com intenção, entidades e resposta sugerida
         """
-        if self.use_fallback or not self.api_key:
+        if not self.llm_disponivel:
+            return self._process_with_fallback(message, context)
+        
+        resultado = self._buscar_no_cache(message, context)
+        if resultado is not None:
+            return resultado
+        
+        resultado, compartilhado = await self.single_flight.ado(
+            self.response_cache.chave(message, context), self._aanalisar_com_api, message, context
+        )
+        if compartilhado:
+            resultado["prompt_tokens"] = 0
+        return resultado
+    
+    def stream_message(self, message, context=None):
+        """
+        Processa uma mensagem do usuário entregando a resposta em fluxo.
+        
+        O envelope JSON gerado pelo modelo é interpretado à medida que chega:
+        o texto do campo `resposta` é repassado em trechos e os demais campos
+        assim que cada valor termina.
+        
+        Args:
+            message (str): Mensagem do usuário
+            context (dict, optional): Contexto da conversa
+            
+        Returns:
+            generator: Eventos `("resposta", trecho)`, `("campo", nome, valor)`
+            e, por último, `("fim", resultado)` com o resultado completo
+        """
+        if not self.llm_disponivel:
+            yield from self._eventos_do_resultado(self._process_with_fallback(message, context))
+            return
+        
+        resultado = self._buscar_no_cache(message, context)
+        if resultado is not None:
+            yield from self._eventos_do_resultado(resultado)
+            return
+        
+        if not self.circuit_breaker.permitir():
+            metrics.incr("llm.fallback_circuito")
+            yield from self._eventos_do_resultado(self._process_with_fallback(message, context))
+            return
+        
+        parser = EnvelopeParser()
+        entregue = False
+        data, prompt_tokens = self._montar_requisicao_analise(message, context)
+        try:
+            for trecho in self._fluxo_da_api(data):
+                for evento in parser.feed(trecho):
+                    entregue = True
+                    yield evento
+        except Exception as e:
+            print(f"Erro ao processar com API de LLM: {e}")
+            if not entregue:
+                yield from self._eventos_do_resultado(self._process_with_fallback(message, context))
+                return
+        
+        resultado = self._interpretar_analise(parser.texto_completo())
+        resultado["prompt_tokens"] = prompt_tokens
+        resultado["motor"] = self.motor
+        if parser.concluido:
+            self._guardar_no_cache(message, context, resultado)
+        yield ("fim", resultado)
+    
+    def _fluxo_da_api(self, data):
+        """
+        Envia a requisição com `stream: true` e entrega os trechos de texto recebidos.
+        
+        O disjuntor recebe o resultado da chamada; para a lentidão conta o
+        tempo até o primeiro trecho, que é o que o usuário percebe.
+        
+        Args:
+            data (dict): Corpo da requisição
+            
+        Returns:
+            generator: Trechos de texto
+        """
+        inicio = time.monotonic()
+        primeiro_trecho = None
+        try:
+            response = self.roteador.post_json(
+                self.http_client, dict(data, stream=True), headers=self._headers(), stream=True
+            )
+            try:
+                if response.status_code != 200:
+                    raise Exception(f"Erro na API de LLM: {response.text}")
+                
+                # Sem charset no Content-Type, o requests assumiria ISO-8859-1
+                response.encoding = "utf-8"
+                for trecho in iterar_deltas_sse(response.iter_lines(decode_unicode=True)):
+                    if primeiro_trecho is None:
+                        primeiro_trecho = time.monotonic() - inicio
+                        metrics.observe("llm.tempo_primeiro_trecho", primeiro_trecho)
+                    yield trecho
+            finally:
+                response.close()
+        except GeneratorExit:
+            # O cliente desistiu; a API não falhou
+            self.circuit_breaker.registrar_sucesso(primeiro_trecho or time.monotonic() - inicio)
+            raise
+        except Exception:
+            self.circuit_breaker.registrar_falha()
+            raise
+        
+        self.circuit_breaker.registrar_sucesso(primeiro_trecho or time.monotonic() - inicio)
+    
+    def _analisar_com_api(self, message, context):
+        """
+        Analisa a mensagem com a API sob o controle do disjuntor e guarda o resultado no cache.
+        
+        Args:
+            message (str): Mensagem do usuário
+            context (dict, optional): Contexto da conversa
+            
+        Returns:
+            dict: Resultado da API ou do fallback
+        """
+        # Disjuntor aberto: ir direto para o fallback sem tocar na API
+        if not self.circuit_breaker.permitir():
+            metrics.incr("llm.fallback_circuito")
+            return self._process_with_fallback(message, context)
+        
+        inicio = time.monotonic()
+        try:
+            resultado = self._process_with_llm_api(message, context)
+        except Exception as e:
+            print(f"Erro ao processar com API de LLM: {e}")
+            self.circuit_breaker.registrar_falha()
             return self._process_with_fallback(message, context)
         
+        self.circuit_breaker.registrar_sucesso(time.monotonic() - inicio)
+        self._guardar_no_cache(message, context, resultado)
+        return resultado
+    
+    async def _aanalisar_com_api(self, message, context):
+        """Versão assíncrona de `_analisar_com_api`."""
+        if not self.circuit_breaker.permitir():
+            metrics.incr("llm.fallback_circuito")
+            return self._process_with_fallback(message, context)
+        
+        inicio = time.monotonic()
         try:
-            return self._process_with_llm_api(message, context)
+            data, prompt_tokens = self._montar_requisicao_analise(message, context)
+            response = await self.roteador.apost_json(self._cliente_async(), data, headers=self._headers())
+            resultado = self._interpretar_analise(self._extrair_conteudo(response))
+            resultado["prompt_tokens"] = prompt_tokens
+            resultado["motor"] = self.motor
         except Exception as e:
             print(f"Erro ao processar com API de LLM: {e}")
-            self.use_fallback = True
+            self.circuit_breaker.registrar_falha()
             return self._process_with_fallback(message, context)
+        
+        self.circuit_breaker.registrar_sucesso(time.monotonic() - inicio)
+        self._guardar_no_cache(message, context, resultado)
+        return resultado
+    
+    def _buscar_no_cache(self, message, context):
+        """Busca uma análise no cache; acertos não consomem tokens."""
+        resultado = self.response_cache.get(message, context)
+        if resultado is not None:
+            resultado["prompt_tokens"] = 0
+        return resultado
+    
+    def _guardar_no_cache(self, message, context, resultado):
+        """Guarda a análise no cache, exceto quando o modelo não devolveu o envelope esperado."""
+        if resultado["intencao"] != "desconhecido":
+            self.response_cache.set(message, context, resultado)
+    
+    @staticmethod
+    def _eventos_do_resultado(resultado):
+        """Converte um resultado completo nos eventos de `stream_message`."""
+        for campo in ("intencao", "entidades", "acoes_sugeridas"):
+            yield ("campo", campo, resultado[campo])
+        yield ("resposta", resultado["resposta"])
+        yield ("fim", resultado)
     
     def _process_with_llm_api(self, message, context):
         """
@@ -72,70 +327,71 @@ class AdvancedNLPProcessor:
         Returns:
             dict: Resultado do processamento
         """
-        # Preparar contexto para o modelo
-        messages = [
-            {"role": "system", "content": self.system_context}
-        ]
-        
-        # Adicionar histórico de conversa se disponível
-        if context and 'historico' in context:
-            for item in context['historico'][-5:]:  # Últimas 5 mensagens
-                if 'texto_usuario' in item:
-                    messages.append({"role": "user", "content": item['texto_usuario']})
-                if 'texto_assistente' in item:
-                    messages.append({"role": "assistant", "content": item['texto_assistente']})
-        
-        # Adicionar mensagem atual
-        messages.append({"role": "user", "content": message})
-        
-        # Adicionar instruções para formato de resposta
-        messages.append({
-            "role": "system", 
-            "content": """
-            Analise a mensagem do usuário e forneça uma resposta no seguinte formato JSON:
-            {
-                "intencao": "nome_da_intencao",
-                "entidades": {
-                    "plano": "nome_do_plano_se_mencionado",
-                    "metodo_pagamento": "metodo_se_mencionado",
-                    "outras_entidades": "valores"
-                },
-                "resposta": "sua_resposta_natural_ao_usuario",
-                "acoes_sugeridas": {
-                    "acao": "valor"
-                }
-            }
-            
-            Intenções possíveis: saudacao, info_plano, pagamento, metodo_pagamento, historico, cancelamento, desconhecido
-            """
-        })
-        
-        # Fazer requisição para a API
-        headers = {
-            "Content-Type": "application/json",
+        data, prompt_tokens = self._montar_requisicao_analise(message, context)
+        response = self.roteador.post_json(self.http_client, data, headers=self._headers())
+        resultado = self._interpretar_analise(self._extrair_conteudo(response))
+        resultado["prompt_tokens"] = prompt_tokens
+        resultado["motor"] = self.motor
+        return resultado
+    
+    def _cliente_async(self):
+        """Cliente assíncrono informado na construção ou o do laço de eventos atual."""
+        return self._async_http_client or get_llm_async_http_client()
+    
+    def _headers(self):
+        """Cabeçalhos de autenticação da API de LLM."""
+        return {
             "Authorization": f"Bearer {self.api_key}"
         }
+    
+    @staticmethod
+    def _extrair_conteudo(response):
+        """
+        Extrai o texto gerado de uma resposta da API.
         
-        data = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 500
-        }
-        
-        response = requests.post(
-            self.api_url,
-            headers=headers,
-            data=json.dumps(data)
-        )
-        
+        Args:
+            response: Resposta HTTP (requests ou httpx)
+            
+        Returns:
+            str: Conteúdo da primeira escolha
+        """
         if response.status_code != 200:
             raise Exception(f"Erro na API de LLM: {response.text}")
         
-        # Processar resposta
         result = response.json()
-        content = result['choices'][0]['message']['content']
+        return result['choices'][0]['message']['content']
+    
+    def _montar_requisicao_analise(self, message, context):
+        """
+        Monta o corpo da requisição de análise de uma mensagem.
+        
+        Args:
+            message (str): Mensagem do usuário
+            context (dict, optional): Contexto da conversa
+            
+        Returns:
+            tuple: (corpo da requisição, tokens do prompt)
+        """
+        prompt = self.prompt_analise.montar(message, context.get('historico') if context else None)
+        
+        return {
+            "model": self.model,
+            "messages": prompt.mensagens,
+            "temperature": 0.7,
+            "max_tokens": 500
+        }, prompt.tokens
+    
+    @staticmethod
+    def _interpretar_analise(content):
+        """
+        Converte o texto devolvido pelo modelo no resultado do processamento.
         
+        Args:
+            content (str): Conteúdo gerado pelo modelo
+            
+        Returns:
+            dict: Resultado do processamento
+        """
         # Extrair JSON da resposta
         try:
             # Limpar possíveis marcadores de código
@@ -173,69 +429,10 @@ class AdvancedNLPProcessor:
         Returns:
             dict: Resultado do processamento
         """
-        # Implementação simplificada para fallback
-        message_lower = message.lower()
-        
-        # Detectar intenção básica
-        intencao = "desconhecido"
-        entidades = {}
-        
-        # Saudação
-        if any(word in message_lower for word in ["olá", "oi", "bom dia", "boa tarde", "boa noite"]):
-            intencao = "saudacao"
-            resposta = "Olá! Como posso ajudar você hoje com nossos planos e pagamentos?"
-        
-        # Informações sobre planos
-        elif "plano" in message_lower:
-            intencao = "info_plano"
-            
-            # Detectar plano mencionado
-            if "básico" in message_lower or "basico" in message_lower:
-                entidades["plano"] = "basico"
-                resposta = "O plano Básico custa R$29,99 e inclui 15GB de internet, apps com internet ilimitada e serviços ilimitados de ligação e SMS."
-            elif "premium" in message_lower:
-                entidades["plano"] = "premium"
-                resposta = "O plano Premium custa R$59,90 e inclui 35GB de internet, apps com internet ilimitada e serviços ilimitados de ligação e SMS."
-            else:
-                resposta = "Temos dois planos disponíveis: Básico (R$29,99) e Premium (R$59,90). Qual deles você gostaria de conhecer melhor?"
-        
-        # Pagamento
-        elif any(word in message_lower for word in ["pagar", "pagamento", "comprar", "contratar"]):
-            intencao = "pagamento"
-            
-            # Detectar método de pagamento
-            if "pix" in message_lower:
-                entidades["metodo_pagamento"] = "pix"
-                resposta = "Para pagar com PIX, vou gerar um código para você. Qual plano você deseja contratar?"
-            elif "boleto" in message_lower:
-                entidades["metodo_pagamento"] = "boleto"
-                resposta = "Para pagar com boleto, vou gerar um código de barras para você. Qual plano você deseja contratar?"
-            elif "cartão" in message_lower or "cartao" in message_lower:
-                entidades["metodo_pagamento"] = "cartao"
-                resposta = "Para pagar com cartão, precisarei de algumas informações. Qual plano você deseja contratar?"
-            else:
-                resposta = "Como você prefere pagar? Aceitamos PIX, boleto ou cartão de crédito."
-        
-        # Histórico
-        elif "histórico" in message_lower or "transações" in message_lower or "pagamentos" in message_lower:
-            intencao = "historico"
-            resposta = "Você ainda não possui histórico de transações. Após realizar um pagamento, ele aparecerá aqui."
-        
-        # Cancelamento
-        elif "cancelar" in message_lower or "cancelamento" in message_lower:
-            intencao = "cancelamento"
-            resposta = "Para cancelar um plano, precisamos verificar alguns detalhes. Por favor, confirme seu e-mail e o plano que deseja cancelar."
-        
-        # Resposta padrão
-        else:
-            resposta = "Desculpe, não entendi completamente. Posso ajudar com informações sobre planos, pagamentos ou histórico de transações."
-        
-        return {
-            "intencao": intencao,
-            "entidades": entidades,
-            "resposta": resposta,
-            "acoes_sugeridas": {}
-        }
+        # Tabela de regras compilada: uma passada pelo texto e resposta já formatada
+        resultado = self.fallback_rules.processar(message)
+        resultado["motor"] = MOTOR_FALLBACK
+        return resultado
     
     def generate_response(self, prompt, context=None, max_tokens=150):
         """
@@ -249,47 +446,112 @@ class AdvancedNLPProcessor:
         Returns:
             str: Texto gerado
         """
-        if self.use_fallback or not self.api_key:
+        if not self.llm_disponivel:
             return f"Resposta para: {prompt}"
         
-        try:
-            # Preparar mensagens para a API
-            messages = [
-                {"role": "system", "content": self.system_context},
-                {"role": "user", "content": prompt}
-            ]
-            
-            # Adicionar contexto se disponível
-            if context:
-                context_str = json.dumps(context)
-                messages.insert(1, {"role": "system", "content": f"Contexto adicional: {context_str}"})
-            
-            # Fazer requisição para a API
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
+        content = self.try_generate_response(prompt, context, max_tokens)
+        if content is None:
+            return f"Não foi possível gerar uma resposta para: {prompt}"
+        return content
+    
+    async def agenerate_response(self, prompt, context=None, max_tokens=150):
+        """
+        Versão assíncrona de `generate_response`.
+        
+        Args:
+            prompt (str): Prompt para geração de texto
+            context (dict, optional): Contexto adicional
+            max_tokens (int, optional): Número máximo de tokens na resposta
             
-            data = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": 0.7,
-                "max_tokens": max_tokens
-            }
+        Returns:
+            str: Texto gerado
+        """
+        if not self.llm_disponivel:
+            return f"Resposta para: {prompt}"
+        
+        content = await self.atry_generate_response(prompt, context, max_tokens)
+        if content is None:
+            return f"Não foi possível gerar uma resposta para: {prompt}"
+        return content
+    
+    def try_generate_response(self, prompt, context=None, max_tokens=150):
+        """
+        Gera uma resposta pela API, sem texto substituto em caso de falha.
+        
+        Para quem tem uma alternativa própria (ex.: o gerador local) em vez
+        das mensagens fixas de `generate_response`.
+        
+        Args:
+            prompt (str): Prompt para geração de texto
+            context (dict, optional): Contexto adicional
+            max_tokens (int, optional): Número máximo de tokens na resposta
             
-            response = requests.post(
-                self.api_url,
-                headers=headers,
-                data=json.dumps(data)
+        Returns:
+            str: Texto gerado, ou None se a API não estiver configurada, o
+            disjuntor estiver aberto ou a chamada falhar
+        """
+        if not self.llm_disponivel:
+            return None
+        
+        if not self.circuit_breaker.permitir():
+            metrics.incr("llm.fallback_circuito")
+            return None
+        
+        inicio = time.monotonic()
+        try:
+            response = self.roteador.post_json(
+                self.http_client, self._montar_requisicao_geracao(prompt, context, max_tokens), headers=self._headers()
             )
-            
-            if response.status_code != 200:
-                raise Exception(f"Erro na API de LLM: {response.text}")
-            
-            # Extrair resposta
-            result = response.json()
-            return result['choices'][0]['message']['content']
-            
+            content = self._extrair_conteudo(response)
         except Exception as e:
             print(f"Erro ao gerar resposta: {e}")
-            return f"Não foi possível gerar uma resposta para: {prompt}"
+            self.circuit_breaker.registrar_falha()
+            return None
+        
+        self.circuit_breaker.registrar_sucesso(time.monotonic() - inicio)
+        return content
+    
+    async def atry_generate_response(self, prompt, context=None, max_tokens=150):
+        """Versão assíncrona de `try_generate_response`."""
+        if not self.llm_disponivel:
+            return None
+        
+        if not self.circuit_breaker.permitir():
+            metrics.incr("llm.fallback_circuito")
+            return None
+        
+        inicio = time.monotonic()
+        try:
+            response = await self.roteador.apost_json(
+                self._cliente_async(), self._montar_requisicao_geracao(prompt, context, max_tokens), headers=self._headers()
+            )
+            content = self._extrair_conteudo(response)
+        except Exception as e:
+            print(f"Erro ao gerar resposta: {e}")
+            self.circuit_breaker.registrar_falha()
+            return None
+        
+        self.circuit_breaker.registrar_sucesso(time.monotonic() - inicio)
+        return content
+    
+    def _montar_requisicao_geracao(self, prompt, context, max_tokens):
+        """
+        Monta o corpo da requisição de geração de texto.
+        
+        Args:
+            prompt (str): Prompt para geração de texto
+            context (dict, optional): Contexto adicional
+            max_tokens (int): Número máximo de tokens na resposta
+            
+        Returns:
+            dict: Corpo da requisição
+        """
+        # Adicionar contexto se disponível
+        extras = [f"Contexto adicional: {json.dumps(context)}"] if context else None
+        
+        return {
+            "model": self.model,
+            "messages": self.prompt_geracao.montar(prompt, extras=extras).mensagens,
+            "temperature": 0.7,
+            "max_tokens": max_tokens
+        }
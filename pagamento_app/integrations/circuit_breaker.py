@@ -0,0 +1,241 @@
+"""
+Disjuntor (circuit breaker) para as integrações externas do Assistente Virtual de Pagamentos.
+Interrompe as chamadas durante uma falha prolongada e as retoma aos poucos.
+"""
+
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from ..utils.metrics import metrics
+
+# Estados do disjuntor
+FECHADO = "fechado"
+ABERTO = "aberto"
+SEMI_ABERTO = "semi_aberto"
+
+
+class CircuitOpenError(Exception):
+    """A chamada foi recusada porque o disjuntor está aberto."""
+
+
+class CircuitBreaker:
+    """
+    Disjuntor com janela deslizante de erros e de lentidão.
+
+    Fechado, deixa todas as chamadas passarem e registra o resultado de cada
+    uma. Quando, na janela, a taxa de erros ou de chamadas lentas passa do
+    limiar, o disjuntor abre e recusa as chamadas por `tempo_aberto`
+    segundos. Depois disso, fica semiaberto e deixa passar algumas sondas:
+    se todas derem certo ele fecha; se alguma falhar, volta a abrir.
+    """
+
+    def __init__(self, janela=30.0, min_chamadas=10, limiar_erros=0.5,
+                 limite_lentidao=10.0, limiar_lentidao=0.8, tempo_aberto=15.0,
+                 sondas=2, nome="circuito", metrics=metrics):
+        """
+        Inicializa o disjuntor fechado.
+
+        Args:
+            janela (float, optional): Duração, em segundos, da janela de resultados
+            min_chamadas (int, optional): Chamadas na janela antes de avaliar as taxas
+            limiar_erros (float, optional): Fração de erros que abre o disjuntor
+            limite_lentidao (float, optional): Latência, em segundos, a partir da qual a chamada é lenta
+            limiar_lentidao (float, optional): Fração de chamadas lentas que abre o disjuntor
+            tempo_aberto (float, optional): Segundos em que as chamadas são recusadas antes das sondas
+            sondas (int, optional): Sondas bem-sucedidas necessárias para fechar
+            nome (str, optional): Prefixo das métricas
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+        """
+        self.janela = janela
+        self.min_chamadas = min_chamadas
+        self.limiar_erros = limiar_erros
+        self.limite_lentidao = limite_lentidao
+        self.limiar_lentidao = limiar_lentidao
+        self.tempo_aberto = tempo_aberto
+        self.sondas = sondas
+        self.nome = nome
+        self.metrics = metrics
+
+        self._lock = threading.Lock()
+        self._estado = FECHADO
+        self._aberto_em = 0.0
+        self._resultados = deque()
+        self._sondas_em_andamento = 0
+        self._sondas_com_sucesso = 0
+        self._transicoes = {}
+
+        metrics.register_gauge(nome, self.snapshot)
+
+    @property
+    def estado(self):
+        """Estado atual, considerando a expiração do tempo aberto."""
+        with self._lock:
+            self._verificar_expiracao(time.monotonic())
+            return self._estado
+
+    def permitir(self):
+        """
+        Verifica se uma chamada pode ser feita agora.
+
+        No estado semiaberto, uma resposta positiva reserva uma vaga de sonda,
+        que deve ser devolvida com `registrar_sucesso` ou `registrar_falha`.
+
+        Returns:
+            bool: True se a chamada pode prosseguir
+        """
+        with self._lock:
+            self._verificar_expiracao(time.monotonic())
+            if self._estado == FECHADO:
+                return True
+            if self._estado == SEMI_ABERTO and self._sondas_em_andamento < self.sondas - self._sondas_com_sucesso:
+                self._sondas_em_andamento += 1
+                return True
+        self.metrics.incr(f"{self.nome}.recusadas")
+        return False
+
+    def registrar_sucesso(self, latencia):
+        """
+        Registra uma chamada concluída.
+
+        Args:
+            latencia (float): Duração da chamada em segundos
+        """
+        lenta = latencia >= self.limite_lentidao
+        with self._lock:
+            if self._estado == SEMI_ABERTO:
+                self._sondas_em_andamento = max(0, self._sondas_em_andamento - 1)
+                if lenta:
+                    self._transicionar(ABERTO)
+                    return
+                self._sondas_com_sucesso += 1
+                if self._sondas_com_sucesso >= self.sondas:
+                    self._transicionar(FECHADO)
+                return
+            self._adicionar_resultado(False, lenta)
+
+    def registrar_falha(self):
+        """Registra uma chamada que terminou em erro."""
+        with self._lock:
+            if self._estado == SEMI_ABERTO:
+                self._sondas_em_andamento = max(0, self._sondas_em_andamento - 1)
+                self._transicionar(ABERTO)
+                return
+            self._adicionar_resultado(True, False)
+
+    def chamar(self, funcao, *args, **kwargs):
+        """
+        Executa a função sob o controle do disjuntor.
+
+        Args:
+            funcao (callable): Chamada protegida
+            *args: Argumentos posicionais da função
+            **kwargs: Argumentos nomeados da função
+
+        Returns:
+            object: Resultado da função
+
+        Raises:
+            CircuitOpenError: Se o disjuntor recusou a chamada
+        """
+        if not self.permitir():
+            raise CircuitOpenError(f"Disjuntor {self.nome} aberto")
+
+        inicio = time.monotonic()
+        try:
+            resultado = funcao(*args, **kwargs)
+        except Exception:
+            self.registrar_falha()
+            raise
+        self.registrar_sucesso(time.monotonic() - inicio)
+        return resultado
+
+    def snapshot(self):
+        """
+        Retorna o estado do disjuntor em um dicionário serializável em JSON.
+
+        Returns:
+            dict: Estado, taxas na janela e contagem de transições
+        """
+        with self._lock:
+            agora = time.monotonic()
+            self._verificar_expiracao(agora)
+            self._descartar_antigos(agora)
+            total = len(self._resultados)
+            erros = sum(1 for _, erro, _ in self._resultados if erro)
+            lentas = sum(1 for _, _, lenta in self._resultados if lenta)
+            return {
+                "estado": self._estado,
+                "chamadas": total,
+                "taxa_erros": erros / total if total else 0.0,
+                "taxa_lentidao": lentas / total if total else 0.0,
+                "transicoes": dict(self._transicoes)
+            }
+
+    def _adicionar_resultado(self, erro, lenta):
+        """Inclui um resultado na janela e abre o disjuntor se os limiares forem atingidos."""
+        agora = time.monotonic()
+        self._resultados.append((agora, erro, lenta))
+        self._descartar_antigos(agora)
+
+        if self._estado != FECHADO or len(self._resultados) < self.min_chamadas:
+            return
+
+        total = len(self._resultados)
+        erros = sum(1 for _, erro, _ in self._resultados if erro)
+        lentas = sum(1 for _, _, lenta in self._resultados if lenta)
+        if erros / total >= self.limiar_erros or lentas / total >= self.limiar_lentidao:
+            self._transicionar(ABERTO)
+
+    def _descartar_antigos(self, agora):
+        """Remove da janela os resultados mais antigos que `janela` segundos."""
+        limite = agora - self.janela
+        while self._resultados and self._resultados[0][0] < limite:
+            self._resultados.popleft()
+
+    def _verificar_expiracao(self, agora):
+        """Passa de aberto para semiaberto quando o tempo aberto termina."""
+        if self._estado == ABERTO and agora - self._aberto_em >= self.tempo_aberto:
+            self._transicionar(SEMI_ABERTO)
+
+    def _transicionar(self, novo_estado):
+        """Muda de estado, zerando o que pertence ao estado anterior."""
+        chave = f"{self._estado}->{novo_estado}"
+        self._transicoes[chave] = self._transicoes.get(chave, 0) + 1
+        self.metrics.incr(f"{self.nome}.transicoes")
+        self._estado = novo_estado
+        self._sondas_em_andamento = 0
+        self._sondas_com_sucesso = 0
+        if novo_estado == ABERTO:
+            self._aberto_em = time.monotonic()
+        elif novo_estado == FECHADO:
+            # Recomeçar a janela para que falhas antigas não reabram o disjuntor
+            self._resultados.clear()
+
+
+_disjuntor_llm = None
+_disjuntor_llm_lock = threading.Lock()
+
+
+def get_llm_circuit_breaker():
+    """
+    Retorna o disjuntor compartilhado pelas chamadas à API de LLM.
+
+    Returns:
+        CircuitBreaker: Disjuntor configurado a partir das settings `LLM_CIRCUITO_*`
+    """
+    global _disjuntor_llm
+    if _disjuntor_llm is None:
+        with _disjuntor_llm_lock:
+            if _disjuntor_llm is None:
+                _disjuntor_llm = CircuitBreaker(
+                    janela=getattr(settings, 'LLM_CIRCUITO_JANELA', 30.0),
+                    min_chamadas=getattr(settings, 'LLM_CIRCUITO_MIN_CHAMADAS', 10),
+                    limiar_erros=getattr(settings, 'LLM_CIRCUITO_LIMIAR_ERROS', 0.5),
+                    limite_lentidao=getattr(settings, 'LLM_CIRCUITO_LIMITE_LENTIDAO', 10.0),
+                    limiar_lentidao=getattr(settings, 'LLM_CIRCUITO_LIMIAR_LENTIDAO', 0.8),
+                    tempo_aberto=getattr(settings, 'LLM_CIRCUITO_TEMPO_ABERTO', 15.0),
+                    sondas=getattr(settings, 'LLM_CIRCUITO_SONDAS', 2),
+                    nome="llm.circuito"
+                )
+    return _disjuntor_llm
@@ -0,0 +1,332 @@
+"""
+Regras do modo degradado (fallback) do processador de LLM para o Assistente Virtual de Pagamentos.
+Tabela declarativa compilada uma vez em um reconhecedor único e em respostas pré-formatadas.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from django.conf import settings
+from ..data import planos
+from ..utils.intent_matcher import IntentMatcher
+from ..utils.metrics import metrics
+from ..utils.text_normalizer import normalizar_texto
+from .response_cache import versao_catalogo
+
+# Tabela padrão. Intenções em ordem de prioridade; cada uma pode depender de
+# um tipo de entidade e ter uma resposta por valor dessa entidade. As
+# respostas são modelos formatados com os dados de `data.planos`:
+#   {nome}, {preco}, {descricao}, {beneficios} e {metodos} nas respostas por plano;
+#   {lista_planos}, {quantidade_planos} e {metodos} em todas as respostas.
+# Os valores da entidade "plano" vêm do catálogo; `palavras` só acrescenta sinônimos.
+REGRAS_PADRAO = {
+    "intencoes": [
+        {
+            "intencao": "saudacao",
+            "palavras": ["olá", "oi", "bom dia", "boa tarde", "boa noite"],
+            "resposta": "Olá! Como posso ajudar você hoje com nossos planos e pagamentos?"
+        },
+        {
+            "intencao": "info_plano",
+            "palavras": ["plano"],
+            "entidade": "plano",
+            "resposta": "Temos {quantidade_planos} planos disponíveis: {lista_planos}. Qual deles você gostaria de conhecer melhor?",
+            "respostas": {
+                "*": "O plano {nome} custa {preco} e inclui {beneficios}."
+            }
+        },
+        {
+            "intencao": "pagamento",
+            "palavras": ["pagar", "pagamento", "comprar", "contratar"],
+            "entidade": "metodo_pagamento",
+            "resposta": "Como você prefere pagar? Aceitamos {metodos}.",
+            "respostas": {
+                "pix": "Para pagar com PIX, vou gerar um código para você. Qual plano você deseja contratar?",
+                "boleto": "Para pagar com boleto, vou gerar um código de barras para você. Qual plano você deseja contratar?",
+                "cartao": "Para pagar com cartão, precisarei de algumas informações. Qual plano você deseja contratar?"
+            }
+        },
+        {
+            "intencao": "historico",
+            "palavras": ["histórico", "transações", "pagamentos"],
+            "resposta": "Você ainda não possui histórico de transações. Após realizar um pagamento, ele aparecerá aqui."
+        },
+        {
+            "intencao": "cancelamento",
+            "palavras": ["cancelar", "cancelamento"],
+            "resposta": "Para cancelar um plano, precisamos verificar alguns detalhes. Por favor, confirme seu e-mail e o plano que deseja cancelar."
+        }
+    ],
+    "entidades": {
+        "plano": {
+            "basico": ["básico"]
+        },
+        "metodo_pagamento": {
+            "pix": ["pix"],
+            "boleto": ["boleto"],
+            "cartao": ["cartão"]
+        }
+    },
+    "nomes_planos": {
+        "basico": "Básico"
+    },
+    "resposta_padrao": "Desculpe, não entendi completamente. Posso ajudar com informações sobre planos, pagamentos ou histórico de transações."
+}
+
+# Números por extenso usados em {quantidade_planos}
+_POR_EXTENSO = ("nenhum", "um", "dois", "três", "quatro", "cinco", "seis", "sete", "oito", "nove", "dez")
+
+# Tabela compilada; substituída por inteiro a cada recarga
+_RegrasCompiladas = namedtuple(
+    "_RegrasCompiladas", ["matcher", "rotulos", "entidade_por_intencao", "respostas", "resposta_padrao"]
+)
+
+
+def _minusculas(texto):
+    """Passa para minúsculas as palavras que não são siglas (ex.: "PIX", "15GB")."""
+    return " ".join(palavra if palavra.isupper() else palavra.lower() for palavra in texto.split(" "))
+
+
+def _juntar(itens, conjuncao="e"):
+    """Junta itens em português: "a, b e c"."""
+    itens = list(itens)
+    if len(itens) <= 1:
+        return "".join(itens)
+    return f"{', '.join(itens[:-1])} {conjuncao} {itens[-1]}"
+
+
+def compilar_regras(regras, catalogo=None):
+    """
+    Compila uma tabela de regras.
+
+    Todas as palavras-chave (de intenções e de entidades) formam um único
+    IntentMatcher, percorrido uma vez por mensagem; os rótulos "i:<intenção>"
+    vêm antes dos rótulos "e:<tipo>:<valor>", preservando a prioridade. Todas
+    as respostas possíveis são formatadas aqui, com os dados do catálogo.
+
+    Args:
+        regras (dict): Tabela no formato de REGRAS_PADRAO
+        catalogo (dict, optional): Catálogo de planos; por padrão, `data.planos`
+
+    Returns:
+        _RegrasCompiladas: Reconhecedor, rótulos, entidade de cada intenção e respostas prontas
+
+    Raises:
+        KeyError: Se a tabela citar um campo ausente nos modelos de resposta
+    """
+    catalogo = planos if catalogo is None else catalogo
+    nomes = regras.get("nomes_planos", {})
+    metodos = []
+    for detalhes in catalogo.values():
+        for metodo in detalhes.get("pagamento", []):
+            if _minusculas(metodo) not in metodos:
+                metodos.append(_minusculas(metodo))
+
+    variaveis = {
+        "lista_planos": _juntar(
+            f"{nomes.get(chave, chave.capitalize())} ({detalhes.get('preço', '')})" for chave, detalhes in catalogo.items()
+        ),
+        "quantidade_planos": _POR_EXTENSO[len(catalogo)] if len(catalogo) < len(_POR_EXTENSO) else str(len(catalogo)),
+        "metodos": _juntar(metodos, "ou")
+    }
+    variaveis_plano = {
+        chave: dict(
+            variaveis,
+            nome=nomes.get(chave, chave.capitalize()),
+            preco=detalhes.get("preço", ""),
+            descricao=detalhes.get("descrição", ""),
+            beneficios=_juntar(
+                [detalhes.get("benefícios", [""])[0]] + [_minusculas(b) for b in detalhes.get("benefícios", [])[1:]]
+            ),
+            metodos=_juntar([_minusculas(m) for m in detalhes.get("pagamento", [])], "ou")
+        )
+        for chave, detalhes in catalogo.items()
+    }
+
+    # Valores das entidades: o catálogo define os planos, a tabela acrescenta sinônimos
+    entidades = {tipo: dict(valores) for tipo, valores in regras.get("entidades", {}).items()}
+    entidades["plano"] = {
+        chave: [chave] + list(entidades.get("plano", {}).get(chave, [])) for chave in catalogo
+    }
+
+    palavras_chave = {}
+    entidade_por_intencao = {}
+    respostas = {}
+    for regra in regras["intencoes"]:
+        intencao = regra["intencao"]
+        palavras_chave[f"i:{intencao}"] = regra["palavras"]
+        respostas[(intencao, None)] = regra["resposta"].format_map(variaveis)
+        tipo = entidade_por_intencao[intencao] = regra.get("entidade")
+        modelos = regra.get("respostas", {})
+        for valor in entidades.get(tipo, {}) if tipo else ():
+            modelo = modelos.get(valor, modelos.get("*"))
+            if modelo is not None:
+                respostas[(intencao, valor)] = modelo.format_map(variaveis_plano.get(valor, variaveis))
+
+    for tipo, valores in entidades.items():
+        for valor, palavras in valores.items():
+            palavras_chave[f"e:{tipo}:{valor}"] = palavras
+
+    # Rótulo -> (tipo, valor); intenções têm tipo None
+    rotulos = {}
+    for rotulo in palavras_chave:
+        partes = rotulo.split(":", 2)
+        rotulos[rotulo] = (None, partes[1]) if partes[0] == "i" else (partes[1], partes[2])
+
+    return _RegrasCompiladas(
+        IntentMatcher(palavras_chave),
+        rotulos,
+        entidade_por_intencao,
+        respostas,
+        regras.get("resposta_padrao", "")
+    )
+
+
+class FallbackRules:
+    """
+    Motor de regras do modo degradado.
+
+    Cada mensagem é normalizada e percorrida uma única vez pelo reconhecedor
+    compilado; a resposta é buscada pronta em um dicionário. A tabela é
+    recompilada quando o arquivo de regras ou o catálogo de planos mudam,
+    verificados no máximo a cada `intervalo_recarga` segundos; a troca é
+    atômica, então mensagens concorrentes veem a tabela antiga ou a nova.
+    """
+
+    def __init__(self, caminho=None, intervalo_recarga=5.0, regras=None, nome="fallback", metrics=metrics):
+        """
+        Compila a tabela inicial.
+
+        Args:
+            caminho (str, optional): Arquivo JSON com a tabela; sem ele, usa `regras`
+            intervalo_recarga (float, optional): Segundos entre verificações de mudança (None desativa)
+            regras (dict, optional): Tabela usada sem arquivo; por padrão, REGRAS_PADRAO
+            nome (str, optional): Prefixo das métricas
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+        """
+        self.caminho = caminho
+        self.intervalo_recarga = intervalo_recarga
+        self.regras = regras or REGRAS_PADRAO
+        self.nome = nome
+        self.metrics = metrics
+
+        self._lock = threading.Lock()
+        self._assinatura = None
+        self._proxima_verificacao = 0.0
+        self._compiladas = None
+        self.recarregar()
+
+    def processar(self, mensagem):
+        """
+        Identifica intenção e entidade e devolve a resposta pronta.
+
+        Args:
+            mensagem (str): Mensagem do usuário
+
+        Returns:
+            dict: Intenção, entidades, resposta e ações sugeridas
+        """
+        self._verificar_mudancas()
+        compiladas = self._compiladas
+
+        # Uma passada pelo texto encontra intenções e entidades; a primeira intenção tem prioridade
+        intencao = None
+        encontradas = {}
+        for rotulo in compiladas.matcher.intencoes(normalizar_texto(mensagem)):
+            tipo, valor = compiladas.rotulos[rotulo]
+            if tipo is None:
+                if intencao is None:
+                    intencao = valor
+            elif tipo not in encontradas:
+                encontradas[tipo] = valor
+
+        entidades = {}
+        if intencao is None:
+            intencao = "desconhecido"
+            resposta = compiladas.resposta_padrao
+        else:
+            # Só a entidade de que a intenção depende é informada
+            tipo = compiladas.entidade_por_intencao[intencao]
+            valor = encontradas.get(tipo) if tipo else None
+            resposta = compiladas.respostas.get((intencao, valor)) if valor else None
+            if resposta is None:
+                resposta = compiladas.respostas[(intencao, None)]
+            else:
+                entidades[tipo] = valor
+
+        return {
+            "intencao": intencao,
+            "entidades": entidades,
+            "resposta": resposta,
+            "acoes_sugeridas": {},
+            "prompt_tokens": 0
+        }
+
+    def recarregar(self):
+        """
+        Recompila a tabela a partir do arquivo (ou das regras em memória) e do catálogo.
+
+        Returns:
+            bool: True se a nova tabela foi aplicada; em caso de erro, a anterior é mantida
+        """
+        self._assinatura = self._assinatura_atual()
+        try:
+            regras = self.regras
+            if self.caminho:
+                with open(self.caminho, encoding="utf-8") as arquivo:
+                    regras = json.load(arquivo)
+            compiladas = compilar_regras(regras)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Erro ao carregar regras de fallback: {e}")
+            self.metrics.incr(f"{self.nome}.erros_recarga")
+            if self._compiladas is None:
+                # Sem tabela anterior, usar a padrão
+                self._compiladas = compilar_regras(REGRAS_PADRAO)
+            return False
+
+        self._compiladas = compiladas
+        self.metrics.incr(f"{self.nome}.recargas")
+        return True
+
+    def _assinatura_atual(self):
+        """Identifica a versão do arquivo de regras e do catálogo de planos."""
+        mtime = None
+        if self.caminho:
+            try:
+                mtime = os.stat(self.caminho).st_mtime_ns
+            except OSError:
+                pass
+        return (mtime, versao_catalogo())
+
+    def _verificar_mudancas(self):
+        """Recompila a tabela se o arquivo ou o catálogo mudaram, no máximo a cada intervalo."""
+        if self.intervalo_recarga is None:
+            return
+        agora = time.monotonic()
+        if agora < self._proxima_verificacao:
+            return
+        # Apenas uma thread verifica; as demais seguem com a tabela atual
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._proxima_verificacao = agora + self.intervalo_recarga
+            if self._assinatura_atual() != self._assinatura:
+                self.recarregar()
+        finally:
+            self._lock.release()
+
+
+def build_fallback_rules():
+    """
+    Cria o motor de regras de fallback configurado pelas settings `LLM_FALLBACK_*`.
+
+    Returns:
+        FallbackRules: Motor com a tabela do arquivo configurado ou a padrão
+    """
+    return FallbackRules(
+        caminho=getattr(settings, 'LLM_FALLBACK_REGRAS_PATH', None),
+        intervalo_recarga=getattr(settings, 'LLM_FALLBACK_INTERVALO_RECARGA', 5.0),
+        nome="llm.fallback"
+    )
@@ -0,0 +1,310 @@
+"""
+Cliente HTTP compartilhado para as integrações do Assistente Virtual de Pagamentos.
+Reaproveita conexões, aplica prazos e repete falhas transitórias dentro de um orçamento.
+"""
+
+import asyncio
+import random
+import threading
+import time
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from ..utils.metrics import metrics
+
+# Códigos de status que indicam falha transitória do servidor
+STATUS_RETENTATIVA = frozenset({429, 500, 502, 503, 504})
+
+
+class _RetryPolicy:
+    """Parâmetros e cálculo da espera entre tentativas, comuns aos clientes síncrono e assíncrono."""
+
+    def __init__(self, connect_timeout, read_timeout, max_retries, backoff_base,
+                 backoff_max, retry_budget, nome, metrics):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_budget = retry_budget
+        self.nome = nome
+        self.metrics = metrics
+
+    def _proxima_espera(self, tentativa, inicio, retry_after=None):
+        """
+        Calcula a espera antes da próxima tentativa.
+
+        Returns:
+            float: Segundos de espera, ou None se não houver mais tentativas ou orçamento
+        """
+        if tentativa >= self.max_retries:
+            return None
+
+        # Jitter completo: espera aleatória entre zero e o teto exponencial
+        espera = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** tentativa)))
+        if retry_after:
+            try:
+                espera = max(espera, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+
+        if time.monotonic() - inicio + espera > self.retry_budget:
+            self.metrics.incr(f"{self.nome}.orcamento_esgotado")
+            return None
+        return espera
+
+
+class HTTPClient(_RetryPolicy):
+    """
+    Cliente HTTP com pool de conexões keep-alive.
+
+    Cada requisição tem prazos separados de conexão e de leitura. Falhas de
+    rede e respostas com status transitório são repetidas com espera
+    exponencial com jitter, limitadas pelo número de tentativas e por um
+    orçamento de tempo por requisição.
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=32, connect_timeout=3.05,
+                 read_timeout=30.0, max_retries=2, backoff_base=0.2, backoff_max=2.0,
+                 retry_budget=5.0, nome="http", metrics=metrics):
+        """
+        Inicializa o cliente.
+
+        Args:
+            pool_connections (int, optional): Número de hosts mantidos no pool
+            pool_maxsize (int, optional): Conexões mantidas abertas por host
+            connect_timeout (float, optional): Prazo em segundos para abrir a conexão
+            read_timeout (float, optional): Prazo em segundos entre bytes da resposta
+            max_retries (int, optional): Repetições após a primeira tentativa
+            backoff_base (float, optional): Espera base, em segundos, antes da primeira repetição
+            backoff_max (float, optional): Espera máxima entre tentativas
+            retry_budget (float, optional): Tempo máximo, em segundos, gasto com repetições em uma requisição
+            nome (str, optional): Prefixo das métricas
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+        """
+        super().__init__(connect_timeout, read_timeout, max_retries, backoff_base,
+                         backoff_max, retry_budget, nome, metrics)
+        self.timeout = (connect_timeout, read_timeout)
+
+        # As repetições são controladas aqui, não pelo urllib3
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post_json(self, url, payload, headers=None, timeout=None, stream=False):
+        """
+        Envia um POST com corpo JSON.
+
+        Args:
+            url (str): Endereço da requisição
+            payload (dict): Corpo a ser serializado em JSON
+            headers (dict, optional): Cabeçalhos adicionais
+            timeout (tuple, optional): Prazos (conexão, leitura) específicos desta chamada
+            stream (bool, optional): Se True, o corpo da resposta é lido sob demanda
+
+        Returns:
+            requests.Response: Última resposta recebida
+        """
+        return self.request("POST", url, json=payload, headers=headers, timeout=timeout, stream=stream)
+
+    def request(self, metodo, url, timeout=None, **kwargs):
+        """
+        Executa uma requisição repetindo falhas transitórias.
+
+        Args:
+            metodo (str): Método HTTP
+            url (str): Endereço da requisição
+            timeout (tuple, optional): Prazos (conexão, leitura) específicos desta chamada
+            **kwargs: Argumentos repassados a `requests.Session.request`
+
+        Returns:
+            requests.Response: Última resposta recebida; status transitórios são
+            devolvidos quando as tentativas ou o orçamento se esgotam
+
+        Raises:
+            requests.RequestException: Se a última tentativa falhou por erro de rede
+        """
+        timeout = timeout or self.timeout
+        inicio = time.monotonic()
+        tentativa = 0
+
+        while True:
+            self.metrics.incr(f"{self.nome}.tentativas")
+            inicio_tentativa = time.monotonic()
+            try:
+                response = self.session.request(metodo, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                espera = self._proxima_espera(tentativa, inicio)
+                if espera is None:
+                    self.metrics.incr(f"{self.nome}.erros")
+                    raise
+                print(f"Erro de rede em {url}, repetindo em {espera:.2f}s: {e}")
+            else:
+                self.metrics.observe(f"{self.nome}.latencia", time.monotonic() - inicio_tentativa)
+                if response.status_code not in STATUS_RETENTATIVA:
+                    return response
+                espera = self._proxima_espera(tentativa, inicio, response.headers.get("Retry-After"))
+                if espera is None:
+                    self.metrics.incr(f"{self.nome}.erros")
+                    return response
+                # Liberar a conexão para o pool antes de esperar
+                response.close()
+
+            self.metrics.incr(f"{self.nome}.retentativas")
+            time.sleep(espera)
+            tentativa += 1
+
+    def close(self):
+        """Fecha as conexões do pool."""
+        self.session.close()
+
+
+class AsyncHTTPClient(_RetryPolicy):
+    """
+    Versão assíncrona do HTTPClient, baseada em `httpx.AsyncClient`.
+
+    As esperas entre tentativas usam `asyncio.sleep`, de modo que uma
+    requisição aguardando a API não ocupa nenhuma thread.
+    """
+
+    def __init__(self, pool_maxsize=32, connect_timeout=3.05, read_timeout=30.0,
+                 max_retries=2, backoff_base=0.2, backoff_max=2.0, retry_budget=5.0,
+                 nome="http", metrics=metrics):
+        """
+        Inicializa o cliente.
+
+        Args:
+            pool_maxsize (int, optional): Conexões mantidas abertas
+            connect_timeout (float, optional): Prazo em segundos para abrir a conexão
+            read_timeout (float, optional): Prazo em segundos entre bytes da resposta
+            max_retries (int, optional): Repetições após a primeira tentativa
+            backoff_base (float, optional): Espera base, em segundos, antes da primeira repetição
+            backoff_max (float, optional): Espera máxima entre tentativas
+            retry_budget (float, optional): Tempo máximo, em segundos, gasto com repetições em uma requisição
+            nome (str, optional): Prefixo das métricas
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+        """
+        # Importação tardia: httpx só é necessário para o endpoint assíncrono
+        import httpx
+
+        super().__init__(connect_timeout, read_timeout, max_retries, backoff_base,
+                         backoff_max, retry_budget, nome, metrics)
+        self._httpx = httpx
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize)
+        )
+
+    async def post_json(self, url, payload, headers=None):
+        """
+        Envia um POST com corpo JSON.
+
+        Args:
+            url (str): Endereço da requisição
+            payload (dict): Corpo a ser serializado em JSON
+            headers (dict, optional): Cabeçalhos adicionais
+
+        Returns:
+            httpx.Response: Última resposta recebida
+        """
+        return await self.request("POST", url, json=payload, headers=headers)
+
+    async def request(self, metodo, url, **kwargs):
+        """
+        Executa uma requisição repetindo falhas transitórias.
+
+        Args:
+            metodo (str): Método HTTP
+            url (str): Endereço da requisição
+            **kwargs: Argumentos repassados a `httpx.AsyncClient.request`
+
+        Returns:
+            httpx.Response: Última resposta recebida
+
+        Raises:
+            httpx.TransportError: Se a última tentativa falhou por erro de rede
+        """
+        inicio = time.monotonic()
+        tentativa = 0
+
+        while True:
+            self.metrics.incr(f"{self.nome}.tentativas")
+            inicio_tentativa = time.monotonic()
+            try:
+                response = await self.client.request(metodo, url, **kwargs)
+            except self._httpx.TransportError as e:
+                espera = self._proxima_espera(tentativa, inicio)
+                if espera is None:
+                    self.metrics.incr(f"{self.nome}.erros")
+                    raise
+                print(f"Erro de rede em {url}, repetindo em {espera:.2f}s: {e}")
+            else:
+                self.metrics.observe(f"{self.nome}.latencia", time.monotonic() - inicio_tentativa)
+                if response.status_code not in STATUS_RETENTATIVA:
+                    return response
+                espera = self._proxima_espera(tentativa, inicio, response.headers.get("Retry-After"))
+                if espera is None:
+                    self.metrics.incr(f"{self.nome}.erros")
+                    return response
+
+            self.metrics.incr(f"{self.nome}.retentativas")
+            await asyncio.sleep(espera)
+            tentativa += 1
+
+    async def aclose(self):
+        """Fecha as conexões do pool."""
+        await self.client.aclose()
+
+
+_cliente_llm = None
+_cliente_llm_lock = threading.Lock()
+
+# Um cliente assíncrono por laço de eventos, pois as conexões do httpx pertencem ao laço que as criou
+_clientes_llm_async = {}
+
+
+def get_llm_http_client():
+    """
+    Retorna o cliente HTTP compartilhado pelas chamadas à API de LLM.
+
+    Returns:
+        HTTPClient: Cliente configurado a partir das settings `LLM_HTTP_*`
+    """
+    global _cliente_llm
+    if _cliente_llm is None:
+        with _cliente_llm_lock:
+            if _cliente_llm is None:
+                _cliente_llm = HTTPClient(**_configuracao_llm_http())
+    return _cliente_llm
+
+
+def _configuracao_llm_http():
+    """Parâmetros dos clientes da API de LLM definidos nas settings `LLM_HTTP_*`."""
+    return {
+        "pool_maxsize": getattr(settings, 'LLM_HTTP_POOL_MAXSIZE', 32),
+        "connect_timeout": getattr(settings, 'LLM_HTTP_CONNECT_TIMEOUT', 3.05),
+        "read_timeout": getattr(settings, 'LLM_HTTP_READ_TIMEOUT', 30.0),
+        "max_retries": getattr(settings, 'LLM_HTTP_MAX_RETENTATIVAS', 2),
+        "backoff_base": getattr(settings, 'LLM_HTTP_BACKOFF_BASE', 0.2),
+        "backoff_max": getattr(settings, 'LLM_HTTP_BACKOFF_MAX', 2.0),
+        "retry_budget": getattr(settings, 'LLM_HTTP_ORCAMENTO_RETENTATIVAS', 5.0),
+        "nome": "llm.http"
+    }
+
+
+def get_llm_async_http_client():
+    """
+    Retorna o cliente HTTP assíncrono da API de LLM para o laço de eventos atual.
+
+    Returns:
+        AsyncHTTPClient: Cliente configurado a partir das settings `LLM_HTTP_*`
+    """
+    laco = asyncio.get_running_loop()
+    cliente = _clientes_llm_async.get(laco)
+    if cliente is None:
+        # Descartar clientes de laços já encerrados
+        for antigo in [outro for outro in _clientes_llm_async if outro.is_closed()]:
+            del _clientes_llm_async[antigo]
+        cliente = _clientes_llm_async[laco] = AsyncHTTPClient(**_configuracao_llm_http())
+    return cliente
@@ -0,0 +1,381 @@
+"""
+Roteamento entre endpoints equivalentes da API de LLM para o Assistente Virtual de Pagamentos.
+Escolhe o endpoint pela latência observada e pela saúde, e pode duplicar requisições lentas (hedging).
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from .http_client import STATUS_RETENTATIVA
+from ..utils.metrics import LatencySummary, metrics
+
+# Amostras novas entre dois recálculos do atraso de hedging
+RECALCULO_ATRASO = 16
+
+
+class Endpoint:
+    """Estado observado de um endpoint da API."""
+
+    def __init__(self, url, janela=256):
+        """
+        Inicializa o endpoint sem observações.
+
+        Args:
+            url (str): Endereço do endpoint
+            janela (int, optional): Amostras de latência mantidas para os percentis
+        """
+        self.url = url
+        self.ewma = None
+        self.latencias = LatencySummary(janela)
+        self.em_andamento = 0
+        self.falhas_consecutivas = 0
+        self.suspenso_ate = 0.0
+
+    def snapshot(self, agora):
+        """Retorna o estado do endpoint em um dicionário serializável em JSON."""
+        return {
+            "url": self.url,
+            "ewma": self.ewma,
+            "p95": self.latencias.percentil(95),
+            "em_andamento": self.em_andamento,
+            "falhas_consecutivas": self.falhas_consecutivas,
+            "suspenso": self.suspenso_ate > agora
+        }
+
+
+class LLMRouter:
+    """
+    Roteador de requisições entre endpoints equivalentes.
+
+    Cada requisição vai para o endpoint saudável com menor latência média
+    móvel exponencial (EWMA), ponderada pelas requisições em andamento;
+    endpoints ainda sem observações são experimentados primeiro. Após
+    `max_falhas` falhas seguidas, o endpoint fica suspenso por
+    `tempo_suspensao` segundos. Com o hedging ativo, se a resposta não chega
+    dentro do percentil configurado das latências recentes, uma segunda
+    requisição vai para outro endpoint; vale a primeira resposta válida e a
+    outra é cancelada (ou descartada, no cliente síncrono).
+    """
+
+    def __init__(self, urls, alfa=0.3, max_falhas=3, tempo_suspensao=30.0, hedge=False,
+                 hedge_percentil=95, hedge_min_amostras=20, hedge_atraso_minimo=0.05,
+                 hedge_workers=16, nome="roteador", metrics=metrics):
+        """
+        Inicializa o roteador.
+
+        Args:
+            urls (list): Endereços dos endpoints equivalentes
+            alfa (float, optional): Peso da amostra mais recente na EWMA
+            max_falhas (int, optional): Falhas seguidas que suspendem um endpoint
+            tempo_suspensao (float, optional): Segundos de suspensão de um endpoint
+            hedge (bool, optional): Ativa a segunda requisição para respostas lentas
+            hedge_percentil (float, optional): Percentil das latências usado como atraso do hedging
+            hedge_min_amostras (int, optional): Amostras necessárias antes de duplicar requisições
+            hedge_atraso_minimo (float, optional): Atraso mínimo, em segundos, antes da segunda requisição
+            hedge_workers (int, optional): Threads para as requisições duplicadas do cliente síncrono
+            nome (str, optional): Prefixo das métricas
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+        """
+        if not urls:
+            raise ValueError("É necessário ao menos um endpoint")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.alfa = alfa
+        self.max_falhas = max_falhas
+        self.tempo_suspensao = tempo_suspensao
+        self.hedge = hedge and len(self.endpoints) > 1
+        self.hedge_percentil = hedge_percentil
+        self.hedge_min_amostras = hedge_min_amostras
+        self.hedge_atraso_minimo = hedge_atraso_minimo
+        self.hedge_workers = hedge_workers
+        self.nome = nome
+        self.metrics = metrics
+
+        self._lock = threading.Lock()
+        self._latencias = LatencySummary()
+        self._atraso_hedge = None
+        self._amostras_desde_recalculo = 0
+        self._executor = None
+
+        metrics.register_gauge(nome, self.snapshot)
+
+    @property
+    def urls(self):
+        """Endereços dos endpoints, na ordem configurada."""
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def escolher(self, excluir=()):
+        """
+        Escolhe o endpoint para a próxima requisição.
+
+        Args:
+            excluir (iterable, optional): Endpoints que não devem ser escolhidos
+
+        Returns:
+            Endpoint: Endpoint escolhido, ou None se não houver outro disponível
+        """
+        agora = time.monotonic()
+        with self._lock:
+            candidatos = [endpoint for endpoint in self.endpoints if endpoint not in excluir]
+            if not candidatos:
+                return None
+            saudaveis = [endpoint for endpoint in candidatos if endpoint.suspenso_ate <= agora]
+            if not saudaveis:
+                # Todos suspensos: tentar o que volta primeiro; o disjuntor cuida da falha geral
+                return min(candidatos, key=lambda endpoint: endpoint.suspenso_ate)
+            return min(saudaveis, key=self._custo)
+
+    def atraso_hedge(self):
+        """
+        Calcula quanto esperar antes de duplicar uma requisição.
+
+        Returns:
+            float: Atraso em segundos, ou None se o hedging estiver desativado
+            ou ainda não houver amostras suficientes
+        """
+        if not self.hedge:
+            return None
+        with self._lock:
+            return self._atraso_hedge
+
+    def post_json(self, cliente, payload, headers=None, stream=False):
+        """
+        Envia um POST com corpo JSON pelo cliente síncrono.
+
+        Args:
+            cliente (HTTPClient): Cliente HTTP
+            payload (dict): Corpo a ser serializado em JSON
+            headers (dict, optional): Cabeçalhos adicionais
+            stream (bool, optional): Se True, o corpo é lido sob demanda e não há hedging
+
+        Returns:
+            requests.Response: Primeira resposta válida, ou a última recebida
+
+        Raises:
+            requests.RequestException: Se nenhuma requisição obteve resposta
+        """
+        primario = self.escolher()
+        atraso = None if stream else self.atraso_hedge()
+        if atraso is None:
+            return self._enviar(cliente, primario, payload, headers, stream)
+
+        executor = self._obter_executor()
+        futuros = {executor.submit(self._enviar, cliente, primario, payload, headers): primario}
+        feitos, _ = wait(futuros, timeout=atraso)
+        if not feitos:
+            self._duplicar(primario, lambda secundario: futuros.setdefault(
+                executor.submit(self._enviar, cliente, secundario, payload, headers), secundario
+            ))
+
+        pendentes = set(futuros)
+        ultimo = None
+        while pendentes:
+            feitos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in feitos:
+                ultimo = futuro
+                if futuro.exception() is None and futuro.result().status_code not in STATUS_RETENTATIVA:
+                    self._registrar_vencedor(futuros[futuro], primario)
+                    for perdedor in (feitos | pendentes) - {futuro}:
+                        perdedor.add_done_callback(self._descartar)
+                    return futuro.result()
+        return ultimo.result()
+
+    async def apost_json(self, cliente, payload, headers=None):
+        """
+        Versão assíncrona de `post_json`; a requisição perdedora é cancelada.
+
+        Args:
+            cliente (AsyncHTTPClient): Cliente HTTP assíncrono
+            payload (dict): Corpo a ser serializado em JSON
+            headers (dict, optional): Cabeçalhos adicionais
+
+        Returns:
+            httpx.Response: Primeira resposta válida, ou a última recebida
+
+        Raises:
+            httpx.TransportError: Se nenhuma requisição obteve resposta
+        """
+        primario = self.escolher()
+        atraso = self.atraso_hedge()
+        if atraso is None:
+            return await self._aenviar(cliente, primario, payload, headers)
+
+        tarefas = {asyncio.ensure_future(self._aenviar(cliente, primario, payload, headers)): primario}
+        pendentes = set(tarefas)
+        try:
+            feitos, _ = await asyncio.wait(pendentes, timeout=atraso)
+            if not feitos:
+                self._duplicar(primario, lambda secundario: tarefas.setdefault(
+                    asyncio.ensure_future(self._aenviar(cliente, secundario, payload, headers)), secundario
+                ))
+                pendentes = set(tarefas)
+
+            ultimo = None
+            while pendentes:
+                feitos, pendentes = await asyncio.wait(pendentes, return_when=asyncio.FIRST_COMPLETED)
+                for tarefa in feitos:
+                    ultimo = tarefa
+                    if tarefa.exception() is None and tarefa.result().status_code not in STATUS_RETENTATIVA:
+                        self._registrar_vencedor(tarefas[tarefa], primario)
+                        return tarefa.result()
+            return ultimo.result()
+        finally:
+            # A perdedora (ou todas, se quem chamou desistiu) é cancelada
+            for tarefa in pendentes:
+                tarefa.cancel()
+
+    def snapshot(self):
+        """
+        Retorna o estado do roteador em um dicionário serializável em JSON.
+
+        Returns:
+            dict: Atraso atual do hedging e estado de cada endpoint
+        """
+        agora = time.monotonic()
+        with self._lock:
+            return {
+                "atraso_hedge": self._atraso_hedge if self.hedge else None,
+                "endpoints": [endpoint.snapshot(agora) for endpoint in self.endpoints]
+            }
+
+    def _custo(self, endpoint):
+        """Latência esperada do endpoint considerando as requisições em andamento."""
+        if endpoint.ewma is None:
+            return 0.0
+        return endpoint.ewma * (1 + endpoint.em_andamento)
+
+    def _enviar(self, cliente, endpoint, payload, headers, stream=False):
+        """Envia a requisição a um endpoint e registra o resultado."""
+        self._iniciar(endpoint)
+        inicio = time.monotonic()
+        try:
+            response = cliente.post_json(endpoint.url, payload, headers=headers, stream=stream)
+        except Exception:
+            self._finalizar(endpoint, time.monotonic() - inicio, falha=True)
+            raise
+        self._finalizar(endpoint, time.monotonic() - inicio, falha=response.status_code in STATUS_RETENTATIVA)
+        return response
+
+    async def _aenviar(self, cliente, endpoint, payload, headers):
+        """Versão assíncrona de `_enviar`."""
+        self._iniciar(endpoint)
+        inicio = time.monotonic()
+        try:
+            response = await cliente.post_json(endpoint.url, payload, headers=headers)
+        except asyncio.CancelledError:
+            self._finalizar(endpoint, time.monotonic() - inicio, falha=False, cancelada=True)
+            raise
+        except Exception:
+            self._finalizar(endpoint, time.monotonic() - inicio, falha=True)
+            raise
+        self._finalizar(endpoint, time.monotonic() - inicio, falha=response.status_code in STATUS_RETENTATIVA)
+        return response
+
+    def _iniciar(self, endpoint):
+        """Conta uma requisição em andamento no endpoint."""
+        self.metrics.incr(f"{self.nome}.requisicoes")
+        with self._lock:
+            endpoint.em_andamento += 1
+
+    def _finalizar(self, endpoint, latencia, falha, cancelada=False):
+        """
+        Atualiza a latência e a saúde do endpoint ao fim de uma requisição.
+
+        Só respostas válidas entram na EWMA e nos percentis: uma falha rápida
+        ou uma requisição cancelada (a perdedora do hedging) mediria menos que
+        a latência real e atrairia mais requisições para o endpoint.
+        """
+        with self._lock:
+            endpoint.em_andamento -= 1
+            if cancelada:
+                return
+
+            if falha:
+                endpoint.falhas_consecutivas += 1
+                if endpoint.falhas_consecutivas >= self.max_falhas:
+                    endpoint.suspenso_ate = time.monotonic() + self.tempo_suspensao
+                    self.metrics.incr(f"{self.nome}.suspensoes")
+                return
+
+            endpoint.falhas_consecutivas = 0
+            endpoint.ewma = latencia if endpoint.ewma is None else (
+                self.alfa * latencia + (1 - self.alfa) * endpoint.ewma
+            )
+            endpoint.latencias.observe(latencia)
+            self._latencias.observe(latencia)
+            self._amostras_desde_recalculo += 1
+            if self._amostras_desde_recalculo >= RECALCULO_ATRASO and self._latencias.total >= self.hedge_min_amostras:
+                self._amostras_desde_recalculo = 0
+                self._atraso_hedge = max(self.hedge_atraso_minimo, self._latencias.percentil(self.hedge_percentil))
+
+    def _duplicar(self, primario, enviar):
+        """Envia a segunda requisição a outro endpoint, se houver um saudável."""
+        secundario = self.escolher(excluir=(primario,))
+        if secundario is None or secundario.suspenso_ate > time.monotonic():
+            return
+        self.metrics.incr(f"{self.nome}.hedge.disparos")
+        enviar(secundario)
+
+    def _registrar_vencedor(self, vencedor, primario):
+        """Conta as vezes em que a requisição duplicada chegou primeiro."""
+        if vencedor is not primario:
+            self.metrics.incr(f"{self.nome}.hedge.vitorias")
+
+    def _descartar(self, futuro):
+        """Libera a conexão de uma resposta perdedora do cliente síncrono."""
+        self.metrics.incr(f"{self.nome}.hedge.descartadas")
+        if not futuro.cancelled() and futuro.exception() is None:
+            futuro.result().close()
+
+    def _obter_executor(self):
+        """Cria sob demanda as threads das requisições duplicadas."""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.hedge_workers, thread_name_prefix=f"{self.nome}-hedge"
+                    )
+        return self._executor
+
+
+_roteador_llm = None
+_roteador_llm_lock = threading.Lock()
+
+
+def _urls_llm():
+    """Endpoints da API de LLM: `LLM_API_URLS` (lista) ou, na falta dela, `LLM_API_URL`."""
+    urls = os.environ.get('LLM_API_URLS')
+    if urls:
+        return [url.strip() for url in urls.split(",") if url.strip()]
+    urls = getattr(settings, 'LLM_API_URLS', None)
+    if urls:
+        return list(urls)
+    return [os.environ.get('LLM_API_URL') or getattr(settings, 'LLM_API_URL', 'https://api.openai.com/v1/chat/completions')]
+
+
+def get_llm_router():
+    """
+    Retorna o roteador compartilhado pelas chamadas à API de LLM.
+
+    Returns:
+        LLMRouter: Roteador configurado a partir das settings `LLM_API_URLS` e `LLM_ROTEADOR_*`
+    """
+    global _roteador_llm
+    if _roteador_llm is None:
+        with _roteador_llm_lock:
+            if _roteador_llm is None:
+                _roteador_llm = LLMRouter(
+                    _urls_llm(),
+                    alfa=getattr(settings, 'LLM_ROTEADOR_ALFA', 0.3),
+                    max_falhas=getattr(settings, 'LLM_ROTEADOR_MAX_FALHAS', 3),
+                    tempo_suspensao=getattr(settings, 'LLM_ROTEADOR_TEMPO_SUSPENSAO', 30.0),
+                    hedge=getattr(settings, 'LLM_ROTEADOR_HEDGE', False),
+                    hedge_percentil=getattr(settings, 'LLM_ROTEADOR_HEDGE_PERCENTIL', 95),
+                    hedge_min_amostras=getattr(settings, 'LLM_ROTEADOR_HEDGE_MIN_AMOSTRAS', 20),
+                    hedge_atraso_minimo=getattr(settings, 'LLM_ROTEADOR_HEDGE_ATRASO_MINIMO', 0.05),
+                    hedge_workers=getattr(settings, 'LLM_ROTEADOR_HEDGE_WORKERS', 16),
+                    nome="llm.roteador"
+                )
+    return _roteador_llm
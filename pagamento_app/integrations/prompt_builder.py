@@ -0,0 +1,234 @@
+"""
+Montagem dos prompts enviados à API de LLM pelo Assistente Virtual de Pagamentos.
+Mantém as partes fixas prontas e ajusta o histórico a um orçamento de tokens.
+"""
+
+import math
+import re
+from collections import namedtuple
+from django.conf import settings
+from ..utils.cache import LRUCache
+from ..utils.metrics import metrics
+
+# Tokens extras que a API cobra por mensagem (papel e delimitadores)
+TOKENS_POR_MENSAGEM = 4
+
+# Tokens que a API acrescenta para iniciar a resposta do assistente
+TOKENS_RESPOSTA = 3
+
+# Palavras mantidas de cada mensagem antiga no resumo do histórico
+PALAVRAS_POR_ITEM_RESUMO = 8
+
+_PEDACOS_RE = re.compile(r"\w+|[^\w\s]")
+
+PromptMontado = namedtuple("PromptMontado", "mensagens tokens historico_incluido historico_resumido")
+
+
+class TokenCounter:
+    """
+    Contador de tokens com cache por texto.
+
+    Usa o tiktoken quando instalado; caso contrário, estima os tokens
+    como um por sinal de pontuação e um a cada quatro letras de cada palavra,
+    aproximação próxima da tokenização BPE para português.
+    """
+
+    def __init__(self, modelo=None, maxsize=4096):
+        """
+        Inicializa o contador.
+
+        Args:
+            modelo (str, optional): Modelo cuja codificação deve ser usada pelo tiktoken
+            maxsize (int, optional): Número de textos com contagem guardada
+        """
+        self.cache = LRUCache(maxsize)
+        self._codificacao = None
+        try:
+            import tiktoken
+        except ImportError:
+            return
+        try:
+            self._codificacao = tiktoken.encoding_for_model(modelo)
+        except KeyError:
+            self._codificacao = tiktoken.get_encoding("cl100k_base")
+
+    def contar(self, texto):
+        """
+        Conta os tokens de um texto.
+
+        Args:
+            texto (str): Texto a ser contado
+
+        Returns:
+            int: Número de tokens
+        """
+        tokens = self.cache.get(texto)
+        if tokens is None:
+            tokens = self._contar(texto)
+            self.cache.set(texto, tokens)
+        return tokens
+
+    def _contar(self, texto):
+        """Conta os tokens sem consultar o cache."""
+        if self._codificacao is not None:
+            return len(self._codificacao.encode(texto))
+        return sum(
+            max(1, math.ceil(len(pedaco) / 4)) if pedaco[0].isalnum() or pedaco[0] == "_" else 1
+            for pedaco in _PEDACOS_RE.findall(texto)
+        )
+
+
+class PromptBuilder:
+    """
+    Montador de prompts com orçamento de tokens.
+
+    As mensagens fixas (contexto do sistema e instruções de formato) são
+    criadas e contadas uma única vez. O histórico é incluído do mais recente
+    para o mais antigo enquanto couber no orçamento; o que sobrar vira um
+    resumo curto, se ainda houver espaço para ele.
+    """
+
+    def __init__(self, system_context, instrucoes=None, orcamento_tokens=1200,
+                 max_historico=5, resumo_max_tokens=120, contador=None,
+                 nome="prompt", metrics=metrics):
+        """
+        Inicializa o montador.
+
+        Args:
+            system_context (str): Contexto do sistema, sempre no início
+            instrucoes (str, optional): Instruções fixas, sempre no final
+            orcamento_tokens (int, optional): Máximo de tokens do prompt inteiro
+            max_historico (int, optional): Máximo de itens do histórico considerados
+            resumo_max_tokens (int, optional): Máximo de tokens do resumo do histórico
+            contador (TokenCounter, optional): Contador de tokens
+            nome (str, optional): Prefixo das métricas
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+        """
+        self.contador = contador or TokenCounter()
+        self.orcamento_tokens = orcamento_tokens
+        self.max_historico = max_historico
+        self.resumo_max_tokens = resumo_max_tokens
+        self.nome = nome
+        self.metrics = metrics
+
+        self._sistema = {"role": "system", "content": system_context}
+        self._instrucoes = {"role": "system", "content": instrucoes} if instrucoes else None
+        self._tokens_fixos = TOKENS_RESPOSTA + self._tokens_mensagem(self._sistema)
+        if self._instrucoes:
+            self._tokens_fixos += self._tokens_mensagem(self._instrucoes)
+
+    def montar(self, mensagem, historico=None, extras=None):
+        """
+        Monta as mensagens de uma requisição.
+
+        Args:
+            mensagem (str): Mensagem atual do usuário
+            historico (list, optional): Itens do histórico com `texto_usuario` e/ou `texto_assistente`
+            extras (list, optional): Textos de sistema adicionais, logo após o contexto
+
+        Returns:
+            PromptMontado: Mensagens, total de tokens e quantos itens do histórico
+            foram incluídos inteiros ou resumidos
+        """
+        atual = {"role": "user", "content": mensagem}
+        mensagens_extras = [{"role": "system", "content": extra} for extra in extras or []]
+        usados = self._tokens_fixos + self._tokens_mensagem(atual)
+        usados += sum(self._tokens_mensagem(extra) for extra in mensagens_extras)
+
+        # Do mais recente para o mais antigo, enquanto couber
+        incluidas = []
+        omitidos = []
+        itens = list(historico or [])[-self.max_historico:] if self.max_historico else []
+        for indice in range(len(itens) - 1, -1, -1):
+            mensagens_item = self._mensagens_item(itens[indice])
+            custo = sum(self._tokens_mensagem(m) for m in mensagens_item)
+            if usados + custo > self.orcamento_tokens:
+                omitidos = itens[:indice + 1]
+                break
+            usados += custo
+            incluidas[:0] = mensagens_item
+
+        resumo = self._resumir(omitidos, self.orcamento_tokens - usados) if omitidos else None
+        if resumo:
+            usados += self._tokens_mensagem(resumo)
+
+        mensagens = [self._sistema] + mensagens_extras
+        if resumo:
+            mensagens.append(resumo)
+        mensagens.extend(incluidas)
+        mensagens.append(atual)
+        if self._instrucoes:
+            mensagens.append(self._instrucoes)
+
+        self.metrics.incr(f"{self.nome}.requisicoes")
+        self.metrics.incr(f"{self.nome}.tokens", usados)
+        if omitidos:
+            self.metrics.incr(f"{self.nome}.historico_cortado")
+
+        return PromptMontado(
+            mensagens,
+            usados,
+            len(itens) - len(omitidos),
+            len(omitidos) if resumo else 0
+        )
+
+    def _tokens_mensagem(self, mensagem):
+        """Tokens de uma mensagem, incluindo o custo fixo por mensagem."""
+        return TOKENS_POR_MENSAGEM + self.contador.contar(mensagem["content"])
+
+    @staticmethod
+    def _mensagens_item(item):
+        """Converte um item do histórico nas mensagens correspondentes."""
+        mensagens = []
+        if 'texto_usuario' in item:
+            mensagens.append({"role": "user", "content": item['texto_usuario']})
+        if 'texto_assistente' in item:
+            mensagens.append({"role": "assistant", "content": item['texto_assistente']})
+        return mensagens
+
+    def _resumir(self, itens, disponivel):
+        """
+        Resume as mensagens do usuário que não couberam no orçamento.
+
+        Returns:
+            dict: Mensagem de sistema com o resumo, ou None se não houver espaço
+        """
+        limite = min(self.resumo_max_tokens, disponivel) - TOKENS_POR_MENSAGEM
+        trechos = []
+        for item in itens:
+            texto = item.get('texto_usuario')
+            if texto:
+                palavras = texto.split()
+                trecho = " ".join(palavras[:PALAVRAS_POR_ITEM_RESUMO])
+                trechos.append(trecho + ("..." if len(palavras) > PALAVRAS_POR_ITEM_RESUMO else ""))
+
+        # Remover os trechos mais antigos até caber
+        while trechos:
+            conteudo = "Resumo das mensagens anteriores do usuário: " + "; ".join(trechos)
+            if self.contador.contar(conteudo) <= limite:
+                return {"role": "system", "content": conteudo}
+            trechos.pop(0)
+        return None
+
+
+def build_prompt_builder(system_context, instrucoes=None, modelo=None):
+    """
+    Cria um montador de prompts com o orçamento definido nas settings `LLM_PROMPT_*`.
+
+    Args:
+        system_context (str): Contexto do sistema
+        instrucoes (str, optional): Instruções fixas ao final do prompt
+        modelo (str, optional): Modelo usado, para a contagem de tokens
+
+    Returns:
+        PromptBuilder: Montador configurado
+    """
+    return PromptBuilder(
+        system_context,
+        instrucoes,
+        orcamento_tokens=getattr(settings, 'LLM_PROMPT_ORCAMENTO_TOKENS', 1200),
+        max_historico=getattr(settings, 'LLM_PROMPT_MAX_HISTORICO', 5),
+        resumo_max_tokens=getattr(settings, 'LLM_PROMPT_RESUMO_MAX_TOKENS', 120),
+        contador=TokenCounter(modelo),
+        nome="llm.prompt"
+    )
@@ -0,0 +1,319 @@
+"""
+Cache de respostas da API de LLM para o Assistente Virtual de Pagamentos.
+Combina chave exata sobre o texto normalizado com busca de quase-duplicatas por MinHash.
+"""
+
+import copy
+import hashlib
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+import numpy as np
+from django.conf import settings
+from ..data import planos
+from ..utils.metrics import metrics
+from ..utils.text_normalizer import analisar_texto
+
+# Palavras que mudam a resposta mesmo em mensagens quase idênticas; só são
+# consideradas parecidas mensagens que citam exatamente os mesmos termos
+# (além dos nomes dos planos do catálogo)
+TERMOS_DISTINTIVOS = frozenset({"pix", "boleto", "cartao", "credito", "debito", "cancelar", "cancelamento"})
+
+# Negações (já sem acentos): "não quero assinar" nunca reaproveita a resposta de
+# "quero assinar", por mais parecidos que sejam os textos
+NEGACOES = frozenset({"nao", "nunca", "jamais", "sem", "nem", "nenhum", "nenhuma"})
+
+# Primo de Mersenne 2^31 - 1: a*x + b cabe em 64 bits para a, b, x menores que ele
+_PRIMO = np.uint64((1 << 31) - 1)
+
+
+def versao_catalogo():
+    """
+    Calcula a versão do catálogo de planos.
+
+    Returns:
+        str: Hash do conteúdo de `data.planos`; muda sempre que um plano muda
+    """
+    conteudo = json.dumps(planos, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(conteudo.encode("utf-8")).hexdigest()
+
+
+def impressao_contexto(contexto):
+    """
+    Resume a parte do contexto que altera a resposta do LLM.
+
+    Args:
+        contexto (dict, optional): Contexto da conversa
+
+    Returns:
+        str: Identificador do contexto (hoje, o plano em discussão)
+    """
+    if not contexto:
+        return ""
+    return contexto.get("plano_atual") or ""
+
+
+class SemanticResponseCache:
+    """
+    Cache de respostas com busca exata e por similaridade.
+
+    A chave exata é o texto normalizado junto com a impressão do contexto.
+    Sem acerto exato, a assinatura MinHash da mensagem (palavras e trigramas
+    de caracteres) é comparada de uma vez com as assinaturas de todas as
+    entradas válidas, guardadas em uma matriz NumPy; a mais parecida é usada
+    se a similaridade de Jaccard estimada atingir o limiar. As entradas
+    expiram após `ttl` segundos, as menos usadas saem quando o tamanho passa
+    de `maxsize` e tudo é descartado quando o catálogo de planos muda (a
+    versão é recalculada no máximo a cada `intervalo_versao` segundos).
+    """
+
+    def __init__(self, maxsize=1024, ttl=600, limiar_similaridade=0.8, n_permutacoes=64,
+                 versao=versao_catalogo, intervalo_versao=5.0, nome="cache", metrics=metrics, semente=42):
+        """
+        Inicializa o cache vazio.
+
+        Args:
+            maxsize (int, optional): Número máximo de respostas guardadas
+            ttl (float, optional): Tempo de vida de cada resposta em segundos
+            limiar_similaridade (float, optional): Similaridade mínima para reaproveitar
+                uma resposta parecida; None desativa a busca por similaridade
+            n_permutacoes (int, optional): Tamanho das assinaturas MinHash
+            versao (callable, optional): Função que retorna a versão do catálogo
+            intervalo_versao (float, optional): Segundos entre duas verificações da versão
+            nome (str, optional): Prefixo das métricas
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+            semente (int, optional): Semente das permutações MinHash
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.limiar_similaridade = limiar_similaridade
+        self.versao = versao
+        self.intervalo_versao = intervalo_versao
+        self.nome = nome
+        self.metrics = metrics
+
+        gerador = np.random.default_rng(semente)
+        self._a = gerador.integers(1, int(_PRIMO), size=n_permutacoes, dtype=np.uint64)
+        self._b = gerador.integers(0, int(_PRIMO), size=n_permutacoes, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        self._assinaturas = np.zeros((maxsize, n_permutacoes), dtype=np.uint64)
+        self._grupos = np.zeros(maxsize, dtype=np.int64)
+        self._expira_em = np.zeros(maxsize, dtype=np.float64)
+        self._ocupada = np.zeros(maxsize, dtype=bool)
+        self._chaves = [None] * maxsize
+        self._linhas_livres = list(range(maxsize - 1, -1, -1))
+        self._versao_atual = None
+        self._proxima_verificacao = 0.0
+
+        metrics.register_gauge(nome, self.stats)
+
+    def get(self, texto, contexto=None):
+        """
+        Busca uma resposta para a mensagem.
+
+        Args:
+            texto (str): Mensagem do usuário
+            contexto (dict, optional): Contexto da conversa
+
+        Returns:
+            dict: Cópia da resposta guardada, ou None
+        """
+        normalizado, tokens = self._analisar(texto)
+        chave = (impressao_contexto(contexto), normalizado)
+        agora = time.monotonic()
+        self._verificar_versao(agora)
+
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                valor, linha = entrada
+                if self._expira_em[linha] > agora:
+                    self._entradas.move_to_end(chave)
+                    self.metrics.incr(f"{self.nome}.acertos_exatos")
+                    return copy.deepcopy(valor)
+                self._remover(chave)
+
+            if self.limiar_similaridade is not None and tokens:
+                linha = self._mais_parecida(self._assinatura(tokens), self._grupo(chave[0], tokens), agora)
+                if linha is not None:
+                    chave_parecida = self._chaves[linha]
+                    self._entradas.move_to_end(chave_parecida)
+                    self.metrics.incr(f"{self.nome}.acertos_similares")
+                    return copy.deepcopy(self._entradas[chave_parecida][0])
+
+        self.metrics.incr(f"{self.nome}.faltas")
+        return None
+
+    def set(self, texto, contexto, valor):
+        """
+        Guarda a resposta de uma mensagem.
+
+        Args:
+            texto (str): Mensagem do usuário
+            contexto (dict, optional): Contexto da conversa
+            valor (dict): Resposta a ser reaproveitada
+        """
+        normalizado, tokens = self._analisar(texto)
+        chave = (impressao_contexto(contexto), normalizado)
+        assinatura = self._assinatura(tokens) if tokens else None
+        self._verificar_versao(time.monotonic())
+
+        with self._lock:
+            if chave in self._entradas:
+                self._remover(chave)
+            while len(self._entradas) >= self.maxsize:
+                chave_antiga = next(iter(self._entradas))
+                self._remover(chave_antiga)
+                self.metrics.incr(f"{self.nome}.evictions")
+
+            linha = self._linhas_livres.pop()
+            self._entradas[chave] = (copy.deepcopy(valor), linha)
+            self._chaves[linha] = chave
+            self._expira_em[linha] = time.monotonic() + self.ttl
+            self._grupos[linha] = self._grupo(chave[0], tokens)
+            # Sem palavras não há assinatura; a entrada só é encontrada pela chave exata
+            self._ocupada[linha] = assinatura is not None
+            if assinatura is not None:
+                self._assinaturas[linha] = assinatura
+
+    def chave(self, texto, contexto=None):
+        """
+        Calcula a chave exata de uma mensagem.
+
+        Args:
+            texto (str): Mensagem do usuário
+            contexto (dict, optional): Contexto da conversa
+
+        Returns:
+            tuple: Impressão do contexto e texto normalizado
+        """
+        return (impressao_contexto(contexto), self._analisar(texto)[0])
+
+    def clear(self):
+        """Remove todas as respostas."""
+        with self._lock:
+            self._limpar()
+
+    def stats(self):
+        """
+        Retorna o estado do cache.
+
+        Returns:
+            dict: Tamanho atual e capacidade
+        """
+        with self._lock:
+            return {"tamanho": len(self._entradas), "capacidade": self.maxsize}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entradas)
+
+    def _analisar(self, texto):
+        """Normaliza a mensagem e extrai suas palavras; a pontuação não faz parte da chave."""
+        analise = analisar_texto(texto)
+        return " ".join(analise.tokens) or analise.normalizado, analise.tokens
+
+    def _assinatura(self, tokens):
+        """Calcula a assinatura MinHash do conjunto de palavras e trigramas da mensagem."""
+        features = set(f"w:{token}" for token in tokens)
+        for token in tokens:
+            marcado = f"<{token}>"
+            features.update(f"c:{marcado[i:i + 3]}" for i in range(len(marcado) - 2))
+
+        valores = np.fromiter(
+            (zlib.crc32(feature.encode("utf-8")) for feature in features),
+            dtype=np.uint64,
+            count=len(features)
+        ) % _PRIMO
+        # Uma linha por permutação; o mínimo de cada linha é um componente da assinatura
+        return ((self._a[:, None] * valores[None, :] + self._b[:, None]) % _PRIMO).min(axis=1)
+
+    @staticmethod
+    def _grupo(impressao, tokens):
+        """
+        Identifica o grupo de entradas comparáveis por similaridade.
+
+        Duas mensagens só são comparadas se tiverem o mesmo contexto, citarem
+        os mesmos planos e termos distintivos e tiverem a mesma polaridade
+        (ambas com ou ambas sem negação).
+
+        Returns:
+            int: Identificador do grupo, para comparação vetorizada
+        """
+        palavras = set(tokens)
+        termos = sorted(palavras & (TERMOS_DISTINTIVOS | frozenset(planos)))
+        negada = "-" if palavras & NEGACOES else "+"
+        return zlib.crc32(f"{impressao}|{negada}|{','.join(termos)}".encode("utf-8"))
+
+    def _mais_parecida(self, assinatura, grupo, agora):
+        """Retorna a linha válida mais parecida com a assinatura, se atingir o limiar."""
+        candidatas = np.flatnonzero(
+            self._ocupada & (self._grupos == grupo) & (self._expira_em > agora)
+        )
+        if len(candidatas) == 0:
+            return None
+        similaridades = (self._assinaturas[candidatas] == assinatura).mean(axis=1)
+        melhor = int(similaridades.argmax())
+        if similaridades[melhor] < self.limiar_similaridade:
+            return None
+        return int(candidatas[melhor])
+
+    def _remover(self, chave):
+        """Remove uma entrada e devolve sua linha da matriz."""
+        _, linha = self._entradas.pop(chave)
+        self._chaves[linha] = None
+        self._ocupada[linha] = False
+        self._expira_em[linha] = 0.0
+        self._linhas_livres.append(linha)
+
+    def _limpar(self):
+        """Esvazia o cache (com o lock já adquirido)."""
+        self._entradas.clear()
+        self._chaves = [None] * self.maxsize
+        self._ocupada[:] = False
+        self._expira_em[:] = 0.0
+        self._linhas_livres = list(range(self.maxsize - 1, -1, -1))
+
+    def _verificar_versao(self, agora):
+        """Esvazia o cache se o catálogo de planos mudou, verificando no máximo a cada intervalo."""
+        if agora < self._proxima_verificacao:
+            return
+        self._proxima_verificacao = agora + self.intervalo_versao
+        # O hash do catálogo é calculado fora do lock das consultas
+        versao = self.versao()
+        with self._lock:
+            if versao != self._versao_atual:
+                if self._versao_atual is not None:
+                    self.metrics.incr(f"{self.nome}.invalidacoes")
+                self._limpar()
+                self._versao_atual = versao
+
+
+_cache_llm = None
+_cache_llm_lock = threading.Lock()
+
+
+def get_llm_response_cache():
+    """
+    Retorna o cache compartilhado das respostas da API de LLM.
+
+    Returns:
+        SemanticResponseCache: Cache configurado a partir das settings `LLM_CACHE_*`
+    """
+    global _cache_llm
+    if _cache_llm is None:
+        with _cache_llm_lock:
+            if _cache_llm is None:
+                _cache_llm = SemanticResponseCache(
+                    maxsize=getattr(settings, 'LLM_CACHE_MAXSIZE', 1024),
+                    ttl=getattr(settings, 'LLM_CACHE_TTL', 600),
+                    limiar_similaridade=getattr(settings, 'LLM_CACHE_LIMIAR_SIMILARIDADE', 0.8),
+                    n_permutacoes=getattr(settings, 'LLM_CACHE_PERMUTACOES', 64),
+                    intervalo_versao=getattr(settings, 'LLM_CACHE_INTERVALO_VERSAO', 5.0),
+                    nome="llm.cache"
+                )
+    return _cache_llm
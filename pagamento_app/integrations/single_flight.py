@@ -0,0 +1,208 @@
+"""
+Coalescência de chamadas idênticas em andamento para o Assistente Virtual de Pagamentos.
+Chamadas simultâneas com a mesma chave compartilham uma única execução.
+"""
+
+import asyncio
+import copy
+import threading
+from ..utils.metrics import metrics
+
+
+class _Voo:
+    """Execução em andamento de uma chave e os chamadores que aguardam por ela."""
+
+    __slots__ = ("concluido", "resultado", "erro", "aguardando")
+
+    def __init__(self):
+        self.concluido = threading.Event()
+        self.resultado = None
+        self.erro = None
+        self.aguardando = 0
+
+
+class SingleFlight:
+    """
+    Coalescedor de chamadas (single-flight).
+
+    A primeira chamada de uma chave executa a função; as que chegam com a
+    mesma chave enquanto ela está em andamento apenas aguardam e recebem uma
+    cópia do mesmo resultado (ou a mesma exceção). Terminada a execução, a
+    chave é liberada: nada é guardado, isso fica a cargo do cache.
+    """
+
+    def __init__(self, nome="coalescencia", metrics=metrics):
+        """
+        Inicializa o coalescedor sem chamadas em andamento.
+
+        Args:
+            nome (str, optional): Prefixo das métricas
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+        """
+        self.nome = nome
+        self.metrics = metrics
+
+        self._lock = threading.Lock()
+        self._voos = {}
+        self._voos_async = {}
+        self._chamadas = 0
+        self._coalescidas = 0
+        self._max_aguardando = 0
+
+        metrics.register_gauge(nome, self.stats)
+
+    def do(self, chave, funcao, *args, **kwargs):
+        """
+        Executa a função uma única vez para todas as chamadas simultâneas da chave.
+
+        Args:
+            chave (hashable): Identificador das chamadas equivalentes
+            funcao (callable): Função executada pela primeira chamada
+            *args: Argumentos posicionais da função
+            **kwargs: Argumentos nomeados da função
+
+        Returns:
+            tuple: (resultado, compartilhado), em que `compartilhado` indica que
+            o resultado veio da execução de outra chamada
+
+        Raises:
+            Exception: A exceção levantada pela execução compartilhada
+        """
+        with self._lock:
+            voo = self._voos.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._voos[chave] = _Voo()
+            self._registrar_chamada(voo, lider)
+
+        if not lider:
+            voo.concluido.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            return copy.deepcopy(voo.resultado), True
+
+        try:
+            resultado = funcao(*args, **kwargs)
+        except BaseException as e:
+            voo.erro = e
+            self._liberar(chave, voo)
+            voo.concluido.set()
+            raise
+
+        # Liberada a chave, ninguém mais se junta ao voo: `aguardando` já é definitivo
+        self._liberar(chave, voo)
+        try:
+            if voo.aguardando:
+                # Cópia própria para os que aguardam: o chamador líder pode alterar o original
+                voo.resultado = copy.deepcopy(resultado)
+        except Exception as e:
+            voo.erro = e
+        finally:
+            voo.concluido.set()
+        return resultado, False
+
+    async def ado(self, chave, funcao, *args, **kwargs):
+        """
+        Versão assíncrona de `do` para corrotinas do mesmo laço de eventos.
+
+        A execução compartilhada roda em uma tarefa própria: o cancelamento de
+        um dos chamadores não a interrompe para os demais.
+
+        Args:
+            chave (hashable): Identificador das chamadas equivalentes
+            funcao (callable): Função assíncrona executada pela primeira chamada
+            *args: Argumentos posicionais da função
+            **kwargs: Argumentos nomeados da função
+
+        Returns:
+            tuple: (resultado, compartilhado)
+
+        Raises:
+            Exception: A exceção levantada pela execução compartilhada
+        """
+        laco = asyncio.get_running_loop()
+        chave_laco = (laco, chave)
+        with self._lock:
+            entrada = self._voos_async.get(chave_laco)
+            lider = entrada is None
+            if lider:
+                voo = _Voo()
+                tarefa = laco.create_task(funcao(*args, **kwargs))
+                self._voos_async[chave_laco] = entrada = (voo, tarefa)
+                tarefa.add_done_callback(lambda _, voo=voo: self._encerrar_async(chave_laco, voo))
+            voo, tarefa = entrada
+            self._registrar_chamada(voo, lider)
+
+        resultado = await asyncio.shield(tarefa)
+        if lider:
+            # Liberada a chave, nenhum chamador novo recebe este mesmo resultado
+            self._encerrar_async(chave_laco, voo)
+            if not voo.aguardando:
+                return resultado, False
+        # O resultado da tarefa é lido por todos; cada chamador recebe sua cópia
+        return copy.deepcopy(resultado), not lider
+
+    def stats(self):
+        """
+        Retorna o estado do coalescedor.
+
+        Returns:
+            dict: Chamadas em andamento, chamadores aguardando e taxa de coalescência
+        """
+        with self._lock:
+            voos = list(self._voos.values()) + [voo for voo, _ in self._voos_async.values()]
+            return {
+                "em_andamento": len(voos),
+                "aguardando": sum(voo.aguardando for voo in voos),
+                "max_aguardando": self._max_aguardando,
+                "chamadas": self._chamadas,
+                "coalescidas": self._coalescidas,
+                "taxa_coalescencia": self._coalescidas / self._chamadas if self._chamadas else 0.0
+            }
+
+    def _registrar_chamada(self, voo, lider):
+        """Contabiliza uma chamada (com o lock já adquirido)."""
+        self._chamadas += 1
+        self.metrics.incr(f"{self.nome}.chamadas")
+        if not lider:
+            voo.aguardando += 1
+            self._coalescidas += 1
+            self.metrics.incr(f"{self.nome}.coalescidas")
+
+    def _liberar(self, chave, voo):
+        """Libera a chave de uma execução síncrona concluída."""
+        with self._lock:
+            del self._voos[chave]
+            self._encerrar(voo)
+
+    def _encerrar(self, voo):
+        """Registra o fim de uma execução (com o lock já adquirido)."""
+        self._max_aguardando = max(self._max_aguardando, voo.aguardando)
+        self.metrics.incr(f"{self.nome}.execucoes")
+
+    def _encerrar_async(self, chave_laco, voo):
+        """Libera a chave de uma execução assíncrona concluída, se ainda for dela."""
+        with self._lock:
+            entrada = self._voos_async.get(chave_laco)
+            if entrada is not None and entrada[0] is voo:
+                del self._voos_async[chave_laco]
+                self._encerrar(voo)
+
+
+_coalescedor_llm = None
+_coalescedor_llm_lock = threading.Lock()
+
+
+def get_llm_single_flight():
+    """
+    Retorna o coalescedor compartilhado pelas análises da API de LLM.
+
+    Returns:
+        SingleFlight: Coalescedor com as métricas em `llm.coalescencia`
+    """
+    global _coalescedor_llm
+    if _coalescedor_llm is None:
+        with _coalescedor_llm_lock:
+            if _coalescedor_llm is None:
+                _coalescedor_llm = SingleFlight(nome="llm.coalescencia")
+    return _coalescedor_llm
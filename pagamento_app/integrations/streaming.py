@@ -0,0 +1,210 @@
+"""
+Suporte a respostas em fluxo (streaming) para o Assistente Virtual de Pagamentos.
+Lê o fluxo de tokens da API de LLM, interpreta o envelope JSON incrementalmente e formata eventos SSE.
+"""
+
+import json
+
+# Campos do envelope entregues assim que seus valores terminam de chegar
+CAMPOS_ENVELOPE = ("intencao", "entidades", "acoes_sugeridas")
+
+# Campo cujo texto é repassado ao usuário à medida que chega
+CAMPO_RESPOSTA = "resposta"
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+def iterar_deltas_sse(linhas):
+    """
+    Extrai os trechos de texto de um fluxo no formato da API de chat (`stream: true`).
+
+    Args:
+        linhas (iterable): Linhas do corpo da resposta, já decodificadas
+
+    Returns:
+        generator: Trechos de texto na ordem em que chegam
+    """
+    for linha in linhas:
+        if not linha or not linha.startswith("data:"):
+            continue
+        dado = linha[5:].strip()
+        if dado == "[DONE]":
+            return
+        try:
+            pedaco = json.loads(dado)
+        except json.JSONDecodeError:
+            continue
+        for escolha in pedaco.get("choices", []):
+            texto = (escolha.get("delta") or {}).get("content")
+            if texto:
+                yield texto
+
+
+def evento_sse(evento, dados):
+    """
+    Formata um evento no protocolo Server-Sent Events.
+
+    Args:
+        evento (str): Nome do evento
+        dados (dict): Conteúdo serializável em JSON
+
+    Returns:
+        str: Evento pronto para ser enviado ao cliente
+    """
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
+class EnvelopeParser:
+    """
+    Interpretador incremental do envelope JSON gerado pelo LLM.
+
+    Recebe o texto em pedaços arbitrários e, a cada pedaço, devolve os
+    eventos já disponíveis: o trecho novo do campo `resposta` (decodificado)
+    e os campos do envelope cujo valor acabou de ser concluído. Texto antes
+    da primeira chave, como marcadores de bloco de código, é ignorado.
+    """
+
+    def __init__(self):
+        """Inicializa o interpretador antes do início do envelope."""
+        self.texto = []
+        self._iniciado = False
+        self._concluido = False
+        self._profundidade = 0
+        self._em_string = False
+        self._escape = False
+        self._unicode = None
+        self._surrogate = None
+        self._string = []
+        self._chave = None
+        self._esperando_valor = False
+        self._bruto = []
+
+    @property
+    def concluido(self):
+        """Indica se o objeto JSON de nível mais alto já foi fechado."""
+        return self._concluido
+
+    def feed(self, pedaco):
+        """
+        Processa mais um pedaço do texto gerado.
+
+        Args:
+            pedaco (str): Texto recebido
+
+        Returns:
+            list: Eventos (`("resposta", trecho)` ou `("campo", nome, valor)`)
+        """
+        self.texto.append(pedaco)
+        eventos = []
+        trecho_resposta = []
+
+        for caractere in pedaco:
+            self._processar(caractere, eventos, trecho_resposta)
+
+        if trecho_resposta:
+            eventos.insert(0, ("resposta", "".join(trecho_resposta)))
+        return eventos
+
+    def _processar(self, c, eventos, trecho_resposta):
+        """Avança a máquina de estados com um caractere."""
+        if self._concluido:
+            return
+        if not self._iniciado:
+            if c == "{":
+                self._iniciado = True
+                self._profundidade = 1
+            return
+
+        if self._profundidade > 1:
+            self._bruto.append(c)
+
+        if self._em_string:
+            self._processar_string(c, eventos, trecho_resposta)
+            return
+
+        if c == '"':
+            self._em_string = True
+            self._string = []
+        elif c in "{[":
+            if self._profundidade == 1 and self._esperando_valor:
+                self._bruto = [c]
+            self._profundidade += 1
+        elif c in "}]":
+            self._profundidade -= 1
+            if self._profundidade == 1 and self._esperando_valor:
+                self._concluir_bruto(eventos)
+            elif self._profundidade == 0:
+                if self._esperando_valor and self._bruto:
+                    self._concluir_bruto(eventos)
+                self._concluido = True
+        elif self._profundidade == 1:
+            if c == ":":
+                self._esperando_valor = True
+                self._bruto = []
+            elif c == ",":
+                if self._esperando_valor and self._bruto:
+                    self._concluir_bruto(eventos)
+                self._esperando_valor = False
+            elif self._esperando_valor and not c.isspace():
+                # Números, true, false e null
+                self._bruto.append(c)
+
+    def _processar_string(self, c, eventos, trecho_resposta):
+        """Trata um caractere dentro de uma string JSON, decodificando escapes."""
+        decodificado = None
+        if self._unicode is not None:
+            self._unicode += c
+            if len(self._unicode) < 4:
+                return
+            codigo = int(self._unicode, 16)
+            self._unicode = None
+            if 0xD800 <= codigo < 0xDC00:
+                self._surrogate = codigo
+                return
+            if 0xDC00 <= codigo < 0xE000 and self._surrogate is not None:
+                codigo = 0x10000 + ((self._surrogate - 0xD800) << 10) + (codigo - 0xDC00)
+            self._surrogate = None
+            decodificado = chr(codigo)
+        elif self._escape:
+            self._escape = False
+            if c == "u":
+                self._unicode = ""
+                return
+            decodificado = _ESCAPES.get(c, c)
+        elif c == "\\":
+            self._escape = True
+            return
+        elif c == '"':
+            self._em_string = False
+            if self._profundidade == 1:
+                valor = "".join(self._string)
+                if self._esperando_valor:
+                    self._concluir_valor(valor, eventos)
+                else:
+                    self._chave = valor
+            return
+        else:
+            decodificado = c
+
+        self._string.append(decodificado)
+        if self._profundidade == 1 and self._esperando_valor and self._chave == CAMPO_RESPOSTA:
+            trecho_resposta.append(decodificado)
+
+    def _concluir_bruto(self, eventos):
+        """Conclui um valor que não é string (objeto, lista, número, booleano ou nulo)."""
+        try:
+            valor = json.loads("".join(self._bruto))
+        except json.JSONDecodeError:
+            valor = None
+        self._concluir_valor(valor, eventos)
+
+    def _concluir_valor(self, valor, eventos):
+        """Registra o fim do valor de um campo de nível mais alto."""
+        if self._chave in CAMPOS_ENVELOPE:
+            eventos.append(("campo", self._chave, valor))
+        self._esperando_valor = False
+        self._bruto = []
+
+    def texto_completo(self):
+        """Retorna todo o texto recebido até agora."""
+        return "".join(self.texto)
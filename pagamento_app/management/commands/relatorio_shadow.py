@@ -0,0 +1,86 @@
+"""
+Comando para resumir as avaliações em modo sombra do processador de LLM.
+"""
+
+from collections import Counter
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from django.utils import timezone
+from ...models import AvaliacaoShadow
+from ...services.shadow_evaluator import intencao_comparavel
+
+
+def _percentil(valores, p):
+    """Percentil de uma lista já ordenada, ou None se ela estiver vazia."""
+    if not valores:
+        return None
+    indice = min(len(valores) - 1, int(round(p / 100.0 * (len(valores) - 1))))
+    return valores[indice]
+
+
+def _ms(valor):
+    """Formata uma latência em milissegundos."""
+    return "-" if valor is None else f"{valor:.1f} ms"
+
+
+class Command(BaseCommand):
+    help = "Compara o processador local com o de LLM a partir das avaliações em modo sombra"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=7, help="Considera as avaliações dos últimos N dias")
+        parser.add_argument("--motor", help="Restringe a um motor avaliado (ex.: llm:gpt-3.5-turbo)")
+        parser.add_argument(
+            "--divergencias",
+            type=int,
+            default=10,
+            help="Quantidade de pares de intenções divergentes listados"
+        )
+
+    def handle(self, *args, **options):
+        avaliacoes = AvaliacaoShadow.objects.filter(
+            criada_em__gte=timezone.now() - timedelta(days=options["dias"])
+        )
+        if options["motor"]:
+            avaliacoes = avaliacoes.filter(motor=options["motor"])
+
+        linhas = list(avaliacoes.values_list(
+            "intencao_primaria", "intencao_shadow", "concordou", "plano_primario", "plano_shadow",
+            "latencia_primaria_ms", "latencia_shadow_ms", "erro"
+        ))
+        if not linhas:
+            raise CommandError("Nenhuma avaliação shadow no período.")
+
+        total = len(linhas)
+        erros = sum(1 for linha in linhas if linha[7])
+        validas = [linha for linha in linhas if not linha[7]]
+        concordancias = sum(1 for linha in validas if linha[2])
+        planos_iguais = sum(1 for linha in validas if linha[3] == linha[4])
+
+        self.stdout.write(f"Avaliações: {total} ({erros} com erro), motores: {', '.join(sorted(set(avaliacoes.values_list('motor', flat=True))))}")
+        if validas:
+            self.stdout.write(f"Concordância de intenção: {concordancias / len(validas):.1%}")
+            self.stdout.write(f"Concordância de plano: {planos_iguais / len(validas):.1%}")
+
+        self.stdout.write("Latência por motor:")
+        for rotulo, indice in (("local", 5), ("shadow", 6)):
+            valores = sorted(linha[indice] for linha in linhas if linha[indice] is not None)
+            self.stdout.write(
+                f"  {rotulo:<7} p50 {_ms(_percentil(valores, 50))}  p95 {_ms(_percentil(valores, 95))}  "
+                f"p99 {_ms(_percentil(valores, 99))}"
+            )
+
+        custo = avaliacoes.aggregate(tokens=Sum("tokens_prompt"), custo=Sum("custo_estimado"))
+        tokens = custo["tokens"] or 0
+        self.stdout.write(
+            f"Tokens de prompt: {tokens} (média {tokens / total:.0f} por mensagem), "
+            f"custo estimado: {custo['custo'] or 0:.4f}"
+        )
+
+        divergencias = Counter(
+            (intencao_comparavel(linha[0]), intencao_comparavel(linha[1])) for linha in validas if not linha[2]
+        )
+        if divergencias:
+            self.stdout.write("Divergências mais comuns (local -> shadow):")
+            for (local, shadow), quantidade in divergencias.most_common(options["divergencias"]):
+                self.stdout.write(f"  {local} -> {shadow}: {quantidade}")
@@ -0,0 +1,38 @@
+"""
+Comando para iniciar o servidor local de inferência de NLP compartilhado pelos workers.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ...utils.inference_server import InferenceServer
+
+
+class Command(BaseCommand):
+    help = "Inicia o servidor de inferência (spaCy e geração de texto) em um socket Unix"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            default=getattr(settings, "NLP_INFERENCE_SOCKET", None),
+            help="Caminho do socket Unix (padrão: NLP_INFERENCE_SOCKET)"
+        )
+        parser.add_argument(
+            "--sem-aquecimento",
+            action="store_true",
+            help="Não carregar os modelos antes de aceitar conexões"
+        )
+
+    def handle(self, *args, **options):
+        if not options["socket"]:
+            raise CommandError("Informe --socket ou configure NLP_INFERENCE_SOCKET.")
+
+        servidor = InferenceServer(options["socket"], timeout=getattr(settings, "NLP_GERACAO_TIMEOUT", 8.0))
+        if not options["sem_aquecimento"]:
+            self.stdout.write("Carregando modelos...")
+            servidor.aquecer()
+
+        self.stdout.write(self.style.SUCCESS(f"Servidor de inferência ouvindo em {options['socket']}"))
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Servidor encerrado.")
@@ -0,0 +1,96 @@
+"""
+Comando para treinar o classificador de intenções a partir das mensagens registradas.
+"""
+
+import os
+import random
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ...models import Mensagem
+from ...utils.intent_classifier import IntentClassifier
+from ...utils.nlp_processor import NLPProcessor
+
+
+class Command(BaseCommand):
+    help = "Treina o classificador de intenções com as mensagens dos usuários e salva os pesos em .npz"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--saida",
+            default=getattr(settings, "NLP_CLASSIFICADOR_PATH", None),
+            help="Arquivo .npz onde os pesos serão salvos"
+        )
+        parser.add_argument("--n-features", type=int, default=2 ** 14, help="Dimensão do espaço de hashing")
+        parser.add_argument("--epocas", type=int, default=200, help="Número de passos de gradiente")
+        parser.add_argument("--taxa-aprendizado", type=float, default=0.5, help="Tamanho do passo")
+        parser.add_argument(
+            "--validacao",
+            type=float,
+            default=0.2,
+            help="Fração das mensagens reservada para comparar com as palavras-chave"
+        )
+        parser.add_argument(
+            "--min-exemplos",
+            type=int,
+            default=5,
+            help="Intenções com menos exemplos que isso são ignoradas"
+        )
+
+    def handle(self, *args, **options):
+        if not options["saida"]:
+            raise CommandError("Informe --saida ou configure NLP_CLASSIFICADOR_PATH.")
+
+        exemplos = list(
+            Mensagem.objects
+            .filter(origem="usuario")
+            .exclude(intencao__isnull=True)
+            .exclude(intencao="")
+            .values_list("texto", "intencao")
+        )
+
+        # Descartar intenções com poucos exemplos
+        contagem = {}
+        for _, intencao in exemplos:
+            contagem[intencao] = contagem.get(intencao, 0) + 1
+        exemplos = [(texto, intencao) for texto, intencao in exemplos if contagem[intencao] >= options["min_exemplos"]]
+
+        if len({intencao for _, intencao in exemplos}) < 2:
+            raise CommandError("São necessárias ao menos duas intenções com exemplos suficientes.")
+
+        random.Random(42).shuffle(exemplos)
+        n_validacao = int(len(exemplos) * options["validacao"])
+        validacao, treino = exemplos[:n_validacao], exemplos[n_validacao:]
+
+        self.stdout.write(f"Treinando com {len(treino)} mensagens e {len(contagem)} intenções...")
+        classificador = IntentClassifier.treinar(
+            [texto for texto, _ in treino],
+            [intencao for _, intencao in treino],
+            n_features=options["n_features"],
+            epocas=options["epocas"],
+            taxa_aprendizado=options["taxa_aprendizado"]
+        )
+
+        if validacao:
+            self._relatar_validacao(classificador, validacao)
+
+        diretorio = os.path.dirname(options["saida"])
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        classificador.salvar(options["saida"])
+        self.stdout.write(self.style.SUCCESS(f"Classificador salvo em {options['saida']}"))
+
+    def _relatar_validacao(self, classificador, validacao):
+        """Compara o acerto do classificador com o das palavras-chave no conjunto de validação."""
+        textos = [texto for texto, _ in validacao]
+        esperadas = [intencao for _, intencao in validacao]
+
+        previstas = [intencao for intencao, _ in classificador.prever_lote(textos)]
+        nlp_processor = NLPProcessor()
+        por_palavras_chave = [nlp_processor.identificar_intencao(texto) for texto in textos]
+
+        acerto_classificador = sum(p == e for p, e in zip(previstas, esperadas)) / len(esperadas)
+        acerto_palavras = sum(p == e for p, e in zip(por_palavras_chave, esperadas)) / len(esperadas)
+        self.stdout.write(
+            f"Validação ({len(esperadas)} mensagens): classificador {acerto_classificador:.1%}, "
+            f"palavras-chave {acerto_palavras:.1%}"
+        )
@@ -23,6 +23,26 @@ def api_login_required(view_func):
         return view_func(request, *args, **kwargs)
     return wrapper
 
+def verificar_equipe(request):
+    """
+    Verifica se a requisição vem de um usuário da equipe (`is_staff`).
+    Para endpoints de API que expõem detalhes internos da aplicação.
+    
+    Returns:
+        JsonResponse: Erro JSON a ser devolvido, ou None se o acesso for permitido
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({
+            'erro': 'Autenticação necessária',
+            'codigo': 401
+        }, status=401)
+    if not request.user.is_staff:
+        return JsonResponse({
+            'erro': 'Permissão negada',
+            'codigo': 403
+        }, status=403)
+    return None
+
 class APILoginRequiredMixin:
     """
     Mixin para verificar se o usuário está autenticado em views baseadas em classe.
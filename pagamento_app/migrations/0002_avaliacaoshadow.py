@@ -0,0 +1,40 @@
+# Generated by Django 3.2.20 on 2026-10-17 01:42
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagamento_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvaliacaoShadow',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('session_id', models.CharField(blank=True, max_length=100)),
+                ('texto', models.TextField()),
+                ('motor', models.CharField(max_length=100)),
+                ('intencao_primaria', models.CharField(max_length=100)),
+                ('intencao_shadow', models.CharField(blank=True, max_length=100)),
+                ('concordou', models.BooleanField(default=False)),
+                ('plano_primario', models.CharField(blank=True, max_length=50, null=True)),
+                ('plano_shadow', models.CharField(blank=True, max_length=50, null=True)),
+                ('camada_primaria', models.CharField(blank=True, max_length=50)),
+                ('latencia_primaria_ms', models.FloatField()),
+                ('latencia_shadow_ms', models.FloatField(blank=True, null=True)),
+                ('tokens_prompt', models.PositiveIntegerField(default=0)),
+                ('custo_estimado', models.DecimalField(decimal_places=6, default=0, max_digits=12)),
+                ('erro', models.TextField(blank=True)),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Avaliação shadow',
+                'verbose_name_plural': 'Avaliações shadow',
+                'ordering': ['-criada_em'],
+            },
+        ),
+    ]
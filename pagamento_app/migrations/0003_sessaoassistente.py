@@ -0,0 +1,27 @@
+# Generated by Django 3.2.20 on 2026-10-17 01:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagamento_app', '0002_avaliacaoshadow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessaoAssistente',
+            fields=[
+                ('session_id', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('dados', models.JSONField(default=dict)),
+                ('versao', models.PositiveIntegerField(default=1)),
+                ('expira_em', models.DateTimeField(db_index=True)),
+                ('atualizada_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Sessão do assistente',
+                'verbose_name_plural': 'Sessões do assistente',
+            },
+        ),
+    ]
@@ -188,3 +188,51 @@ class Mensagem(models.Model):
 
     def __str__(self):
         return f"{self.origem}: {self.texto[:50]}..."
+
+class AvaliacaoShadow(models.Model):
+    """
+    Comparação, em modo sombra, entre o processador local e o processador de LLM
+    para uma mensagem real. Preenchida fora do caminho da requisição.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    session_id = models.CharField(max_length=100, blank=True)
+    texto = models.TextField()
+    motor = models.CharField(max_length=100)
+    intencao_primaria = models.CharField(max_length=100)
+    intencao_shadow = models.CharField(max_length=100, blank=True)
+    concordou = models.BooleanField(default=False)
+    plano_primario = models.CharField(max_length=50, blank=True, null=True)
+    plano_shadow = models.CharField(max_length=50, blank=True, null=True)
+    camada_primaria = models.CharField(max_length=50, blank=True)
+    latencia_primaria_ms = models.FloatField()
+    latencia_shadow_ms = models.FloatField(null=True, blank=True)
+    tokens_prompt = models.PositiveIntegerField(default=0)
+    custo_estimado = models.DecimalField(max_digits=12, decimal_places=6, default=0)
+    erro = models.TextField(blank=True)
+    criada_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Avaliação shadow'
+        verbose_name_plural = 'Avaliações shadow'
+        ordering = ['-criada_em']
+
+    def __str__(self):
+        return f"{self.intencao_primaria} x {self.intencao_shadow} ({self.motor})"
+
+class SessaoAssistente(models.Model):
+    """
+    Contexto de uma sessão do assistente compartilhado entre os processos.
+    A versão é incrementada a cada gravação e permite gravações condicionais.
+    """
+    session_id = models.CharField(max_length=100, primary_key=True)
+    dados = models.JSONField(default=dict)
+    versao = models.PositiveIntegerField(default=1)
+    expira_em = models.DateTimeField(db_index=True)
+    atualizada_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Sessão do assistente'
+        verbose_name_plural = 'Sessões do assistente'
+
+    def __str__(self):
+        return f"{self.session_id} (v{self.versao})"
@@ -0,0 +1,91 @@
+"""
+Guarda temporária dos dados do cartão do Assistente Virtual de Pagamentos.
+Os campos coletados no fluxo de cartão viajam no contexto da sessão apenas cifrados e com validade curta.
+"""
+
+import base64
+import hashlib
+import json
+from django.conf import settings
+from ..utils.metrics import metrics
+
+
+def _chave_padrao():
+    """Chave Fernet derivada da SECRET_KEY, igual em todos os workers do projeto."""
+    digest = hashlib.sha256(f"cartao:{settings.SECRET_KEY}".encode("utf-8")).digest()
+    return base64.urlsafe_b64encode(digest)
+
+
+class CardVault:
+    """
+    Cifra os dados parciais do cartão entre os turnos do fluxo de pagamento.
+
+    O contexto da sessão guarda só o texto cifrado (Fernet: AES com HMAC),
+    então qualquer worker com a mesma chave continua o preenchimento, e o
+    número, o CVV e o CPF nunca chegam em claro ao banco ou ao Redis. Um
+    texto mais antigo que `validade` segundos não é mais aberto.
+    """
+
+    def __init__(self, chave=None, validade=600, nome="cartao", metrics=metrics):
+        """
+        Inicializa o cofre.
+
+        Args:
+            chave (str | bytes, optional): Chave Fernet (32 bytes em base64); por
+                padrão, derivada da SECRET_KEY
+            validade (int, optional): Segundos em que os dados cifrados podem ser abertos
+            nome (str, optional): Prefixo das métricas
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+        """
+        from cryptography.fernet import Fernet
+
+        self.validade = validade
+        self.nome = nome
+        self.metrics = metrics
+        self._fernet = Fernet(chave or _chave_padrao())
+
+    def fechar(self, dados):
+        """
+        Cifra os dados do cartão.
+
+        Args:
+            dados (dict): Campos já validados do cartão
+
+        Returns:
+            str: Texto cifrado, seguro para o contexto da sessão
+        """
+        return self._fernet.encrypt(json.dumps(dados).encode("utf-8")).decode("ascii")
+
+    def abrir(self, cifrado):
+        """
+        Decifra os dados do cartão.
+
+        Args:
+            cifrado (str): Texto produzido por `fechar`, ou None
+
+        Returns:
+            dict: Campos do cartão; vazio se não houver dados ou se estiverem
+            vencidos ou adulterados
+        """
+        from cryptography.fernet import InvalidToken
+
+        if not cifrado:
+            return {}
+        try:
+            return json.loads(self._fernet.decrypt(cifrado.encode("ascii"), ttl=self.validade))
+        except InvalidToken:
+            self.metrics.incr(f"{self.nome}.expirados")
+            return {}
+
+
+def build_card_vault():
+    """
+    Cria o cofre dos dados do cartão configurado pelas settings `CARTAO_*`.
+
+    Returns:
+        CardVault: Cofre com a chave e a validade configuradas
+    """
+    return CardVault(
+        chave=getattr(settings, 'CARTAO_CHAVE_CIFRA', None),
+        validade=getattr(settings, 'CARTAO_DADOS_VALIDADE', 600)
+    )
@@ -4,21 +4,59 @@ Responsável por manter o contexto da conversa e gerar respostas apropriadas.
 """
 
 import json
+import time
 from datetime import datetime
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from ..integrations.advanced_nlp import AdvancedNLPProcessor
+from .card_vault import build_card_vault
+from .session_context import SessionContext
+from .session_locks import SessionLocks
+from .session_store import SessionConflict, build_session_store
+from .shadow_evaluator import get_shadow_evaluator
+from ..utils.metrics import metrics
 from ..utils.nlp_processor import NLPProcessor
+from ..utils.slot_validators import SLOTS_CARTAO
+from ..utils.text_normalizer import normalizar_texto
 from ..data import planos
 
+# Vezes que um turno é refeito após conflito de gravação com outro worker
+MAX_TENTATIVAS_TURNO = 3
+
+# Palavras que interrompem o preenchimento dos dados do cartão
+PALAVRAS_CANCELAMENTO_SLOT = frozenset(["cancelar", "cancela", "cancelo", "desistir", "desisto", "sair", "parar"])
+
+
+def _inicio_maiusculo(frase):
+    """Coloca em maiúscula só a primeira letra (sem alterar siglas como CVV)."""
+    return frase[:1].upper() + frase[1:]
+
+
 class DialogManager:
     """
     Gerenciador de diálogos que mantém o estado da conversa
     e determina as próximas ações com base nas intenções do usuário.
     """
     
-    def __init__(self):
-        """Inicializa o gerenciador de diálogos."""
+    def __init__(self, session_store=None, card_vault=None):
+        """
+        Inicializa o gerenciador de diálogos.
+        
+        Args:
+            session_store (SessionStore, optional): Onde o contexto das sessões é guardado;
+                por padrão, o configurado pelas settings `SESSOES_*`
+            card_vault (CardVault, optional): Cifra dos dados do cartão entre os turnos;
+                por padrão, a configurada pelas settings `CARTAO_*`
+        """
         self.nlp_processor = NLPProcessor()
-        # Dicionário para armazenar contexto das sessões
-        self.session_contexts = {}
+        self.llm_processor = AdvancedNLPProcessor()
+        self.shadow_evaluator = get_shadow_evaluator()
+        # Armazenamento limitado do contexto das sessões
+        self.session_store = session_store if session_store is not None else build_session_store()
+        self.card_vault = card_vault or build_card_vault()
+        self.session_locks = SessionLocks(listras=getattr(settings, 'SESSOES_LOCK_LISTRAS', 64))
+        self.max_historico = getattr(settings, 'SESSOES_MAX_HISTORICO', 20)
+        self.max_pagamentos = getattr(settings, 'SESSOES_MAX_PAGAMENTOS', 50)
     
     def get_session_context(self, session_id, user_data=None):
         """
@@ -29,22 +67,35 @@ class DialogManager:
             user_data (dict, optional): Dados do usuário para inicializar o contexto
             
         Returns:
-            dict: Contexto da sessão
+            SessionContext: Contexto da sessão
         """
-        if session_id not in self.session_contexts:
+        contexto = self.session_store.get(session_id)
+        if contexto is None:
             # Inicializar novo contexto
-            self.session_contexts[session_id] = {
-                "plano_atual": None,
-                "nome": user_data.get("nome", "Usuário") if user_data else "Usuário",
-                "email": user_data.get("email") if user_data else None,
-                "etapa_cartao": 0,
-                "dados_cartao": {},
-                "historico": []
-            }
-        
-        return self.session_contexts[session_id]
+            contexto = SessionContext(
+                nome=user_data.get("nome", "Usuário") if user_data else "Usuário",
+                email=user_data.get("email") if user_data else None,
+                max_historico=self.max_historico,
+                max_pagamentos=self.max_pagamentos
+            )
+            self.session_store.set(session_id, contexto)
+        elif not isinstance(contexto, SessionContext):
+            # Armazenamentos compartilhados devolvem o contexto serializado
+            contexto = SessionContext.from_dict(contexto, self.max_historico, self.max_pagamentos)
+        
+        return contexto
     
-    def processar_mensagem(self, texto, session_id, user_data=None):
+    def salvar_contexto(self, session_id, contexto):
+        """
+        Salva o contexto da sessão ao fim de um turno.
+        
+        Args:
+            session_id (str): ID da sessão
+            contexto (SessionContext): Contexto atualizado
+        """
+        self.session_store.set(session_id, contexto)
+    
+    def processar_mensagem(self, texto, session_id, user_data=None, gerar_texto_livre=True, analise=None):
         """
         Processa uma mensagem do usuário e gera uma resposta apropriada.
         
@@ -52,15 +103,64 @@ class DialogManager:
             texto (str): Texto da mensagem do usuário
             session_id (str): ID da sessão
             user_data (dict, optional): Dados do usuário
+            gerar_texto_livre (bool, optional): Se False, intenções não mapeadas
+                voltam com `geracao_pendente` em vez de gerar o texto aqui
+            analise (dict, optional): Classificação da mensagem já calculada
+                (`NLPProcessor.classificar`); ignorada nos turnos do fluxo de cartão
             
         Returns:
             dict: Resposta contendo texto e ações
         """
+        # Turnos da mesma sessão rodam em ordem; sessões diferentes, em paralelo
+        with self.session_locks.bloquear(session_id):
+            for tentativa in range(1, MAX_TENTATIVAS_TURNO + 1):
+                try:
+                    return self._processar_turno(texto, session_id, user_data, gerar_texto_livre, analise)
+                except SessionConflict:
+                    # Outro worker atendeu a sessão: refazer o turno sobre o contexto recarregado
+                    metrics.incr("dialogo.turnos_refeitos")
+                    if tentativa == MAX_TENTATIVAS_TURNO:
+                        raise
+    
+    def _processar_turno(self, texto, session_id, user_data, gerar_texto_livre, analise=None):
+        """
+        Executa um turno: lê o contexto, responde e grava o contexto atualizado.
+        
+        Args:
+            texto (str): Texto da mensagem do usuário
+            session_id (str): ID da sessão
+            user_data (dict): Dados do usuário
+            gerar_texto_livre (bool): Se o texto das intenções não mapeadas é gerado aqui
+            analise (dict, optional): Classificação da mensagem já calculada
+            
+        Returns:
+            dict: Resposta contendo texto e ações
+            
+        Raises:
+            SessionConflict: Se outro processo gravou a sessão durante o turno
+        """
         # Obter contexto da sessão
         contexto = self.get_session_context(session_id, user_data)
         
+        # Durante o preenchimento dos dados do cartão a resposta vai direto aos validadores, sem NLP
+        if contexto.get("etapa_cartao", 0) > 0:
+            resposta = {"texto": self.fluxo_pagamento_cartao(contexto, texto), "acoes": {}}
+            resposta["intencao"] = "pagamento"
+            resposta["camada"] = "slot"
+            # Os dados do cartão não entram no histórico da conversa
+            contexto.registrar_turno(None, "pagamento", contexto.get("plano_atual"), "prosseguir_pagamento_cartao")
+            self.salvar_contexto(session_id, contexto)
+            return resposta
+        
         # Processar a mensagem com o NLP
-        resultado = self.nlp_processor.processar_mensagem(texto, contexto)
+        plano_anterior = contexto.get("plano_atual")
+        inicio = time.monotonic()
+        resultado = self.nlp_processor.processar_mensagem(texto, contexto, analise)
+        
+        # Uma amostra das mensagens é comparada em segundo plano com o processador de LLM
+        self.shadow_evaluator.submeter(
+            texto, {"plano_atual": plano_anterior}, resultado, time.monotonic() - inicio, session_id
+        )
         
         # Extrair informações do resultado
         intencao = resultado["intencao"]
@@ -72,20 +172,82 @@ class DialogManager:
             contexto["plano_atual"] = plano
         
         # Registrar interação no histórico
-        contexto["historico"].append({
-            "timestamp": datetime.now().isoformat(),
-            "texto": texto,
-            "intencao": intencao,
-            "plano": plano,
-            "tipo_informacao": tipo_informacao
-        })
+        contexto.registrar_turno(texto, intencao, plano, tipo_informacao)
         
         # Gerar resposta com base na intenção e contexto
-        resposta = self.gerar_resposta(intencao, plano, tipo_informacao, contexto)
+        resposta = self.gerar_resposta(intencao, plano, tipo_informacao, contexto, gerar_texto_livre)
+        
+        # Informar a intenção e qual camada de classificação a decidiu
+        resposta["intencao"] = intencao
+        resposta["camada"] = resultado["camada"]
+        
+        self.salvar_contexto(session_id, contexto)
+        return resposta
+    
+    async def aprocessar_mensagem(self, texto, session_id, user_data=None):
+        """
+        Versão assíncrona de `processar_mensagem`.
+        
+        Só a classificação da mensagem (CPU pura) roda em uma thread avulsa do
+        pool; o que acessa o banco (sessão, histórico, avaliação em sombra) roda
+        na thread compartilhada (`thread_sensitive=True`), para que o Django
+        feche suas conexões. A geração de texto livre pela API de LLM é
+        aguardada no laço de eventos.
+        
+        Args:
+            texto (str): Texto da mensagem do usuário
+            session_id (str): ID da sessão
+            user_data (dict, optional): Dados do usuário
+            
+        Returns:
+            dict: Resposta contendo texto e ações
+        """
+        # O armazenamento de sessões pode consultar o banco, proibido no laço de eventos
+        contexto = await sync_to_async(self.get_session_context)(session_id, user_data)
+        
+        # Os dados do cartão vão direto aos validadores: não são classificados nem entram no cache
+        analise = None
+        if contexto.get("etapa_cartao", 0) == 0:
+            analise = await sync_to_async(self.nlp_processor.classificar, thread_sensitive=False)(texto)
+        
+        resposta = await sync_to_async(self.processar_mensagem)(
+            texto, session_id, user_data, gerar_texto_livre=False, analise=analise
+        )
+        
+        if resposta.pop("geracao_pendente", False):
+            contexto = await sync_to_async(self.get_session_context)(session_id, user_data)
+            resposta["texto"] = await self.agerar_texto_livre(contexto, texto)
         
         return resposta
     
-    def gerar_resposta(self, intencao, plano, tipo_informacao, contexto):
+    def processar_mensagem_stream(self, texto, session_id, user_data=None):
+        """
+        Processa uma mensagem entregando a resposta em fluxo.
+        
+        A análise e as respostas de fluxos determinísticos são calculadas
+        primeiro; só o texto livre das intenções não mapeadas é gerado aos poucos.
+        
+        Args:
+            texto (str): Texto da mensagem do usuário
+            session_id (str): ID da sessão
+            user_data (dict, optional): Dados do usuário
+            
+        Returns:
+            tuple: (resposta, eventos), em que `resposta` traz intenção, camada e
+            ações e `eventos` é um gerador de `("resposta", trecho)` e
+            `("campo", nome, valor)` (ver `gerar_texto_livre_stream`)
+        """
+        resposta = self.processar_mensagem(texto, session_id, user_data, gerar_texto_livre=False)
+        
+        if resposta.pop("geracao_pendente", False):
+            contexto = self.get_session_context(session_id, user_data)
+            eventos = self.gerar_texto_livre_stream(contexto, texto)
+        else:
+            eventos = iter([("resposta", resposta["texto"])])
+        
+        return resposta, eventos
+    
+    def gerar_resposta(self, intencao, plano, tipo_informacao, contexto, gerar_texto_livre=True):
         """
         Gera uma resposta com base na intenção, plano e tipo de informação.
         
@@ -94,6 +256,7 @@ class DialogManager:
             plano (str): Plano identificado
             tipo_informacao (str): Tipo de informação solicitada
             contexto (dict): Contexto da conversa
+            gerar_texto_livre (bool, optional): Se False, não gera o texto das intenções não mapeadas
             
         Returns:
             dict: Resposta contendo texto e ações
@@ -107,11 +270,6 @@ class DialogManager:
             "acoes": {}
         }
         
-        # Verificar se é uma continuação do fluxo de pagamento com cartão
-        if contexto.get("etapa_cartao", 0) > 0:
-            resposta["texto"] = self.fluxo_pagamento_cartao(contexto, contexto.get("entrada_atual", ""))
-            return resposta
-        
         # Gerar resposta com base na intenção
         if intencao == "saudacao":
             resposta["texto"] = f"Olá, {nome}! Como posso ajudar você hoje? Posso fornecer informações sobre nossos planos ou ajudar com pagamentos."
@@ -145,13 +303,87 @@ class DialogManager:
         elif intencao == "historico":
             resposta["texto"] = self.obter_historico_transacoes(contexto)
         
-        else:
+        elif gerar_texto_livre:
             # Usar geração de texto para respostas não mapeadas
             entrada_usuario = contexto.get("entrada_atual", "")
-            resposta["texto"] = self.nlp_processor.gerar_resposta_texto(contexto, entrada_usuario)
+            resposta["texto"] = self.gerar_texto_livre(contexto, entrada_usuario)
+        
+        else:
+            # A geração fica a cargo de quem chamou (ex.: endpoint assíncrono)
+            resposta["texto"] = None
+            resposta["geracao_pendente"] = True
         
         return resposta
     
+    def gerar_texto_livre(self, contexto, entrada_usuario):
+        """
+        Gera texto para mensagens sem intenção mapeada com o gerador local.
+        
+        A API de LLM só é usada pelo endpoint assíncrono (`agerar_texto_livre`),
+        que não prende uma thread do worker durante a chamada.
+        
+        Args:
+            contexto (dict): Contexto da conversa
+            entrada_usuario (str): Texto do usuário
+            
+        Returns:
+            str: Texto gerado
+        """
+        return self.nlp_processor.gerar_resposta_texto(contexto, entrada_usuario)
+    
+    def gerar_texto_livre_stream(self, contexto, entrada_usuario):
+        """
+        Versão em fluxo de `gerar_texto_livre`.
+        
+        Com a API de LLM configurada, a mensagem é analisada em fluxo
+        (`stream_message`): além do texto da resposta, os campos do envelope
+        (intenção, entidades e ações sugeridas) são entregues assim que
+        terminam de chegar. Sem ela, o gerador local entrega só o texto.
+        
+        Args:
+            contexto (dict): Contexto da conversa
+            entrada_usuario (str): Texto do usuário
+            
+        Returns:
+            generator: Eventos `("resposta", trecho)` e `("campo", nome, valor)`
+        """
+        if self.llm_processor.llm_disponivel:
+            for evento in self.llm_processor.stream_message(entrada_usuario, self._contexto_llm(contexto)):
+                if evento[0] != "fim":
+                    yield evento
+            return
+        for trecho in self.nlp_processor.gerar_resposta_texto_stream(contexto, entrada_usuario):
+            yield ("resposta", trecho)
+    
+    async def agerar_texto_livre(self, contexto, entrada_usuario):
+        """
+        Versão assíncrona de `gerar_texto_livre`.
+        
+        Usa a API de LLM quando configurada; se ela não estiver disponível
+        (disjuntor aberto ou falha na chamada), o gerador local.
+        
+        Args:
+            contexto (dict): Contexto da conversa
+            entrada_usuario (str): Texto do usuário
+            
+        Returns:
+            str: Texto gerado
+        """
+        texto = await self.llm_processor.atry_generate_response(entrada_usuario, self._contexto_llm(contexto))
+        if texto is not None:
+            return texto
+        return await sync_to_async(self.nlp_processor.gerar_resposta_texto, thread_sensitive=False)(
+            contexto, entrada_usuario
+        )
+    
+    @staticmethod
+    def _contexto_llm(contexto):
+        """Informações da sessão enviadas à API de LLM como contexto adicional."""
+        return {
+            "nome": contexto.get("nome", "Usuário"),
+            "plano_atual": contexto.get("plano_atual")
+        }
+    
     def listar_planos_disponiveis(self, nome):
         """
         Lista os planos disponíveis.
@@ -252,7 +484,8 @@ class DialogManager:
         elif metodo == "cartao":
             resposta["texto"] = f"{nome}, vamos processar seu pagamento do plano {plano.capitalize()} via cartão de crédito."
             contexto["etapa_cartao"] = 1
-            resposta["texto"] += " Por favor, insira o número do cartão."
+            contexto["cartao_cifrado"] = None
+            resposta["texto"] += " " + _inicio_maiusculo(SLOTS_CARTAO[0].pergunta)
         
         return resposta
     
@@ -260,74 +493,82 @@ class DialogManager:
         """
         Gerencia o fluxo de pagamento com cartão de crédito.
         
+        Cada etapa valida a resposta com o validador do slot correspondente;
+        uma resposta inválida repete a pergunta e "cancelar" interrompe o fluxo.
+        Os campos já coletados ficam no contexto apenas cifrados pelo
+        `card_vault`, então o turno seguinte pode ser atendido por outro worker.
+        
         Args:
-            contexto (dict): Contexto da conversa
+            contexto (SessionContext): Contexto da conversa
             resposta_usuario (str): Resposta do usuário
             
         Returns:
             str: Próxima instrução ou confirmação
         """
         etapa = contexto.get("etapa_cartao", 0)
-        dados_cartao = contexto.setdefault("dados_cartao", {})
         nome = contexto.get("nome", "Usuário")
         
         if etapa == 0:
             contexto["etapa_cartao"] = 1
-            return f"{nome}, por favor, insira o número do cartão."
-        elif etapa == 1:
-            dados_cartao["numero_cartao"] = resposta_usuario
-            contexto["etapa_cartao"] = 2
-            return f"{nome}, agora, informe a validade (MM/AA)."
-        elif etapa == 2:
-            dados_cartao["validade"] = resposta_usuario
-            contexto["etapa_cartao"] = 3
-            return f"{nome}, insira o CVV do cartão."
-        elif etapa == 3:
-            dados_cartao["cvv"] = resposta_usuario
-            contexto["etapa_cartao"] = 4
-            return f"{nome}, informe o nome que está no cartão."
-        elif etapa == 4:
-            dados_cartao["nome_cartao"] = resposta_usuario
-            contexto["etapa_cartao"] = 5
-            return f"{nome}, por fim, informe o CPF."
-        elif etapa == 5:
-            dados_cartao["cpf"] = resposta_usuario
-            contexto["etapa_cartao"] = 0  # Resetar o fluxo do cartão
-            
-            # Registrar pagamento no histórico
-            plano_atual = contexto.get("plano_atual", "desconhecido")
-            contexto["historico"].append({
-                "timestamp": datetime.now().isoformat(),
-                "tipo": "pagamento",
-                "metodo": "cartao",
-                "plano": plano_atual,
-                "status": "aprovado"
-            })
-            
-            return f"Pagamento realizado com sucesso, {nome}! Seu plano {plano_atual.capitalize()} foi ativado. Posso ajudar com mais alguma coisa?"
+            return f"{nome}, {SLOTS_CARTAO[0].pergunta}"
+        
+        if PALAVRAS_CANCELAMENTO_SLOT.intersection(normalizar_texto(resposta_usuario or "").split()):
+            contexto["etapa_cartao"] = 0
+            contexto["cartao_cifrado"] = None
+            metrics.incr("dialogo.slots.cancelados")
+            return f"{nome}, o pagamento com cartão foi cancelado. Posso ajudar com mais alguma coisa?"
+        
+        # Dados vencidos (CARTAO_DADOS_VALIDADE) ou ilegíveis: o preenchimento recomeça
+        dados_cartao = self.card_vault.abrir(contexto.get("cartao_cifrado"))
+        if any(slot.campo not in dados_cartao for slot in SLOTS_CARTAO[:etapa - 1]):
+            contexto["etapa_cartao"] = 1
+            contexto["cartao_cifrado"] = None
+            return f"{nome}, precisamos informar os dados do cartão novamente. {_inicio_maiusculo(SLOTS_CARTAO[0].pergunta)}"
+        
+        slot = SLOTS_CARTAO[etapa - 1]
+        valor = slot.validador(resposta_usuario)
+        if valor is None:
+            metrics.incr("dialogo.slots.invalidos")
+            return f"{nome}, {slot.erro} {_inicio_maiusculo(slot.pergunta)}"
+        
+        metrics.incr("dialogo.slots.validos")
+        dados_cartao[slot.campo] = valor
+        if etapa < len(SLOTS_CARTAO):
+            contexto["cartao_cifrado"] = self.card_vault.fechar(dados_cartao)
+            contexto["etapa_cartao"] = etapa + 1
+            return f"{nome}, {SLOTS_CARTAO[etapa].pergunta}"
+        
+        contexto["etapa_cartao"] = 0  # Resetar o fluxo do cartão
+        # Os dados do cartão não são mantidos depois do pagamento
+        contexto["cartao_cifrado"] = None
+        
+        # Registrar pagamento no histórico
+        plano_atual = contexto.get("plano_atual") or "desconhecido"
+        contexto.registrar_pagamento("cartao", plano_atual, "aprovado")
+        
+        return f"Pagamento realizado com sucesso, {nome}! Seu plano {plano_atual.capitalize()} foi ativado. Posso ajudar com mais alguma coisa?"
     
     def obter_historico_transacoes(self, contexto):
         """
         Obtém o histórico de transações do usuário.
         
         Args:
-            contexto (dict): Contexto da conversa
+            contexto (SessionContext): Contexto da conversa
             
         Returns:
             str: Texto com o histórico de transações
         """
         nome = contexto.get("nome", "Usuário")
-        historico = [item for item in contexto.get("historico", []) if item.get("tipo") == "pagamento"]
         
-        if not historico:
+        if not contexto.pagamentos:
             return f"{nome}, você ainda não realizou nenhuma transação."
         
         resposta = f"{nome}, aqui está seu histórico de transações:\n\n"
-        for i, transacao in enumerate(historico, 1):
-            data = datetime.fromisoformat(transacao["timestamp"]).strftime("%d/%m/%Y %H:%M")
-            plano = transacao.get("plano", "desconhecido").capitalize()
-            metodo = transacao.get("metodo", "desconhecido").upper()
-            status = transacao.get("status", "pendente").capitalize()
+        for i, transacao in enumerate(contexto.pagamentos, 1):
+            data = datetime.fromtimestamp(transacao.instante).strftime("%d/%m/%Y %H:%M")
+            plano = (transacao.plano or "desconhecido").capitalize()
+            metodo = transacao.metodo.nome.upper()
+            status = transacao.status.nome.capitalize()
             
             resposta += f"{i}. {data} - Plano {plano} - {metodo} - {status}\n"
         
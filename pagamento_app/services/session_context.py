@@ -0,0 +1,295 @@
+"""
+Contexto de sessão compacto do Assistente Virtual de Pagamentos.
+Guarda o estado da conversa em atributos fixos e o histórico em buffers circulares de registros pequenos.
+"""
+
+import time
+from collections import namedtuple
+from datetime import datetime
+from enum import IntEnum
+
+
+class Intencao(IntEnum):
+    """Códigos das intenções registradas no histórico."""
+
+    DESCONHECIDO = 0
+    SAUDACAO = 1
+    PLANOS_DISPONIVEIS = 2
+    INFO_PLANO = 3
+    PAGAMENTO = 4
+    METODO_PAGAMENTO = 5
+    METODO_PAGAMENTO_PIX = 6
+    METODO_PAGAMENTO_BOLETO = 7
+    METODO_PAGAMENTO_CARTAO = 8
+    HISTORICO = 9
+    CANCELAMENTO = 10
+
+    @classmethod
+    def de_nome(cls, nome):
+        """Código da intenção; intenções fora da tabela viram DESCONHECIDO."""
+        return cls.__members__.get((nome or "").upper(), cls.DESCONHECIDO)
+
+    @property
+    def nome(self):
+        """Nome da intenção usado pelos processadores."""
+        return self.name.lower()
+
+
+class MetodoPagamento(IntEnum):
+    """Códigos dos métodos de pagamento."""
+
+    DESCONHECIDO = 0
+    PIX = 1
+    BOLETO = 2
+    CARTAO = 3
+
+    @classmethod
+    def de_nome(cls, nome):
+        return cls.__members__.get((nome or "").upper(), cls.DESCONHECIDO)
+
+    @property
+    def nome(self):
+        return self.name.lower()
+
+
+class StatusPagamento(IntEnum):
+    """Códigos da situação de um pagamento."""
+
+    PENDENTE = 0
+    APROVADO = 1
+    RECUSADO = 2
+
+    @classmethod
+    def de_nome(cls, nome):
+        return cls.__members__.get((nome or "").upper(), cls.PENDENTE)
+
+    @property
+    def nome(self):
+        return self.name.lower()
+
+
+# Registros do histórico: instante em segundos desde a época e códigos inteiros
+Turno = namedtuple("Turno", "instante intencao plano tipo_informacao texto")
+Pagamento = namedtuple("Pagamento", "instante metodo plano status")
+
+
+def _instante(valor):
+    """Converte um instante salvo (época ou ISO 8601 dos contextos antigos) para época."""
+    if isinstance(valor, str):
+        return int(datetime.fromisoformat(valor).timestamp())
+    return int(valor)
+
+
+class HistoricoCircular:
+    """
+    Buffer circular de capacidade fixa.
+
+    Cresce até `capacidade` itens; a partir daí cada novo item sobrescreve o
+    mais antigo, sem realocar nem deslocar a lista.
+    """
+
+    __slots__ = ("capacidade", "_itens", "_inicio")
+
+    def __init__(self, capacidade, itens=()):
+        """
+        Inicializa o buffer.
+
+        Args:
+            capacidade (int): Número máximo de itens mantidos
+            itens (iterable, optional): Itens iniciais, do mais antigo ao mais recente
+        """
+        self.capacidade = capacidade
+        self._itens = []
+        self._inicio = 0
+        for item in itens:
+            self.append(item)
+
+    def append(self, item):
+        """Adiciona um item, descartando o mais antigo se o buffer estiver cheio."""
+        if self.capacidade <= 0:
+            return
+        if len(self._itens) < self.capacidade:
+            self._itens.append(item)
+        else:
+            self._itens[self._inicio] = item
+            self._inicio = (self._inicio + 1) % self.capacidade
+
+    def __iter__(self):
+        """Percorre os itens do mais antigo ao mais recente."""
+        yield from self._itens[self._inicio:]
+        yield from self._itens[:self._inicio]
+
+    def __len__(self):
+        return len(self._itens)
+
+    def ultimo(self):
+        """Item mais recente, ou None se o buffer estiver vazio."""
+        if not self._itens:
+            return None
+        return self._itens[self._inicio - 1]
+
+
+class SessionContext:
+    """
+    Contexto de uma sessão de conversa.
+
+    Expõe os campos do antigo dicionário de contexto pela mesma interface
+    (`contexto["plano_atual"]`, `contexto.get("nome")`, `setdefault`), mas
+    com atributos fixos. Os turnos da conversa ficam em um buffer circular e
+    os pagamentos em outro, separado, para que o histórico de transações não
+    percorra todos os turnos.
+    """
+
+    # Campos acessíveis como chaves; um campo nunca atribuído se comporta como chave ausente
+    # Os dados do cartão (número, CVV, CPF) só entram cifrados, em `cartao_cifrado`
+    CHAVES = ("plano_atual", "nome", "email", "etapa_cartao", "cartao_cifrado", "entrada_atual")
+
+    __slots__ = CHAVES + ("turnos", "pagamentos")
+
+    def __init__(self, nome="Usuário", email=None, max_historico=20, max_pagamentos=50):
+        """
+        Inicializa o contexto de uma sessão nova.
+
+        Args:
+            nome (str, optional): Nome do usuário
+            email (str, optional): E-mail do usuário
+            max_historico (int, optional): Turnos da conversa mantidos
+            max_pagamentos (int, optional): Pagamentos mantidos
+        """
+        self.plano_atual = None
+        self.nome = nome
+        self.email = email
+        self.etapa_cartao = 0
+        self.turnos = HistoricoCircular(max_historico)
+        self.pagamentos = HistoricoCircular(max_pagamentos)
+
+    def __getitem__(self, chave):
+        if chave not in self.CHAVES:
+            raise KeyError(chave)
+        try:
+            return getattr(self, chave)
+        except AttributeError:
+            raise KeyError(chave) from None
+
+    def __setitem__(self, chave, valor):
+        if chave not in self.CHAVES:
+            raise KeyError(f"Campo de contexto desconhecido: {chave}")
+        setattr(self, chave, valor)
+
+    def __contains__(self, chave):
+        return chave in self.CHAVES and hasattr(self, chave)
+
+    def get(self, chave, default=None):
+        """
+        Obtém um campo do contexto.
+
+        Args:
+            chave (str): Nome do campo
+            default (optional): Valor retornado se o campo não tiver sido atribuído
+
+        Returns:
+            object: Valor do campo ou default
+        """
+        try:
+            return self[chave]
+        except KeyError:
+            return default
+
+    def setdefault(self, chave, default=None):
+        """Obtém um campo, atribuindo `default` se ainda não existir."""
+        if chave not in self:
+            self[chave] = default
+        return self[chave]
+
+    def registrar_turno(self, texto, intencao, plano=None, tipo_informacao=None):
+        """
+        Registra uma mensagem do usuário no histórico da conversa.
+
+        Args:
+            texto (str): Mensagem do usuário
+            intencao (str): Intenção identificada
+            plano (str, optional): Plano identificado
+            tipo_informacao (str, optional): Tipo de informação solicitada
+        """
+        self.turnos.append(Turno(int(time.time()), Intencao.de_nome(intencao), plano, tipo_informacao, texto))
+
+    def registrar_pagamento(self, metodo, plano, status="aprovado"):
+        """
+        Registra um pagamento no histórico de transações.
+
+        Args:
+            metodo (str): Método de pagamento (pix, boleto ou cartao)
+            plano (str): Plano pago
+            status (str, optional): Situação do pagamento
+        """
+        self.pagamentos.append(Pagamento(
+            int(time.time()), MetodoPagamento.de_nome(metodo), plano, StatusPagamento.de_nome(status)
+        ))
+
+    def to_dict(self):
+        """
+        Serializa o contexto em tipos JSON.
+
+        Os registros do histórico viram listas com os códigos inteiros, na
+        ordem dos campos de `Turno` e `Pagamento`.
+
+        Returns:
+            dict: Contexto serializável
+        """
+        dados = {chave: getattr(self, chave) for chave in self.CHAVES if hasattr(self, chave)}
+        dados["historico"] = [list(turno) for turno in self.turnos]
+        dados["pagamentos"] = [list(pagamento) for pagamento in self.pagamentos]
+        return dados
+
+    @classmethod
+    def from_dict(cls, dados, max_historico=20, max_pagamentos=50):
+        """
+        Reconstrói um contexto serializado por `to_dict`.
+
+        Também aceita o formato anterior, em que o histórico era uma lista de
+        dicionários com instantes ISO e os pagamentos ficavam misturados aos
+        turnos com `"tipo": "pagamento"`.
+
+        Args:
+            dados (dict): Contexto serializado
+            max_historico (int, optional): Turnos da conversa mantidos
+            max_pagamentos (int, optional): Pagamentos mantidos
+
+        Returns:
+            SessionContext: Contexto reconstruído
+        """
+        contexto = cls.__new__(cls)
+        for chave in cls.CHAVES:
+            if chave in dados:
+                setattr(contexto, chave, dados[chave])
+
+        turnos = []
+        pagamentos = [Pagamento(*registro) for registro in dados.get("pagamentos", ())]
+        for registro in dados.get("historico", ()):
+            if not isinstance(registro, dict):
+                turnos.append(Turno(*registro))
+            elif registro.get("tipo") == "pagamento":
+                pagamentos.append(Pagamento(
+                    _instante(registro["timestamp"]),
+                    MetodoPagamento.de_nome(registro.get("metodo")),
+                    registro.get("plano"),
+                    StatusPagamento.de_nome(registro.get("status"))
+                ))
+            else:
+                turnos.append(Turno(
+                    _instante(registro["timestamp"]),
+                    Intencao.de_nome(registro.get("intencao")),
+                    registro.get("plano"),
+                    registro.get("tipo_informacao"),
+                    registro.get("texto")
+                ))
+
+        # Códigos lidos do JSON voltam a ser membros das enumerações
+        contexto.turnos = HistoricoCircular(max_historico, (
+            turno._replace(intencao=Intencao(turno.intencao)) for turno in turnos
+        ))
+        contexto.pagamentos = HistoricoCircular(max_pagamentos, (
+            pagamento._replace(metodo=MetodoPagamento(pagamento.metodo), status=StatusPagamento(pagamento.status))
+            for pagamento in sorted(pagamentos, key=lambda pagamento: pagamento.instante)
+        ))
+        return contexto
@@ -0,0 +1,81 @@
+"""
+Serialização por sessão dos turnos do Assistente Virtual de Pagamentos.
+Garante que turnos de uma mesma sessão rodem em ordem, sem bloquear as demais sessões.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from ..utils.metrics import metrics
+
+
+class SessionLocks:
+    """
+    Locks por sessão, criados sob demanda.
+
+    Cada sessão em atendimento tem um lock próprio, mantido em um registro
+    dividido em listras: o ID da sessão escolhe a listra, cujo lock só
+    protege a criação e a remoção dos locks das suas sessões. Um contador de
+    referências remove o lock da sessão assim que nenhum turno o usa, então
+    o registro só guarda as sessões com turnos em andamento.
+    """
+
+    def __init__(self, listras=64, nome="sessoes.locks", metrics=metrics):
+        """
+        Inicializa o registro vazio.
+
+        Args:
+            listras (int, optional): Número de listras do registro
+            nome (str, optional): Prefixo das métricas
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+        """
+        self.nome = nome
+        self.metrics = metrics
+        self._listras = [(threading.Lock(), {}) for _ in range(max(1, listras))]
+
+        metrics.register_gauge(nome, self.stats)
+
+    @contextmanager
+    def bloquear(self, session_id):
+        """
+        Executa o bloco com a sessão bloqueada para os demais turnos.
+
+        Args:
+            session_id (str): ID da sessão
+        """
+        lock_listra, sessoes = self._listras[hash(session_id) % len(self._listras)]
+        with lock_listra:
+            entrada = sessoes.get(session_id)
+            if entrada is None:
+                entrada = sessoes[session_id] = [threading.Lock(), 0]
+            entrada[1] += 1
+
+        try:
+            if not entrada[0].acquire(blocking=False):
+                # Outro turno da mesma sessão em andamento
+                self.metrics.incr(f"{self.nome}.esperas")
+                inicio = time.monotonic()
+                entrada[0].acquire()
+                self.metrics.observe(f"{self.nome}.espera", time.monotonic() - inicio)
+            try:
+                yield
+            finally:
+                entrada[0].release()
+        finally:
+            with lock_listra:
+                entrada[1] -= 1
+                if entrada[1] == 0:
+                    del sessoes[session_id]
+
+    def stats(self):
+        """
+        Retorna o estado do registro.
+
+        Returns:
+            dict: Sessões com turnos em andamento e número de listras
+        """
+        ativas = 0
+        for lock_listra, sessoes in self._listras:
+            with lock_listra:
+                ativas += len(sessoes)
+        return {"sessoes_ativas": ativas, "listras": len(self._listras)}
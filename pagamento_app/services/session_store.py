@@ -0,0 +1,642 @@
+"""
+Armazenamento do contexto das sessões do Assistente Virtual de Pagamentos.
+Define a interface dos armazenamentos, uma implementação em memória limitada por LRU e TTL
+e armazenamentos compartilhados entre processos (banco de dados ou Redis) com cache local.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from ..utils.cache import LRUCache
+from ..utils.metrics import metrics
+
+# Tentativas de uma gravação incondicional antes de desistir por concorrência
+MAX_TENTATIVAS_GRAVACAO = 5
+
+
+class SessionConflict(Exception):
+    """Outro processo gravou a sessão depois que o contexto foi lido; o turno deve ser refeito."""
+
+
+def serializavel(contexto):
+    """
+    Converte um contexto para tipos JSON antes de gravá-lo fora do processo.
+
+    Args:
+        contexto (SessionContext | dict): Contexto da sessão
+
+    Returns:
+        dict: Contexto serializável
+    """
+    return contexto.to_dict() if hasattr(contexto, "to_dict") else contexto
+
+
+def tamanho_aproximado(contexto):
+    """
+    Estima a memória ocupada por um contexto.
+
+    Args:
+        contexto (dict): Contexto da sessão
+
+    Returns:
+        int: Tamanho, em bytes, do contexto serializado em JSON
+    """
+    return len(json.dumps(serializavel(contexto), ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class SessionStore:
+    """
+    Interface dos armazenamentos de contexto de sessão.
+
+    `get` devolve o contexto salvo (ou None) e `set` o grava ao fim de cada
+    turno; quem lê não deve presumir que alterações no dicionário são vistas
+    por outros processos antes do `set`.
+    """
+
+    def get(self, session_id):
+        """
+        Obtém o contexto de uma sessão.
+
+        Args:
+            session_id (str): ID da sessão
+
+        Returns:
+            dict: Contexto salvo, ou None se não existir ou tiver expirado
+        """
+        raise NotImplementedError("Método deve ser implementado pelas subclasses")
+
+    def set(self, session_id, contexto):
+        """
+        Salva o contexto de uma sessão.
+
+        Args:
+            session_id (str): ID da sessão
+            contexto (dict): Contexto a ser salvo
+        """
+        raise NotImplementedError("Método deve ser implementado pelas subclasses")
+
+    def delete(self, session_id):
+        """
+        Remove o contexto de uma sessão.
+
+        Args:
+            session_id (str): ID da sessão
+        """
+        raise NotImplementedError("Método deve ser implementado pelas subclasses")
+
+    def stats(self):
+        """
+        Retorna o estado do armazenamento.
+
+        Returns:
+            dict: Indicadores serializáveis em JSON
+        """
+        return {}
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Armazenamento em memória, limitado ao processo atual.
+
+    As sessões ficam em ordem de último acesso. Uma sessão sem acesso por
+    `ttl` segundos expira; quando o número de sessões passa de `max_entries`
+    (ou o tamanho aproximado passa de `max_bytes`), as menos usadas saem
+    primeiro. Como o TTL conta a partir do último acesso, as expiradas estão
+    sempre no início da ordem e são removidas a cada gravação sem varrer
+    todas as sessões.
+    """
+
+    def __init__(self, max_entries=10000, ttl=1800.0, max_bytes=None, nome="sessoes", metrics=metrics):
+        """
+        Inicializa o armazenamento vazio.
+
+        Args:
+            max_entries (int, optional): Número máximo de sessões
+            ttl (float, optional): Segundos sem acesso até a sessão expirar (None não expira)
+            max_bytes (int, optional): Tamanho aproximado máximo de todas as sessões
+            nome (str, optional): Prefixo das métricas
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.nome = nome
+        self.metrics = metrics
+
+        self._lock = threading.Lock()
+        self._sessoes = OrderedDict()
+        self._bytes = 0
+
+        metrics.register_gauge(nome, self.stats)
+
+    def get(self, session_id):
+        """
+        Obtém o contexto de uma sessão, renovando seu prazo de expiração.
+
+        Args:
+            session_id (str): ID da sessão
+
+        Returns:
+            dict: Contexto salvo, ou None se não existir ou tiver expirado
+        """
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._sessoes.get(session_id)
+            if entrada is not None and self._expirada(entrada, agora):
+                self._remover(session_id)
+                self.metrics.incr(f"{self.nome}.expiracoes")
+                entrada = None
+
+            if entrada is None:
+                self.metrics.incr(f"{self.nome}.faltas")
+                return None
+
+            contexto, _, tamanho = entrada
+            self._sessoes[session_id] = (contexto, agora, tamanho)
+            self._sessoes.move_to_end(session_id)
+
+        self.metrics.incr(f"{self.nome}.acertos")
+        return contexto
+
+    def set(self, session_id, contexto):
+        """
+        Salva o contexto de uma sessão e aplica os limites.
+
+        O contexto só é serializado para estimar seu tamanho quando há `max_bytes`.
+
+        Args:
+            session_id (str): ID da sessão
+            contexto (dict): Contexto a ser salvo
+        """
+        tamanho = tamanho_aproximado(contexto) if self.max_bytes is not None else 0
+        agora = time.monotonic()
+        with self._lock:
+            if session_id in self._sessoes:
+                self._remover(session_id)
+            self._sessoes[session_id] = (contexto, agora, tamanho)
+            self._bytes += tamanho
+
+            self._remover_expiradas(agora)
+            while len(self._sessoes) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes and len(self._sessoes) > 1
+            ):
+                self._remover(next(iter(self._sessoes)))
+                self.metrics.incr(f"{self.nome}.evictions")
+
+    def delete(self, session_id):
+        """
+        Remove o contexto de uma sessão.
+
+        Args:
+            session_id (str): ID da sessão
+        """
+        with self._lock:
+            if session_id in self._sessoes:
+                self._remover(session_id)
+
+    def stats(self):
+        """
+        Retorna o estado do armazenamento.
+
+        Returns:
+            dict: Sessões guardadas, capacidade e tamanho aproximado em bytes
+            (None quando não há `max_bytes` e o tamanho não é medido)
+        """
+        with self._lock:
+            return {
+                "sessoes": len(self._sessoes),
+                "capacidade": self.max_entries,
+                "bytes_aproximados": self._bytes if self.max_bytes is not None else None
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessoes)
+
+    def _expirada(self, entrada, agora):
+        """Indica se a sessão passou do TTL desde o último acesso."""
+        return self.ttl is not None and agora - entrada[1] >= self.ttl
+
+    def _remover(self, session_id):
+        """Remove uma sessão e desconta seu tamanho (com o lock já adquirido)."""
+        _, _, tamanho = self._sessoes.pop(session_id)
+        self._bytes -= tamanho
+
+    def _remover_expiradas(self, agora):
+        """Remove as sessões expiradas, todas no início da ordem de acesso."""
+        while self._sessoes:
+            session_id, entrada = next(iter(self._sessoes.items()))
+            if not self._expirada(entrada, agora):
+                break
+            self._remover(session_id)
+            self.metrics.incr(f"{self.nome}.expiracoes")
+
+
+class ShardedSessionStore(SessionStore):
+    """
+    Divide as sessões entre vários armazenamentos independentes.
+
+    O ID da sessão escolhe o shard; cada shard tem seu próprio lock, então
+    threads atendendo sessões de shards diferentes não disputam o mesmo lock.
+    Os limites de cada shard valem apenas para as suas sessões.
+    """
+
+    def __init__(self, shards, nome="sessoes", metrics=metrics):
+        """
+        Inicializa o armazenamento.
+
+        Args:
+            shards (list): Armazenamentos que recebem as sessões
+            nome (str, optional): Nome do indicador agregado
+            metrics (Metrics, optional): Registro onde o indicador é publicado
+        """
+        self.shards = list(shards)
+
+        # Substitui os indicadores dos shards por um agregado
+        metrics.register_gauge(nome, self.stats)
+
+    def get(self, session_id):
+        return self._shard(session_id).get(session_id)
+
+    def set(self, session_id, contexto):
+        self._shard(session_id).set(session_id, contexto)
+
+    def delete(self, session_id):
+        self._shard(session_id).delete(session_id)
+
+    def stats(self):
+        """
+        Soma os indicadores numéricos dos shards.
+
+        Returns:
+            dict: Indicadores agregados e número de shards
+        """
+        total = {}
+        for shard in self.shards:
+            for chave, valor in shard.stats().items():
+                if isinstance(valor, (int, float)):
+                    total[chave] = total.get(chave, 0) + valor
+        total["shards"] = len(self.shards)
+        return total
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def _shard(self, session_id):
+        """Shard responsável pela sessão."""
+        return self.shards[hash(session_id) % len(self.shards)]
+
+
+class VersionedSessionStore(SessionStore):
+    """
+    Base dos armazenamentos compartilhados entre processos.
+
+    Cada sessão tem uma versão, incrementada a cada gravação. `gravar` com
+    `versao_esperada` só tem efeito se a versão salva ainda for a esperada
+    (compare-and-set); a versão 0 indica sessão inexistente.
+    """
+
+    def carregar(self, session_id):
+        """
+        Lê o contexto e sua versão.
+
+        Args:
+            session_id (str): ID da sessão
+
+        Returns:
+            tuple: (contexto, versao), ou (None, 0) se a sessão não existir
+        """
+        raise NotImplementedError("Método deve ser implementado pelas subclasses")
+
+    def versao(self, session_id):
+        """
+        Lê apenas a versão atual da sessão.
+
+        Args:
+            session_id (str): ID da sessão
+
+        Returns:
+            int: Versão salva, ou 0 se a sessão não existir
+        """
+        raise NotImplementedError("Método deve ser implementado pelas subclasses")
+
+    def gravar(self, session_id, contexto, versao_esperada):
+        """
+        Grava o contexto se a versão salva for a esperada.
+
+        Args:
+            session_id (str): ID da sessão
+            contexto (dict): Contexto a ser salvo
+            versao_esperada (int): Versão lida antes da alteração (0 para sessão nova)
+
+        Returns:
+            int: Nova versão, ou None se outra gravação ocorreu antes
+        """
+        raise NotImplementedError("Método deve ser implementado pelas subclasses")
+
+    def get(self, session_id):
+        return self.carregar(session_id)[0]
+
+    def set(self, session_id, contexto):
+        """Grava o contexto incondicionalmente (a última gravação prevalece)."""
+        for _ in range(MAX_TENTATIVAS_GRAVACAO):
+            if self.gravar(session_id, contexto, self.versao(session_id)) is not None:
+                return
+        raise RuntimeError(f"Não foi possível gravar a sessão {session_id}: concorrência excessiva")
+
+
+class DatabaseSessionStore(VersionedSessionStore):
+    """
+    Armazenamento no banco de dados do Django (modelo SessaoAssistente).
+
+    A gravação condicional é um UPDATE filtrado pela versão esperada, atômico
+    em qualquer banco suportado. Sessões expiradas são tratadas como
+    inexistentes e apagadas periodicamente.
+    """
+
+    def __init__(self, ttl=1800.0, intervalo_limpeza=60.0):
+        """
+        Inicializa o armazenamento.
+
+        Args:
+            ttl (float, optional): Segundos sem gravação até a sessão expirar
+            intervalo_limpeza (float, optional): Segundos entre remoções das sessões expiradas
+        """
+        self.ttl = ttl
+        self.intervalo_limpeza = intervalo_limpeza
+        self._proxima_limpeza = 0.0
+
+    def carregar(self, session_id):
+        from ..models import SessaoAssistente
+
+        linha = (
+            SessaoAssistente.objects
+            .filter(session_id=session_id, expira_em__gt=timezone.now())
+            .values_list("dados", "versao")
+            .first()
+        )
+        return linha if linha is not None else (None, 0)
+
+    def versao(self, session_id):
+        from ..models import SessaoAssistente
+
+        versao = (
+            SessaoAssistente.objects
+            .filter(session_id=session_id, expira_em__gt=timezone.now())
+            .values_list("versao", flat=True)
+            .first()
+        )
+        return versao or 0
+
+    def gravar(self, session_id, contexto, versao_esperada):
+        from ..models import SessaoAssistente
+
+        agora = timezone.now()
+        expira_em = agora + timedelta(seconds=self.ttl)
+        self._limpar_expiradas(agora)
+
+        if versao_esperada:
+            atualizadas = SessaoAssistente.objects.filter(
+                session_id=session_id, versao=versao_esperada, expira_em__gt=agora
+            ).update(dados=serializavel(contexto), versao=versao_esperada + 1, expira_em=expira_em, atualizada_em=agora)
+            return versao_esperada + 1 if atualizadas else None
+
+        # Sessão nova: uma linha expirada com o mesmo ID conta como inexistente
+        try:
+            with transaction.atomic():
+                SessaoAssistente.objects.filter(session_id=session_id, expira_em__lte=agora).delete()
+                SessaoAssistente.objects.create(
+                    session_id=session_id, dados=serializavel(contexto), versao=1, expira_em=expira_em
+                )
+        except IntegrityError:
+            return None
+        return 1
+
+    def delete(self, session_id):
+        from ..models import SessaoAssistente
+
+        SessaoAssistente.objects.filter(session_id=session_id).delete()
+
+    def _limpar_expiradas(self, agora):
+        """Apaga as sessões expiradas, no máximo uma vez por intervalo."""
+        if time.monotonic() < self._proxima_limpeza:
+            return
+        from ..models import SessaoAssistente
+
+        self._proxima_limpeza = time.monotonic() + self.intervalo_limpeza
+        SessaoAssistente.objects.filter(expira_em__lte=agora).delete()
+
+
+class RedisSessionStore(VersionedSessionStore):
+    """
+    Armazenamento em um servidor Redis (ou compatível com o protocolo).
+
+    Cada sessão é um hash com os campos `v` (versão) e `d` (contexto em
+    JSON), que expira após `ttl` segundos sem gravação. A gravação
+    condicional usa WATCH/MULTI/EXEC.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", prefixo="assistente:sessao:", ttl=1800.0, cliente=None):
+        """
+        Inicializa o armazenamento.
+
+        Args:
+            url (str, optional): Endereço do servidor
+            prefixo (str, optional): Prefixo das chaves das sessões
+            ttl (float, optional): Segundos sem gravação até a sessão expirar
+            cliente (redis.Redis, optional): Cliente já configurado; dispensa `url`
+        """
+        if cliente is None:
+            # Importação tardia: o pacote redis só é necessário com este armazenamento
+            import redis
+            cliente = redis.Redis.from_url(url)
+        self.cliente = cliente
+        self.prefixo = prefixo
+        self.ttl = ttl
+
+    def carregar(self, session_id):
+        dados, versao = self.cliente.hmget(self._chave(session_id), "d", "v")
+        if dados is None or versao is None:
+            return None, 0
+        return json.loads(dados), int(versao)
+
+    def versao(self, session_id):
+        versao = self.cliente.hget(self._chave(session_id), "v")
+        return int(versao) if versao is not None else 0
+
+    def gravar(self, session_id, contexto, versao_esperada):
+        from redis.exceptions import WatchError
+
+        chave = self._chave(session_id)
+        dados = json.dumps(serializavel(contexto), ensure_ascii=False, default=str)
+        with self.cliente.pipeline() as pipe:
+            try:
+                pipe.watch(chave)
+                versao = pipe.hget(chave, "v")
+                if (int(versao) if versao is not None else 0) != versao_esperada:
+                    return None
+                pipe.multi()
+                pipe.hset(chave, mapping={"v": versao_esperada + 1, "d": dados})
+                pipe.pexpire(chave, int(self.ttl * 1000))
+                pipe.execute()
+            except WatchError:
+                return None
+        return versao_esperada + 1
+
+    def delete(self, session_id):
+        self.cliente.delete(self._chave(session_id))
+
+    def _chave(self, session_id):
+        """Chave da sessão no servidor."""
+        return f"{self.prefixo}{session_id}"
+
+
+class ReadThroughSessionStore(SessionStore):
+    """
+    Cache local, por processo, à frente de um armazenamento compartilhado.
+
+    O contexto lido ou gravado fica em memória com sua versão. Uma leitura
+    confirma no armazenamento compartilhado que a versão não mudou (uma
+    consulta pequena, sem transferir o contexto); se mudou, outro processo
+    atendeu a sessão e o contexto é recarregado. Cópias locais confirmadas
+    há menos de `validade` segundos são usadas sem consulta nenhuma.
+
+    As gravações são condicionais à versão lida. Se outro processo gravou
+    antes, nada é sobrescrito: a cópia local é descartada e `SessionConflict`
+    é levantada para que o chamador recarregue o contexto e refaça o turno.
+    Por isso uma cópia local desatualizada nunca perde gravações; no pior
+    caso custa refazer um turno.
+    """
+
+    def __init__(self, backend, max_entries=10000, ttl=1800.0, validade=0.0, nome="sessoes", metrics=metrics):
+        """
+        Inicializa o cache vazio.
+
+        Args:
+            backend (VersionedSessionStore): Armazenamento compartilhado
+            max_entries (int, optional): Sessões mantidas em memória
+            ttl (float, optional): Segundos que uma cópia local sem uso é mantida
+            validade (float, optional): Segundos em que uma cópia local é usada sem confirmar a versão
+            nome (str, optional): Prefixo das métricas
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+        """
+        self.backend = backend
+        self.validade = validade
+        self.nome = nome
+        self.metrics = metrics
+        self.local = LRUCache(maxsize=max_entries, ttl=ttl)
+
+        metrics.register_gauge(nome, self.stats)
+
+    def get(self, session_id):
+        """
+        Obtém o contexto, da memória quando a versão local ainda é a atual.
+
+        Args:
+            session_id (str): ID da sessão
+
+        Returns:
+            dict: Contexto salvo, ou None se não existir
+        """
+        entrada = self.local.get(session_id)
+        if entrada is not None:
+            contexto, versao, confirmada_em = entrada
+            if time.monotonic() - confirmada_em < self.validade:
+                self.metrics.incr(f"{self.nome}.acertos")
+                return contexto
+            if self.backend.versao(session_id) == versao:
+                self.local.set(session_id, (contexto, versao, time.monotonic()))
+                self.metrics.incr(f"{self.nome}.acertos")
+                return contexto
+            self.metrics.incr(f"{self.nome}.desatualizadas")
+
+        self.metrics.incr(f"{self.nome}.faltas")
+        contexto, versao = self.backend.carregar(session_id)
+        if contexto is None:
+            self.local.delete(session_id)
+            return None
+        self.local.set(session_id, (contexto, versao, time.monotonic()))
+        return contexto
+
+    def set(self, session_id, contexto):
+        """
+        Grava o contexto no armazenamento compartilhado e na memória.
+
+        Args:
+            session_id (str): ID da sessão
+            contexto (dict): Contexto a ser salvo
+
+        Raises:
+            SessionConflict: Se a sessão foi gravada por outro processo desde a leitura
+        """
+        entrada = self.local.get(session_id)
+        versao_local = entrada[1] if entrada is not None else 0
+
+        nova_versao = self.backend.gravar(session_id, contexto, versao_local)
+        if nova_versao is None:
+            # Outro processo gravou a sessão depois da nossa leitura
+            self.metrics.incr(f"{self.nome}.conflitos")
+            self.local.delete(session_id)
+            raise SessionConflict(f"A sessão {session_id} foi alterada por outro processo")
+
+        self.local.set(session_id, (contexto, nova_versao, time.monotonic()))
+
+    def delete(self, session_id):
+        self.backend.delete(session_id)
+        self.local.delete(session_id)
+
+    def stats(self):
+        """
+        Retorna o estado do cache local.
+
+        Returns:
+            dict: Sessões em memória e capacidade
+        """
+        return {"sessoes_locais": len(self.local), "capacidade": self.local.maxsize}
+
+
+def build_session_store():
+    """
+    Cria o armazenamento de sessões configurado pelas settings `SESSOES_*`.
+
+    Returns:
+        SessionStore: Armazenamento de contexto das sessões
+    """
+    max_entries = getattr(settings, 'SESSOES_MAX_ENTRADAS', 10000)
+    ttl = getattr(settings, 'SESSOES_TTL', 1800.0)
+    backend = getattr(settings, 'SESSOES_BACKEND', 'memoria')
+
+    if backend == 'memoria':
+        shards = max(1, getattr(settings, 'SESSOES_SHARDS', 16))
+        max_bytes = getattr(settings, 'SESSOES_MAX_BYTES', None)
+        return ShardedSessionStore([
+            InMemorySessionStore(
+                max_entries=max(1, max_entries // shards),
+                ttl=ttl,
+                max_bytes=max_bytes // shards if max_bytes is not None else None,
+                nome="sessoes"
+            )
+            for _ in range(shards)
+        ], nome="sessoes")
+    if backend == 'banco':
+        compartilhado = DatabaseSessionStore(ttl=ttl)
+    elif backend == 'redis':
+        compartilhado = RedisSessionStore(
+            url=getattr(settings, 'SESSOES_REDIS_URL', 'redis://localhost:6379/0'),
+            ttl=ttl
+        )
+    else:
+        raise ValueError(f"SESSOES_BACKEND desconhecido: {backend}")
+
+    return ReadThroughSessionStore(
+        compartilhado,
+        max_entries=max_entries,
+        ttl=ttl,
+        validade=getattr(settings, 'SESSOES_CACHE_VALIDADE', 2.0),
+        nome="sessoes"
+    )
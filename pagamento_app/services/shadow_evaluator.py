@@ -0,0 +1,236 @@
+"""
+Avaliação em modo sombra (shadow) do processador de LLM para o Assistente Virtual de Pagamentos.
+Compara, fora do caminho da requisição, o processador local com o de LLM em mensagens reais.
+"""
+
+import queue
+import random
+import threading
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.db import close_old_connections
+from ..data import planos
+from ..integrations.advanced_nlp import MOTOR_FALLBACK, AdvancedNLPProcessor
+from ..utils.metrics import metrics
+from ..utils.text_normalizer import normalizar_texto
+
+# Intenções do processador local agrupadas no vocabulário do processador de LLM
+INTENCOES_EQUIVALENTES = {
+    "planos_disponiveis": "info_plano",
+    "metodo_pagamento_pix": "metodo_pagamento",
+    "metodo_pagamento_boleto": "metodo_pagamento",
+    "metodo_pagamento_cartao": "metodo_pagamento"
+}
+
+
+def intencao_comparavel(intencao):
+    """
+    Traduz uma intenção para o vocabulário comum aos dois processadores.
+
+    Args:
+        intencao (str): Intenção identificada
+
+    Returns:
+        str: Intenção comparável
+    """
+    return INTENCOES_EQUIVALENTES.get(intencao, intencao or "desconhecido")
+
+
+def plano_comparavel(plano):
+    """
+    Traduz o plano citado pelo LLM (texto livre) para a chave de `data.planos`.
+
+    Args:
+        plano (str): Plano identificado
+
+    Returns:
+        str: Chave do plano, ou None se nenhum plano do catálogo foi citado
+    """
+    if not plano:
+        return None
+    normalizado = normalizar_texto(str(plano))
+    for chave in planos:
+        if chave in normalizado:
+            return chave
+    return None
+
+
+class ShadowEvaluator:
+    """
+    Avaliador em modo sombra.
+
+    Uma fração das mensagens é enviada, depois de respondida pelo processador
+    local, a uma fila limitada; uma thread em segundo plano processa cada uma
+    com o processador de LLM e grava a comparação em `AvaliacaoShadow`. Com a
+    fila cheia a amostra é descartada: o usuário nunca espera pela sombra.
+    Amostras respondidas pelas regras de fallback, sem chegar à API, são
+    gravadas com o motor "fallback" como erro e ficam fora da concordância.
+    """
+
+    def __init__(self, processador=None, taxa_amostragem=0.05, max_fila=100,
+                 custo_1k_tokens=0.0, nome="shadow", metrics=metrics):
+        """
+        Inicializa o avaliador; a thread só é criada na primeira amostra.
+
+        Args:
+            processador (AdvancedNLPProcessor, optional): Processador avaliado; por
+                padrão, um AdvancedNLPProcessor criado pela própria thread
+            taxa_amostragem (float, optional): Fração das mensagens avaliadas (0 desativa)
+            max_fila (int, optional): Amostras que podem aguardar avaliação
+            custo_1k_tokens (float, optional): Preço de mil tokens de prompt, para a estimativa de custo
+            nome (str, optional): Prefixo das métricas
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+        """
+        self.processador = processador
+        self.taxa_amostragem = taxa_amostragem
+        self.custo_1k_tokens = custo_1k_tokens
+        self.nome = nome
+        self.metrics = metrics
+
+        self._fila = queue.Queue(maxsize=max_fila)
+        self._thread = None
+        self._lock = threading.Lock()
+
+        metrics.register_gauge(f"{nome}.fila", self._fila.qsize)
+
+    def submeter(self, texto, contexto, resultado_primario, latencia_primaria, session_id=""):
+        """
+        Sorteia a mensagem e, se escolhida, a coloca na fila de avaliação.
+
+        Args:
+            texto (str): Mensagem do usuário
+            contexto (dict): Contexto visto pelo processador local antes da mensagem
+            resultado_primario (dict): Resultado do processador local
+            latencia_primaria (float): Duração do processamento local em segundos
+            session_id (str, optional): ID da sessão
+
+        Returns:
+            bool: True se a mensagem entrou na fila
+        """
+        if self.taxa_amostragem <= 0 or random.random() >= self.taxa_amostragem:
+            return False
+
+        amostra = (
+            texto,
+            contexto,
+            resultado_primario["intencao"],
+            resultado_primario.get("plano"),
+            resultado_primario.get("camada", ""),
+            latencia_primaria,
+            session_id or ""
+        )
+        try:
+            self._fila.put_nowait(amostra)
+        except queue.Full:
+            self.metrics.incr(f"{self.nome}.descartadas")
+            return False
+
+        self.metrics.incr(f"{self.nome}.amostras")
+        self._iniciar_thread()
+        return True
+
+    def aguardar(self):
+        """Bloqueia até que todas as amostras na fila tenham sido avaliadas."""
+        self._fila.join()
+
+    def _iniciar_thread(self):
+        """Cria a thread de avaliação sob demanda."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._trabalhar, name=self.nome, daemon=True)
+                    self._thread.start()
+
+    def _trabalhar(self):
+        """Laço da thread: avalia as amostras à medida que chegam."""
+        if self.processador is None:
+            self.processador = AdvancedNLPProcessor()
+
+        while True:
+            amostra = self._fila.get()
+            try:
+                self._avaliar(*amostra)
+            except Exception as e:
+                print(f"Erro na avaliação shadow: {e}")
+                self.metrics.incr(f"{self.nome}.erros")
+            finally:
+                close_old_connections()
+                self._fila.task_done()
+
+    def _avaliar(self, texto, contexto, intencao_primaria, plano_primario, camada,
+                 latencia_primaria, session_id):
+        """Processa uma amostra com o processador de LLM e grava a comparação."""
+        from ..models import AvaliacaoShadow
+
+        intencao_shadow = ""
+        plano_shadow = None
+        latencia_shadow = None
+        tokens = 0
+        erro = ""
+        motor = self.processador.motor
+
+        inicio = time.monotonic()
+        try:
+            resultado = self.processador.process_message(texto, contexto)
+        except Exception as e:
+            erro = str(e)
+        else:
+            motor = resultado.get("motor", motor)
+
+        if not erro and motor == MOTOR_FALLBACK:
+            # A API não foi consultada (indisponível, disjuntor aberto ou falha):
+            # a resposta das regras locais não avalia o LLM
+            erro = "LLM indisponível; respondido pelas regras de fallback"
+            self.metrics.incr(f"{self.nome}.fallback")
+        elif not erro:
+            latencia_shadow = time.monotonic() - inicio
+            self.metrics.observe(f"{self.nome}.latencia", latencia_shadow)
+            intencao_shadow = resultado.get("intencao") or "desconhecido"
+            plano_shadow = plano_comparavel((resultado.get("entidades") or {}).get("plano"))
+            tokens = resultado.get("prompt_tokens", 0)
+
+        concordou = not erro and intencao_comparavel(intencao_primaria) == intencao_comparavel(intencao_shadow)
+        if concordou:
+            self.metrics.incr(f"{self.nome}.concordancias")
+
+        AvaliacaoShadow.objects.create(
+            session_id=session_id[:100],
+            texto=texto,
+            motor=motor,
+            intencao_primaria=intencao_primaria,
+            intencao_shadow=intencao_shadow,
+            concordou=concordou,
+            plano_primario=plano_primario,
+            plano_shadow=plano_shadow,
+            camada_primaria=camada or "",
+            latencia_primaria_ms=latencia_primaria * 1000,
+            latencia_shadow_ms=latencia_shadow * 1000 if latencia_shadow is not None else None,
+            tokens_prompt=tokens,
+            custo_estimado=Decimal(str(tokens * self.custo_1k_tokens / 1000)).quantize(Decimal("0.000001")),
+            erro=erro
+        )
+
+
+_avaliador_shadow = None
+_avaliador_shadow_lock = threading.Lock()
+
+
+def get_shadow_evaluator():
+    """
+    Retorna o avaliador em modo sombra compartilhado.
+
+    Returns:
+        ShadowEvaluator: Avaliador configurado a partir das settings `LLM_SHADOW_*`
+    """
+    global _avaliador_shadow
+    if _avaliador_shadow is None:
+        with _avaliador_shadow_lock:
+            if _avaliador_shadow is None:
+                _avaliador_shadow = ShadowEvaluator(
+                    taxa_amostragem=getattr(settings, 'LLM_SHADOW_TAXA', 0.0),
+                    max_fila=getattr(settings, 'LLM_SHADOW_FILA', 100),
+                    custo_1k_tokens=getattr(settings, 'LLM_SHADOW_CUSTO_1K_TOKENS', 0.0),
+                    nome="llm.shadow"
+                )
+    return _avaliador_shadow
@@ -269,7 +269,41 @@ function processUserMessage(message) {
     // Mostrar indicador de digitação
     showTypingIndicator();
     
-    // Enviar mensagem para o backend
+    // Navegadores sem leitura de fluxo usam o endpoint JSON
+    if (!window.ReadableStream || !window.TextDecoder) {
+        fetchBotResponse(message);
+        return;
+    }
+    
+    // Enviar mensagem para o backend e exibir a resposta à medida que é gerada
+    fetch('/api/assistente/resposta-stream/', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': getCsrfToken()
+        },
+        body: JSON.stringify({ mensagem: message })
+    })
+    .then(response => {
+        if (!response.ok || !response.body) {
+            throw new Error('Erro na comunicação com o servidor');
+        }
+        return readBotStream(response.body.getReader());
+    })
+    .catch(error => {
+        console.error('Erro:', error);
+        removeStreamingMessage();
+        setTimeout(() => {
+            addBotMessage('Desculpe, ocorreu um erro ao processar sua mensagem. Por favor, tente novamente.');
+        }, 500);
+    });
+}
+
+/**
+ * Obtém a resposta completa do assistente pelo endpoint JSON
+ * @param {string} message - Mensagem do usuário
+ */
+function fetchBotResponse(message) {
     fetch('/api/assistente/resposta/', {
         method: 'POST',
         headers: {
@@ -285,10 +319,7 @@ function processUserMessage(message) {
         return response.json();
     })
     .then(data => {
-        // Simular tempo de resposta natural (opcional)
-        setTimeout(() => {
-            addBotMessage(data.resposta, data.acoes);
-        }, 500 + Math.random() * 1000);
+        addBotMessage(data.resposta, data.acoes);
     })
     .catch(error => {
         console.error('Erro:', error);
@@ -298,6 +329,110 @@ function processUserMessage(message) {
     });
 }
 
+/**
+ * Lê os eventos SSE da resposta e atualiza a mensagem do bot a cada trecho
+ * @param {ReadableStreamDefaultReader} reader - Leitor do corpo da resposta
+ * @returns {Promise} Concluída quando o fluxo termina
+ */
+function readBotStream(reader) {
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    let actions = {};
+    let messageElement = null;
+    
+    function handleEvent(name, data) {
+        switch (name) {
+            case 'inicio':
+                actions = data.acoes || {};
+                break;
+                
+            case 'trecho':
+                // Substituir o indicador de digitação no primeiro trecho
+                if (!messageElement) {
+                    messageElement = createStreamingMessage();
+                }
+                text += data.texto;
+                messageElement.textContent = text;
+                scrollToBottom();
+                break;
+                
+            case 'fim':
+                removeStreamingMessage();
+                addBotMessage(data.resposta, actions);
+                break;
+                
+            case 'erro':
+                removeStreamingMessage();
+                addBotMessage(data.resposta);
+                break;
+        }
+    }
+    
+    function read() {
+        return reader.read().then(({ done, value }) => {
+            if (done) return;
+            
+            buffer += decoder.decode(value, { stream: true });
+            
+            // Eventos SSE são separados por uma linha em branco
+            let separator;
+            while ((separator = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, separator);
+                buffer = buffer.slice(separator + 2);
+                
+                let name = 'message';
+                let data = '';
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        name = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        data += line.slice(5).trim();
+                    }
+                });
+                
+                if (data) {
+                    handleEvent(name, JSON.parse(data));
+                }
+            }
+            
+            return read();
+        });
+    }
+    
+    return read();
+}
+
+/**
+ * Cria a mensagem do bot que recebe o texto em fluxo
+ * @returns {HTMLElement} Elemento onde o texto é escrito
+ */
+function createStreamingMessage() {
+    removeTypingIndicator();
+    
+    const chatMessages = document.getElementById('chatMessages');
+    const messageHTML = `
+        <div id="streamingMessage" class="message message-bot">
+            <div class="message-content">
+                <div class="message-text"></div>
+            </div>
+        </div>
+    `;
+    
+    chatMessages.insertAdjacentHTML('beforeend', messageHTML);
+    return document.querySelector('#streamingMessage .message-text');
+}
+
+/**
+ * Remove a mensagem em fluxo, substituída pela mensagem final formatada
+ */
+function removeStreamingMessage() {
+    const message = document.getElementById('streamingMessage');
+    if (message) {
+        message.remove();
+    }
+}
+
 /**
  * Exibe os detalhes do método de pagamento selecionado
  * @param {string} method - Método de pagamento (pix, boleto, cartao)
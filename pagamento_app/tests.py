@@ -1,3 +1,2360 @@
-from django.test import TestCase
+import asyncio
+import importlib.util
+import json
+import os
+import queue
+import re
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+import types
+import unicodedata
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipIf
 
-# Create your tests here.
+import requests
+from cryptography.fernet import Fernet
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+from .integrations.advanced_nlp import MOTOR_FALLBACK, AdvancedNLPProcessor
+from .integrations import circuit_breaker as modulo_circuito
+from .integrations.circuit_breaker import ABERTO, FECHADO, SEMI_ABERTO, CircuitBreaker, CircuitOpenError
+from .integrations.fallback_rules import REGRAS_PADRAO, FallbackRules
+from .integrations.http_client import AsyncHTTPClient, HTTPClient
+from .integrations.llm_router import RECALCULO_ATRASO, LLMRouter
+from .integrations.prompt_builder import TOKENS_POR_MENSAGEM, PromptBuilder
+from .integrations.response_cache import SemanticResponseCache
+from .integrations.single_flight import SingleFlight
+from .integrations.streaming import EnvelopeParser
+from .models import AvaliacaoShadow, SessaoAssistente
+from .services.card_vault import CardVault
+from .services.dialog_manager import DialogManager
+from .services.session_context import HistoricoCircular, Intencao, MetodoPagamento, SessionContext, StatusPagamento
+from .services.session_locks import SessionLocks
+from .services import session_store as modulo_sessoes
+from .services.session_store import (
+    DatabaseSessionStore, InMemorySessionStore, ReadThroughSessionStore, RedisSessionStore, SessionConflict
+)
+from .services.shadow_evaluator import ShadowEvaluator
+from .utils.generation import MicroBatcher
+from .utils.inference_server import (
+    TAMANHO_MAXIMO, InferenceClient, InferenceServer, InferenceUnavailable, enviar_mensagem, receber_mensagem
+)
+from .utils.intent_matcher import IntentMatcher
+from .utils.metrics import Metrics, metrics
+from .utils.model_registry import ModelRegistry
+from .utils.nlp_processor import MENSAGEM_AQUECIMENTO, NLPProcessor
+from .utils.slot_validators import (
+    luhn_valido, validar_cpf, validar_cvv, validar_nome_cartao, validar_numero_cartao, validar_validade
+)
+from .utils.text_normalizer import analisar_texto, normalizar_texto, singularizar
+
+
+class SingleFlightTests(SimpleTestCase):
+    """Coalescência de chamadas simultâneas (integrations/single_flight.py)."""
+
+    def test_chamador_que_chega_no_fim_recebe_o_resultado(self):
+        recebidos = []
+
+        class SingleFlightComAtraso(SingleFlight):
+            def _liberar(self, chave, voo):
+                # Um chamador se junta depois que a função terminou, antes da chave ser liberada
+                seguidor.start()
+                while voo.aguardando == 0:
+                    time.sleep(0.001)
+                super()._liberar(chave, voo)
+
+        coalescedor = SingleFlightComAtraso(metrics=Metrics())
+        seguidor = threading.Thread(target=lambda: recebidos.append(coalescedor.do("k", dict, n=2)))
+
+        resultado, compartilhado = coalescedor.do("k", lambda: {"n": 1})
+        seguidor.join(timeout=5)
+
+        self.assertEqual((resultado, compartilhado), ({"n": 1}, False))
+        self.assertEqual(recebidos, [({"n": 1}, True)])
+        self.assertIsNot(recebidos[0][0], resultado)
+
+    def test_chamadas_simultaneas_executam_uma_vez(self):
+        coalescedor = SingleFlight(metrics=Metrics())
+        liberar = threading.Event()
+        execucoes = []
+        resultados = []
+
+        def funcao():
+            execucoes.append(1)
+            liberar.wait(5)
+            return {"intencao": "saudacao"}
+
+        threads = [threading.Thread(target=lambda: resultados.append(coalescedor.do("k", funcao))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        while coalescedor.stats()["aguardando"] < 7:
+            time.sleep(0.001)
+        liberar.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertEqual(len(execucoes), 1)
+        self.assertEqual(sorted(compartilhado for _, compartilhado in resultados), [False] + [True] * 7)
+        self.assertTrue(all(resultado == {"intencao": "saudacao"} for resultado, _ in resultados))
+        self.assertEqual(coalescedor.stats()["em_andamento"], 0)
+
+    def test_erro_e_repassado_aos_que_aguardam(self):
+        coalescedor = SingleFlight(metrics=Metrics())
+        liberar = threading.Event()
+        erros = []
+
+        def falhar():
+            liberar.wait(5)
+            raise ValueError("falhou")
+
+        def chamar():
+            try:
+                coalescedor.do("k", falhar)
+            except ValueError as e:
+                erros.append(e)
+
+        threads = [threading.Thread(target=chamar) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        while coalescedor.stats()["aguardando"] < 2:
+            time.sleep(0.001)
+        liberar.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertEqual(len(erros), 3)
+
+    def test_async_chamador_tardio_nao_compartilha_o_objeto_do_lider(self):
+        coalescedor = SingleFlight(metrics=Metrics())
+
+        async def cenario():
+            liberar = asyncio.Event()
+
+            async def funcao():
+                await liberar.wait()
+                return {"n": 1}
+
+            async def outra():
+                return {"n": 1}
+
+            lider = asyncio.create_task(coalescedor.ado("k", funcao))
+            await asyncio.sleep(0)
+            liberar.set()
+            await asyncio.sleep(0)
+            seguidor = asyncio.create_task(coalescedor.ado("k", outra))
+            return await asyncio.gather(lider, seguidor)
+
+        (resultado_lider, _), (resultado_seguidor, _) = asyncio.run(cenario())
+        resultado_lider["n"] = 99
+
+        self.assertEqual(resultado_seguidor, {"n": 1})
+        self.assertEqual(coalescedor.stats()["em_andamento"], 0)
+
+
+class DadosCartaoTests(TestCase):
+    """Dados do cartão só chegam cifrados aos armazenamentos compartilhados."""
+
+    CARTAO = {"numero_cartao": "4111111111111111", "validade": "12/30", "cvv": "123", "cpf": "52998224725"}
+
+    def setUp(self):
+        self.cofre = CardVault(metrics=Metrics())
+
+    def _contexto_com_cartao(self):
+        contexto = SessionContext(nome="Ana")
+        contexto["plano_atual"] = "premium"
+        contexto["etapa_cartao"] = 4
+        contexto["cartao_cifrado"] = self.cofre.fechar(self.CARTAO)
+        return contexto
+
+    def test_to_dict_so_tem_os_dados_cifrados(self):
+        dados = self._contexto_com_cartao().to_dict()
+
+        self.assertNotIn("4111111111111111", json.dumps(dados))
+        self.assertNotIn("52998224725", json.dumps(dados))
+        self.assertEqual(self.cofre.abrir(dados["cartao_cifrado"]), self.CARTAO)
+        self.assertEqual(dados["etapa_cartao"], 4)
+
+    def test_banco_nao_grava_dados_do_cartao_em_claro(self):
+        DatabaseSessionStore().set("s", self._contexto_com_cartao())
+
+        dados = SessaoAssistente.objects.get(session_id="s").dados
+        self.assertNotIn("4111111111111111", json.dumps(dados))
+        self.assertNotIn("52998224725", json.dumps(dados))
+
+    def test_from_dict_ignora_dados_de_cartao_antigos(self):
+        contexto = SessionContext.from_dict({"nome": "Ana", "etapa_cartao": 2, "dados_cartao": {"cvv": "123"}})
+
+        self.assertNotIn("dados_cartao", contexto)
+        self.assertNotIn("cvv", json.dumps(contexto.to_dict()))
+
+    def test_dados_vencidos_ou_de_outra_chave_nao_abrem(self):
+        cifrado = self.cofre.fechar(self.CARTAO)
+
+        self.assertEqual(CardVault(chave=Fernet.generate_key(), metrics=Metrics()).abrir(cifrado), {})
+        with mock.patch("cryptography.fernet.time.time", return_value=time.time() + self.cofre.validade + 1):
+            self.assertEqual(self.cofre.abrir(cifrado), {})
+        self.assertEqual(self.cofre.metrics.snapshot()["contadores"]["cartao.expirados"], 1)
+
+    def test_fluxo_recomeca_com_os_dados_vencidos(self):
+        gerenciador = DialogManager(session_store=InMemorySessionStore(metrics=Metrics()), card_vault=self.cofre)
+        contexto = SessionContext.from_dict(self._contexto_com_cartao().to_dict())
+
+        with mock.patch("cryptography.fernet.time.time", return_value=time.time() + self.cofre.validade + 1):
+            texto = gerenciador.fluxo_pagamento_cartao(contexto, "Ana Souza")
+
+        self.assertIn("número do cartão", texto)
+        self.assertEqual(contexto["etapa_cartao"], 1)
+        self.assertIsNone(contexto["cartao_cifrado"])
+
+    def test_workers_alternados_concluem_o_pagamento(self):
+        # Dois processos atrás de um balanceador sem afinidade, com o mesmo banco e a mesma chave
+        store = DatabaseSessionStore()
+        workers = [DialogManager(session_store=store) for _ in range(2)]
+        for worker in workers:
+            nlp = mock.patch.object(worker.nlp_processor, "processar_mensagem", side_effect=AssertionError("NLP chamado"))
+            nlp.start()
+            self.addCleanup(nlp.stop)
+
+        contexto = workers[0].get_session_context("s", {"nome": "Ana"})
+        contexto["plano_atual"] = "premium"
+        contexto["etapa_cartao"] = 1
+        workers[0].salvar_contexto("s", contexto)
+
+        respostas = ["4111 1111 1111 1111", "12/30", "123", "Ana Souza", "529.982.247-25"]
+        for numero, mensagem in enumerate(respostas):
+            resposta = workers[numero % 2].processar_mensagem(mensagem, "s")
+
+        self.assertIn("Pagamento realizado com sucesso", resposta["texto"])
+        contexto = workers[1].get_session_context("s")
+        self.assertEqual(contexto["etapa_cartao"], 0)
+        self.assertIsNone(contexto["cartao_cifrado"])
+        self.assertEqual(contexto.pagamentos.ultimo().metodo.nome, "cartao")
+
+
+class SlotValidatorsTests(SimpleTestCase):
+    """Validadores dos dados do cartão (utils/slot_validators.py)."""
+
+    def test_numero_cartao_com_luhn(self):
+        self.assertEqual(validar_numero_cartao("4111 1111 1111 1111"), "4111111111111111")
+        self.assertEqual(validar_numero_cartao("5555-5555-5555-4444"), "5555555555554444")
+        self.assertIsNone(validar_numero_cartao("4111 1111 1111 1112"))
+        self.assertIsNone(validar_numero_cartao("4111 1111 1111"))
+        self.assertIsNone(validar_numero_cartao("4111 1111 1111 111a"))
+        self.assertIsNone(validar_numero_cartao(""))
+        self.assertTrue(luhn_valido("79927398713"))
+        self.assertFalse(luhn_valido("79927398710"))
+
+    def test_validade_mm_aa(self):
+        hoje = date(2026, 10, 17)
+        self.assertEqual(validar_validade("12/30", hoje=hoje), "12/30")
+        self.assertEqual(validar_validade("1/30", hoje=hoje), "01/30")
+        self.assertEqual(validar_validade("0130", hoje=hoje), "01/30")
+        self.assertEqual(validar_validade("12/2031", hoje=hoje), "12/31")
+        # O cartão vale até o fim do mês informado
+        self.assertEqual(validar_validade("10/26", hoje=hoje), "10/26")
+        self.assertIsNone(validar_validade("09/26", hoje=hoje))
+        self.assertIsNone(validar_validade("00/30", hoje=hoje))
+        self.assertIsNone(validar_validade("13/30", hoje=hoje))
+        self.assertIsNone(validar_validade("12/3", hoje=hoje))
+        self.assertIsNone(validar_validade("dezembro", hoje=hoje))
+
+    def test_cvv(self):
+        self.assertEqual(validar_cvv(" 123 "), "123")
+        self.assertEqual(validar_cvv("1234"), "1234")
+        self.assertIsNone(validar_cvv("12"))
+        self.assertIsNone(validar_cvv("12345"))
+        self.assertIsNone(validar_cvv("12a"))
+
+    def test_nome_cartao(self):
+        self.assertEqual(validar_nome_cartao("  joão  da silva "), "JOÃO DA SILVA")
+        self.assertEqual(validar_nome_cartao("Ana D'Ávila-Souza"), "ANA D'ÁVILA-SOUZA")
+        self.assertIsNone(validar_nome_cartao("Fulano"))
+        self.assertIsNone(validar_nome_cartao("Fulano 2"))
+        self.assertIsNone(validar_nome_cartao("A" * 20 + " " + "B" * 10))
+
+    def test_cpf_digitos_verificadores(self):
+        self.assertEqual(validar_cpf("529.982.247-25"), "52998224725")
+        self.assertEqual(validar_cpf("11144477735"), "11144477735")
+        self.assertIsNone(validar_cpf("529.982.247-24"))
+        self.assertIsNone(validar_cpf("529.982.247-15"))
+        self.assertIsNone(validar_cpf("111.111.111-11"))
+        self.assertIsNone(validar_cpf("5299822472"))
+
+
+class FluxoCartaoTests(SimpleTestCase):
+    """Preenchimento dos dados do cartão no DialogManager, sem passar pelo NLP."""
+
+    def setUp(self):
+        self.gerenciador = DialogManager(session_store=InMemorySessionStore(metrics=Metrics()))
+        contexto = self.gerenciador.get_session_context("s", {"nome": "Ana"})
+        contexto["plano_atual"] = "premium"
+        contexto["etapa_cartao"] = 1
+        self.nlp = mock.patch.object(
+            self.gerenciador.nlp_processor, "processar_mensagem", side_effect=AssertionError("NLP chamado")
+        )
+        self.nlp.start()
+        self.addCleanup(self.nlp.stop)
+
+    def _enviar(self, *mensagens):
+        for mensagem in mensagens:
+            resposta = self.gerenciador.processar_mensagem(mensagem, "s")
+            self.assertEqual(resposta["camada"], "slot")
+        return resposta, self.gerenciador.get_session_context("s")
+
+    def test_conclusao_registra_pagamento_e_descarta_os_dados(self):
+        resposta, contexto = self._enviar("4111 1111 1111 1111", "12/30", "123", "Ana Souza", "529.982.247-25")
+
+        self.assertIn("Pagamento realizado com sucesso", resposta["texto"])
+        self.assertEqual(contexto["etapa_cartao"], 0)
+        self.assertIsNone(contexto["cartao_cifrado"])
+        pagamento = contexto.pagamentos.ultimo()
+        self.assertEqual((pagamento.metodo.nome, pagamento.plano, pagamento.status.nome), ("cartao", "premium", "aprovado"))
+        # O texto das respostas com dados do cartão não entra no histórico
+        self.assertTrue(all(turno.texto is None for turno in contexto.turnos))
+
+    def test_entrada_invalida_repete_a_pergunta(self):
+        resposta, contexto = self._enviar("4111 1111 1111 1111", "13/30")
+
+        self.assertIn("validade", resposta["texto"])
+        self.assertEqual(contexto["etapa_cartao"], 2)
+        self.assertNotIn("validade", self.gerenciador.card_vault.abrir(contexto["cartao_cifrado"]))
+
+        resposta, contexto = self._enviar("12/30")
+        self.assertIn("CVV", resposta["texto"])
+        self.assertEqual(contexto["etapa_cartao"], 3)
+
+    def test_cancelar_interrompe_o_fluxo(self):
+        resposta, contexto = self._enviar("4111 1111 1111 1111", "quero cancelar")
+
+        self.assertIn("cancelado", resposta["texto"])
+        self.assertEqual(contexto["etapa_cartao"], 0)
+        self.assertIsNone(contexto["cartao_cifrado"])
+        self.assertEqual(len(contexto.pagamentos), 0)
+
+
+class _DocFalso(list):
+    """Documento do spaCy reduzido aos atributos usados pelo NLPProcessor."""
+
+
+class _SpacyFalso:
+    """
+    Modelo determinístico com a interface do spaCy: chamada direta e `pipe`.
+
+    Palavras com mais de três letras são substantivos com o singular como lema;
+    `pipe` processa em lotes, como o spaCy, e registra o tamanho de cada um.
+    """
+
+    def __init__(self):
+        self.lotes = []
+
+    def __call__(self, texto):
+        return _DocFalso(
+            types.SimpleNamespace(lemma_=singularizar(palavra), pos_="NOUN" if len(palavra) > 3 else "ADP")
+            for palavra in texto.split()
+        )
+
+    def pipe(self, textos, batch_size=1000, n_process=1):
+        textos = iter(textos)
+        while True:
+            lote = [texto for _, texto in zip(range(batch_size), textos)]
+            if not lote:
+                return
+            self.lotes.append(len(lote))
+            yield from (self(texto) for texto in lote)
+
+
+class AnaliseEmLoteTests(SimpleTestCase):
+    """`extrair_palavras_chave_lote` (nlp.pipe) contra a análise de um texto por vez."""
+
+    TEXTOS = [
+        "Quais os benefícios do plano premium?",
+        "quanto custa o plano básico",
+        "quero pagar com PIX",
+        "Quero mais informações sobre os planos disponíveis",
+        "",
+        "posso pagar no cartão de crédito?",
+        "cancelar minha assinatura",
+    ]
+
+    def setUp(self):
+        self.processador = NLPProcessor(inference_client=False)
+
+    def _usar_modelo(self, nlp):
+        patcher = mock.patch.object(NLPProcessor, "nlp", new_callable=mock.PropertyMock, return_value=nlp)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _conferir(self, **kwargs):
+        em_lote = self.processador.extrair_palavras_chave_lote(self.TEXTOS, **kwargs)
+        um_por_vez = [self.processador.extrair_palavras_chave(texto) for texto in self.TEXTOS]
+        self.assertEqual(em_lote, um_por_vez)
+
+    def test_lotes_do_pipe_iguais_a_analise_individual(self):
+        modelo = _SpacyFalso()
+        self._usar_modelo(modelo)
+
+        self._conferir(batch_size=3)
+
+        # Os textos passaram pelo pipe em lotes, não um a um
+        self.assertEqual(modelo.lotes, [3, 3, 1])
+
+    def test_sem_modelo_carregado_tambem_coincide(self):
+        self._usar_modelo(None)
+
+        self._conferir()
+
+    @skipIf(importlib.util.find_spec("spacy") is None, "spaCy não instalado")
+    def test_modelo_real_do_spacy(self):
+        if self.processador.registry.get("spacy") is None:
+            self.skipTest("modelo do spaCy indisponível")
+
+        self._conferir(batch_size=2)
+
+
+class IntentMatcherTests(SimpleTestCase):
+    """Reconhecedor de intenções por palavras-chave (utils/intent_matcher.py)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.nlp = NLPProcessor(inference_client=False)
+
+    def test_plural_cadastrado_pertence_a_sua_intencao(self):
+        # Com a busca por substring, "pagamento" em "pagamentos" dava a intenção pagamento
+        self.assertEqual(self.nlp.identificar_intencao("quero ver meus pagamentos"), "historico")
+        self.assertEqual(self.nlp.identificar_intencao("quero fazer o pagamento"), "pagamento")
+        self.assertEqual(self.nlp.intent_matcher.intencoes("quero ver meus pagamentos"), ["historico"])
+
+    def test_palavras_inteiras_com_plural_simples(self):
+        matcher = IntentMatcher({"info_plano": ["plano", "valor"], "saudacao": ["oi"]})
+
+        self.assertEqual(matcher.intencoes("quais os planos e valores"), ["info_plano"])
+        self.assertEqual(matcher.intencoes("depois eu vejo"), [])
+        self.assertEqual(
+            [(m.palavra_chave, m.inicio, m.fim) for m in matcher.encontrar("oi, quais planos")],
+            [("oi", 0, 2), ("plano", 10, 16)]
+        )
+
+    def test_intencoes_por_ordem_de_cadastro_e_palavras_normalizadas(self):
+        matcher = IntentMatcher({"saudacao": ["olá"], "info_plano": ["preço"]}, self.nlp.normalizar_texto)
+
+        self.assertEqual(matcher.intencoes("qual o preco? ola"), ["saudacao", "info_plano"])
+
+    def test_atualizar_troca_a_tabela_inteira(self):
+        matcher = IntentMatcher({"x": ["alfa"]})
+        tabelas = [{"x": ["alfa"]}, {"y": ["beta"]}]
+        parar = threading.Event()
+        vistos, erros = set(), []
+
+        def buscar():
+            while not parar.is_set():
+                try:
+                    vistos.add(tuple(matcher.intencoes("alfa beta")))
+                except Exception as e:
+                    erros.append(e)
+                    return
+
+        leitores = [threading.Thread(target=buscar) for _ in range(4)]
+        for leitor in leitores:
+            leitor.start()
+        for indice in range(2000):
+            matcher.atualizar(tabelas[indice % 2])
+        parar.set()
+        for leitor in leitores:
+            leitor.join(5)
+
+        self.assertEqual(erros, [])
+        # Nunca uma mistura da expressão de uma tabela com os índices da outra
+        self.assertLessEqual(vistos, {("x",), ("y",)})
+
+    def test_tabela_invalida_mantem_a_anterior(self):
+        matcher = IntentMatcher({"x": ["alfa"]})
+
+        with self.assertRaises(AttributeError):
+            matcher.atualizar({"y": [None]})
+
+        self.assertEqual(matcher.intencoes("alfa beta"), ["x"])
+
+
+class CamadaLexicaTests(SimpleTestCase):
+    """Camada léxica do NLPProcessor: plurais e confiança antes do spaCy."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.nlp = NLPProcessor()
+
+    def setUp(self):
+        self.nlp.limpar_cache()
+
+    def test_plurais_resolvem_o_tipo_de_informacao(self):
+        casos = {
+            "Quais os benefícios do plano premium?": ("premium", "benefícios"),
+            "Quais as vantagens do plano básico?": ("basico", "benefícios"),
+            "Quais são os valores do premium?": ("premium", "preço"),
+            "quais os preços do plano basico": ("basico", "preço"),
+            "Quero mais informações do plano premium": ("premium", "descrição"),
+        }
+        for texto, esperado in casos.items():
+            with self.subTest(texto=texto):
+                analise = self.nlp.classificar(texto)
+                self.assertEqual((analise["plano"], analise["tipo_informacao"]), esperado)
+
+    def test_singular_continua_igual(self):
+        analise = self.nlp.classificar("Qual o benefício do plano premium?")
+
+        self.assertEqual(analise["tipo_informacao"], "benefícios")
+
+    def test_pergunta_so_com_plano_consulta_o_spacy(self):
+        with mock.patch.object(self.nlp, "_extrair_com_spacy", return_value=None) as spacy:
+            self.nlp.classificar("Como funciona o plano premium?")
+            self.assertEqual(spacy.call_count, 1)
+
+            self.nlp.classificar("quero o plano premium")
+            self.assertEqual(spacy.call_count, 1)
+
+    def test_singularizar(self):
+        self.assertEqual(singularizar("beneficios"), "beneficio")
+        self.assertEqual(singularizar("vantagens"), "vantagem")
+        self.assertEqual(singularizar("valores"), "valor")
+        self.assertEqual(singularizar("informacoes"), "informacao")
+        self.assertEqual(singularizar("cartoes"), "cartao")
+        self.assertEqual(singularizar("plano"), "plano")
+
+
+def _normalizacao_em_varias_passadas(texto, stop_words):
+    """Normalização anterior ao text_normalizer: NFKD, remoção dos acentos, minúsculas e regex."""
+    texto = texto.replace("PIX", "pix")
+    texto = unicodedata.normalize("NFKD", texto)
+    texto = "".join([c for c in texto if not unicodedata.combining(c)])
+    normalizado = texto.lower()
+    tokens = re.findall(r"\w+", normalizado)
+    return normalizado, tokens, [token for token in tokens if token not in stop_words]
+
+
+class TextNormalizerTests(SimpleTestCase):
+    """Normalização em uma passada (utils/text_normalizer.py) contra a versão em várias passadas."""
+
+    STOP_WORDS = frozenset({"o", "os", "as", "do", "da", "de", "com", "no", "sao", "e"})
+
+    TEXTOS = [
+        "Quais os BENEFÍCIOS do plano Premium?",
+        "Quero pagar com PIX, por favor!",
+        "Informações sobre cartões de crédito... e boletos.",
+        "Quais são as vantagens/valores do plano básico?!",
+        "Preços: R$ 29,90 (básico) — R$ 59,90 (premium)",
+        "Ação, coração, pão, não, você, avó, Àquela, ÇÃO",
+        "Ĳssel, ﬁnanciamento, São Paulo², Ångström",
+        "plain ascii text, nothing to strip",
+        "",
+    ]
+
+    def test_saida_igual_a_normalizacao_em_varias_passadas(self):
+        for texto in self.TEXTOS:
+            with self.subTest(texto=texto):
+                normalizado, tokens, tokens_limpos = _normalizacao_em_varias_passadas(texto, self.STOP_WORDS)
+                analise = analisar_texto(texto, self.STOP_WORDS)
+
+                self.assertEqual(normalizar_texto(texto), normalizado)
+                self.assertEqual(analise, (texto, normalizado, tokens, tokens_limpos))
+
+    def test_plurais_singularizados_como_antes(self):
+        casos = {
+            "Os BENEFÍCIOS e as Vantagens?": ["beneficio", "vantagem"],
+            "valores, preços e informações": ["valor", "preco", "informacao"],
+            "Cartões, PIX e boletos": ["cartao", "pix", "boleto"],
+            "vezes por mês": ["vez", "por", "mes"],
+        }
+        for texto, esperado in casos.items():
+            with self.subTest(texto=texto):
+                _, _, tokens_antigos = _normalizacao_em_varias_passadas(texto, self.STOP_WORDS)
+                tokens = analisar_texto(texto, self.STOP_WORDS).tokens_limpos
+
+                self.assertEqual([singularizar(token) for token in tokens], esperado)
+                self.assertEqual(
+                    [singularizar(token) for token in tokens],
+                    [singularizar(token) for token in tokens_antigos]
+                )
+
+
+class CacheAnaliseTests(SimpleTestCase):
+    """Cache das análises do NLPProcessor, indexado pelo texto normalizado."""
+
+    def setUp(self):
+        self.nlp = NLPProcessor(inference_client=False)
+
+    def test_textos_iguais_apos_normalizacao_usam_o_cache(self):
+        primeira = self.nlp.processar_mensagem("Quais os benefícios do plano premium?")
+
+        with mock.patch.object(self.nlp.intent_matcher, "intencoes", wraps=self.nlp.intent_matcher.intencoes) as intencoes:
+            for texto in ["quais os beneficios do plano premium?", "QUAIS OS BENEFÍCIOS DO PLANO PREMIUM?"]:
+                with self.subTest(texto=texto):
+                    resultado = self.nlp.processar_mensagem(texto)
+                    for campo in ("intencao", "plano", "tipo_informacao", "palavras_chave", "camada"):
+                        self.assertEqual(resultado[campo], primeira[campo])
+
+            intencoes.assert_not_called()
+        self.assertEqual(self.nlp.cache.stats()["hits"], 2)
+
+    def test_texto_diferente_nao_usa_o_cache(self):
+        self.nlp.processar_mensagem("Quais os benefícios do plano premium?")
+
+        resultado = self.nlp.processar_mensagem("Quais os benefícios do plano básico?")
+
+        self.assertEqual(resultado["plano"], "basico")
+        self.assertEqual(self.nlp.cache.stats()["hits"], 0)
+
+    def test_alterar_o_resultado_nao_corrompe_o_cache(self):
+        texto = "Quais os benefícios do plano premium?"
+        original = self.nlp.processar_mensagem(texto)
+        palavras_chave = set(original["palavras_chave"])
+
+        original["palavras_chave"].add("intrusa")
+        original["plano"] = "basico"
+        analise = self.nlp.classificar(texto)
+        analise["palavras_chave"].clear()
+        analise["intencao"] = "outra"
+
+        resultado = self.nlp.processar_mensagem(texto)
+        self.assertEqual(resultado["palavras_chave"], palavras_chave)
+        self.assertEqual(resultado["plano"], "premium")
+        self.assertNotEqual(resultado["intencao"], "outra")
+        self.assertEqual(self.nlp.cache.stats()["hits"], 2)
+
+    def test_limpar_cache_refaz_a_analise(self):
+        texto = "Quais os benefícios do plano premium?"
+        self.nlp.classificar(texto)
+
+        self.nlp.limpar_cache()
+        with mock.patch.object(self.nlp.intent_matcher, "intencoes", wraps=self.nlp.intent_matcher.intencoes) as intencoes:
+            self.nlp.classificar(texto)
+
+        intencoes.assert_called_once()
+
+
+class ConflitoSessaoTests(TestCase):
+    """Dois workers atendendo a mesma sessão sobre o armazenamento compartilhado."""
+
+    def _worker(self, backend):
+        return DialogManager(session_store=ReadThroughSessionStore(backend, validade=60.0, metrics=Metrics()))
+
+    def test_gravacao_concorrente_refaz_o_turno_em_vez_de_sobrescrever(self):
+        backend = DatabaseSessionStore()
+        worker_a, worker_b = self._worker(backend), self._worker(backend)
+
+        worker_a.processar_mensagem("quero o plano premium", "s")
+        worker_b.processar_mensagem("quero o plano basico", "s")
+        # A cópia local de A está desatualizada (e ainda dentro da validade)
+        refeitos = metrics.snapshot()["contadores"].get("dialogo.turnos_refeitos", 0)
+        worker_a.processar_mensagem("meu histórico", "s")
+
+        contexto, versao = backend.carregar("s")
+        self.assertEqual(contexto["plano_atual"], "basico")
+        self.assertEqual([turno[4] for turno in contexto["historico"]], [
+            "quero o plano premium", "quero o plano basico", "meu histórico"
+        ])
+        # Criação da sessão e três turnos gravados, nenhum sobrescrito
+        self.assertEqual(versao, 4)
+        self.assertEqual(metrics.snapshot()["contadores"]["dialogo.turnos_refeitos"], refeitos + 1)
+
+    def test_conflito_nao_sobrescreve_e_descarta_a_copia_local(self):
+        backend = DatabaseSessionStore()
+        store_a = ReadThroughSessionStore(backend, validade=60.0, metrics=Metrics())
+        store_b = ReadThroughSessionStore(backend, validade=60.0, metrics=Metrics())
+        store_a.set("s", {"n": 1})
+        self.assertEqual(store_b.get("s"), {"n": 1})
+        store_b.set("s", {"n": 2})
+
+        with self.assertRaises(SessionConflict):
+            store_a.set("s", {"n": 3})
+
+        self.assertEqual(backend.carregar("s"), ({"n": 2}, 2))
+        self.assertEqual(store_a.get("s"), {"n": 2})
+
+
+class _ServidorRespFalso(socketserver.ThreadingTCPServer):
+    """
+    Servidor local do protocolo do Redis (RESP2) com os comandos usados pelo RedisSessionStore.
+
+    Mantém hashes em memória e implementa WATCH/MULTI/EXEC com um contador de
+    versões por chave; PEXPIRE guarda o prazo, que `expirar` aplica sob demanda.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        self.hashes = {}
+        self.versoes = {}
+        self.prazos = {}
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), _ConexaoRespFalsa)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return "redis://127.0.0.1:%d/0" % self.server_address[1]
+
+    def expirar(self):
+        """Remove as chaves com prazo vencido."""
+        with self.lock:
+            for chave, prazo in list(self.prazos.items()):
+                if prazo <= time.monotonic():
+                    self._alterar(chave)
+                    self.hashes.pop(chave, None)
+                    del self.prazos[chave]
+
+    def _alterar(self, chave):
+        self.versoes[chave] = self.versoes.get(chave, 0) + 1
+
+    def executar(self, argumentos):
+        comando, argumentos = argumentos[0].upper(), argumentos[1:]
+        if comando == b"HGET":
+            return self.hashes.get(argumentos[0], {}).get(argumentos[1])
+        if comando == b"HMGET":
+            return [self.hashes.get(argumentos[0], {}).get(campo) for campo in argumentos[1:]]
+        if comando == b"HSET":
+            valores = self.hashes.setdefault(argumentos[0], {})
+            valores.update(zip(argumentos[1::2], argumentos[2::2]))
+            self._alterar(argumentos[0])
+            return len(argumentos[1:]) // 2
+        if comando == b"PEXPIRE":
+            if argumentos[0] not in self.hashes:
+                return 0
+            self.prazos[argumentos[0]] = time.monotonic() + int(argumentos[1]) / 1000
+            return 1
+        if comando == b"DEL":
+            removidas = 0
+            for chave in argumentos:
+                self._alterar(chave)
+                removidas += self.hashes.pop(chave, None) is not None
+            return removidas
+        if comando == b"CLIENT":
+            # Identificação enviada pelo redis-py ao conectar
+            return "OK"
+        raise ValueError(comando)
+
+
+class _ConexaoRespFalsa(socketserver.StreamRequestHandler):
+    """Uma conexão de cliente com o servidor RESP falso."""
+
+    def _ler_comando(self):
+        linha = self.rfile.readline()
+        if not linha:
+            return None
+        argumentos = []
+        for _ in range(int(linha[1:])):
+            tamanho = int(self.rfile.readline()[1:])
+            argumentos.append(self.rfile.read(tamanho + 2)[:-2])
+        return argumentos
+
+    def _codificar(self, valor):
+        if valor is None:
+            return b"$-1\r\n"
+        if isinstance(valor, int):
+            return b":%d\r\n" % valor
+        if isinstance(valor, list):
+            return b"*%d\r\n" % len(valor) + b"".join(self._codificar(item) for item in valor)
+        if isinstance(valor, str):
+            return b"+%s\r\n" % valor.encode()
+        return b"$%d\r\n%s\r\n" % (len(valor), valor)
+
+    def handle(self):
+        observadas, fila = {}, None
+        while True:
+            argumentos = self._ler_comando()
+            if argumentos is None:
+                return
+            comando = argumentos[0].upper()
+            with self.server.lock:
+                if comando == b"WATCH":
+                    observadas.update((chave, self.server.versoes.get(chave, 0)) for chave in argumentos[1:])
+                    resposta = "OK"
+                elif comando == b"UNWATCH":
+                    observadas, resposta = {}, "OK"
+                elif comando == b"MULTI":
+                    fila, resposta = [], "OK"
+                elif comando == b"EXEC":
+                    alteradas = any(self.server.versoes.get(chave, 0) != versao for chave, versao in observadas.items())
+                    resposta = None if alteradas else [self.server.executar(item) for item in fila]
+                    observadas, fila = {}, None
+                elif fila is not None:
+                    fila.append(argumentos)
+                    resposta = "QUEUED"
+                else:
+                    resposta = self.server.executar(argumentos)
+            self.wfile.write(self._codificar(resposta))
+
+
+class SessionContextTests(SimpleTestCase):
+    """Histórico circular e serialização do contexto (services/session_context.py)."""
+
+    def test_buffer_descarta_os_mais_antigos(self):
+        historico = HistoricoCircular(3)
+        for numero in range(1, 8):
+            historico.append(numero)
+
+        self.assertEqual(list(historico), [5, 6, 7])
+        self.assertEqual((len(historico), historico.ultimo()), (3, 7))
+
+    @override_settings(SESSOES_MAX_HISTORICO=3)
+    def test_historico_da_sessao_respeita_sessoes_max_historico(self):
+        gerenciador = DialogManager(session_store=InMemorySessionStore(metrics=Metrics()))
+        with mock.patch.object(gerenciador.shadow_evaluator, "submeter"):
+            for numero in range(5):
+                gerenciador.processar_mensagem(f"olá {numero}", "s", {"nome": "Ana"})
+
+        turnos = gerenciador.get_session_context("s").turnos
+        self.assertEqual([turno.texto for turno in turnos], ["olá 2", "olá 3", "olá 4"])
+
+    def test_ida_e_volta_pelo_json(self):
+        contexto = SessionContext(nome="Ana", email="ana@example.com", max_historico=3)
+        contexto["plano_atual"] = "premium"
+        contexto["entrada_atual"] = "quero pagar"
+        for numero in range(5):
+            contexto.registrar_turno(f"mensagem {numero}", "info_plano", "premium", "preco")
+        contexto.registrar_pagamento("pix", "premium")
+        contexto.registrar_pagamento("cartao", "basico", "recusado")
+
+        dados = json.loads(json.dumps(contexto.to_dict()))
+        copia = SessionContext.from_dict(dados, max_historico=3)
+
+        self.assertEqual(copia.to_dict(), contexto.to_dict())
+        self.assertEqual(list(copia.turnos), list(contexto.turnos))
+        self.assertEqual(copia.turnos.ultimo().texto, "mensagem 4")
+        self.assertIs(copia.turnos.ultimo().intencao, Intencao.INFO_PLANO)
+        self.assertEqual(
+            [(pagamento.metodo, pagamento.status) for pagamento in copia.pagamentos],
+            [(MetodoPagamento.PIX, StatusPagamento.APROVADO), (MetodoPagamento.CARTAO, StatusPagamento.RECUSADO)]
+        )
+        # Campos nunca atribuídos continuam ausentes
+        self.assertNotIn("cartao_cifrado", copia)
+        self.assertEqual(copia.get("cartao_cifrado", "ausente"), "ausente")
+
+    def test_formato_antigo_do_historico(self):
+        copia = SessionContext.from_dict({"nome": "Ana", "historico": [
+            {"timestamp": "2024-05-01T10:00:00", "texto": "oi", "intencao": "saudacao"},
+            {"timestamp": "2024-05-01T10:05:00", "tipo": "pagamento", "metodo": "boleto", "plano": "basico",
+             "status": "pendente"},
+        ]})
+
+        self.assertEqual([(turno.texto, turno.intencao) for turno in copia.turnos], [("oi", Intencao.SAUDACAO)])
+        self.assertEqual([pagamento.metodo for pagamento in copia.pagamentos], [MetodoPagamento.BOLETO])
+
+
+class _StoreSerializado(modulo_sessoes.SessionStore):
+    """Armazenamento que, como os compartilhados, devolve uma cópia desserializada a cada leitura."""
+
+    def __init__(self):
+        self.sessoes = {}
+
+    def get(self, session_id):
+        dados = self.sessoes.get(session_id)
+        return json.loads(dados) if dados is not None else None
+
+    def set(self, session_id, contexto):
+        self.sessoes[session_id] = json.dumps(modulo_sessoes.serializavel(contexto))
+
+
+class TurnosConcorrentesTests(SimpleTestCase):
+    """Turnos simultâneos da mesma sessão no DialogManager (services/session_locks.py)."""
+
+    THREADS = 8
+    MENSAGENS = 10
+
+    def setUp(self):
+        self.gerenciador = DialogManager(session_store=_StoreSerializado())
+        self.gerenciador.max_historico = self.THREADS * self.MENSAGENS
+        self.gerenciador.session_locks = SessionLocks(listras=4, metrics=Metrics())
+        processar = self.gerenciador.nlp_processor.processar_mensagem
+
+        def processar_devagar(texto, contexto, analise=None):
+            # Alarga a janela entre a leitura e a gravação do contexto
+            time.sleep(0.001)
+            return processar(texto, contexto, analise)
+
+        for alvo, atributo, substituto in (
+            (self.gerenciador.nlp_processor, "processar_mensagem", processar_devagar),
+            (self.gerenciador.shadow_evaluator, "submeter", lambda *args: None),
+        ):
+            patcher = mock.patch.object(alvo, atributo, side_effect=substituto)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _conversar(self, numero, erros):
+        try:
+            for indice in range(self.MENSAGENS):
+                self.gerenciador.processar_mensagem(f"olá {numero}-{indice}", "s", {"nome": "Ana"})
+        except Exception as e:
+            erros.append(e)
+
+    def test_nenhum_turno_se_perde(self):
+        erros = []
+        threads = [threading.Thread(target=self._conversar, args=(numero, erros)) for numero in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        self.assertEqual(erros, [])
+        textos = [turno.texto for turno in self.gerenciador.get_session_context("s").turnos]
+        self.assertCountEqual(textos, [
+            f"olá {numero}-{indice}" for numero in range(self.THREADS) for indice in range(self.MENSAGENS)
+        ])
+        # Cada thread vê os próprios turnos na ordem em que os enviou
+        for numero in range(self.THREADS):
+            proprios = [texto for texto in textos if texto.startswith(f"olá {numero}-")]
+            self.assertEqual(proprios, [f"olá {numero}-{indice}" for indice in range(self.MENSAGENS)])
+
+        locks = self.gerenciador.session_locks
+        self.assertGreater(locks.metrics.snapshot()["contadores"]["sessoes.locks.esperas"], 0)
+        # Com os turnos concluídos, as entradas com contagem de referências são removidas
+        self.assertEqual(locks.stats()["sessoes_ativas"], 0)
+        self.assertEqual(sum(len(sessoes) for _, sessoes in locks._listras), 0)
+
+
+class InMemorySessionStoreTests(SimpleTestCase):
+    """Limites por LRU, TTL e tamanho do armazenamento em memória."""
+
+    def setUp(self):
+        self.agora = 1000.0
+        relogio = mock.patch.object(modulo_sessoes, "time", types.SimpleNamespace(monotonic=lambda: self.agora))
+        relogio.start()
+        self.addCleanup(relogio.stop)
+
+    def _store(self, **kwargs):
+        return InMemorySessionStore(metrics=Metrics(), **kwargs)
+
+    def test_lru_remove_a_sessao_menos_usada(self):
+        store = self._store(max_entries=2, ttl=None)
+        store.set("a", {"n": 1})
+        store.set("b", {"n": 2})
+        store.get("a")
+
+        store.set("c", {"n": 3})
+
+        self.assertIsNone(store.get("b"))
+        self.assertEqual((store.get("a"), store.get("c")), ({"n": 1}, {"n": 3}))
+        self.assertEqual(store.metrics.snapshot()["contadores"]["sessoes.evictions"], 1)
+
+    def test_ttl_conta_a_partir_do_ultimo_acesso(self):
+        store = self._store(ttl=10.0)
+        store.set("a", {"n": 1})
+        store.set("b", {"n": 2})
+        self.agora += 6
+        store.get("b")
+
+        self.agora += 5
+
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(store.get("b"), {"n": 2})
+        self.assertEqual(store.metrics.snapshot()["contadores"]["sessoes.expiracoes"], 1)
+
+    def test_gravacao_remove_as_expiradas(self):
+        store = self._store(ttl=10.0)
+        store.set("a", {"n": 1})
+        self.agora += 10
+
+        store.set("b", {"n": 2})
+
+        self.assertEqual(len(store), 1)
+
+    def test_max_bytes_remove_as_mais_antigas(self):
+        tamanho = modulo_sessoes.tamanho_aproximado({"texto": "x" * 100})
+        store = self._store(ttl=None, max_bytes=2 * tamanho)
+        for session_id in "abc":
+            store.set(session_id, {"texto": "x" * 100})
+
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(store.stats()["bytes_aproximados"], 2 * tamanho)
+
+    def test_sem_max_bytes_o_contexto_nao_e_serializado(self):
+        store = self._store()
+
+        with mock.patch.object(modulo_sessoes, "tamanho_aproximado") as medir:
+            store.set("a", {"n": 1})
+
+        medir.assert_not_called()
+        self.assertIsNone(store.stats()["bytes_aproximados"])
+
+
+class DatabaseSessionStoreTests(TestCase):
+    """Armazenamento de sessões na tabela SessaoAssistente."""
+
+    def test_gravacao_condicional_pela_versao(self):
+        store = DatabaseSessionStore()
+
+        self.assertEqual(store.carregar("s"), (None, 0))
+        self.assertEqual(store.gravar("s", {"n": 1}, 0), 1)
+        self.assertIsNone(store.gravar("s", {"n": 9}, 0))
+        self.assertEqual(store.gravar("s", {"n": 2}, 1), 2)
+        self.assertIsNone(store.gravar("s", {"n": 9}, 1))
+        self.assertEqual(store.carregar("s"), ({"n": 2}, 2))
+        self.assertEqual(store.versao("s"), 2)
+
+    def test_sessao_expirada_conta_como_inexistente(self):
+        store = DatabaseSessionStore(ttl=60)
+        store.set("s", {"n": 1})
+        SessaoAssistente.objects.filter(session_id="s").update(expira_em=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(store.carregar("s"), (None, 0))
+        self.assertIsNone(store.gravar("s", {"n": 2}, 1))
+        # Recriada a partir da versão 0, sobre a linha expirada
+        self.assertEqual(store.gravar("s", {"n": 2}, 0), 1)
+        self.assertEqual(store.carregar("s"), ({"n": 2}, 1))
+
+    def test_limpeza_remove_sessoes_expiradas(self):
+        store = DatabaseSessionStore(ttl=60, intervalo_limpeza=0)
+        store.set("antiga", {})
+        SessaoAssistente.objects.filter(session_id="antiga").update(expira_em=timezone.now() - timedelta(seconds=1))
+
+        store.set("nova", {})
+
+        self.assertEqual(list(SessaoAssistente.objects.values_list("session_id", flat=True)), ["nova"])
+
+    def test_delete(self):
+        store = DatabaseSessionStore()
+        store.set("s", {"n": 1})
+        store.delete("s")
+
+        self.assertIsNone(store.get("s"))
+
+
+@skipIf(redis is None, "pacote redis não instalado")
+class RedisSessionStoreTests(SimpleTestCase):
+    """Armazenamento de sessões no Redis, contra um servidor RESP local."""
+
+    def setUp(self):
+        self.servidor = _ServidorRespFalso()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+        self.store = RedisSessionStore(url=self.servidor.url, ttl=60)
+
+    def test_gravacao_condicional_pela_versao(self):
+        self.assertEqual(self.store.carregar("s"), (None, 0))
+        self.assertEqual(self.store.gravar("s", {"texto": "ação"}, 0), 1)
+        self.assertIsNone(self.store.gravar("s", {}, 0))
+        self.assertEqual(self.store.gravar("s", {"texto": "pix"}, 1), 2)
+        self.assertEqual(self.store.carregar("s"), ({"texto": "pix"}, 2))
+
+    def test_gravacoes_concorrentes_nao_se_perdem(self):
+        def incrementar():
+            store = RedisSessionStore(url=self.servidor.url)
+            for _ in range(25):
+                while True:
+                    contexto, versao = store.carregar("contador")
+                    contexto = contexto or {"n": 0}
+                    contexto["n"] += 1
+                    if store.gravar("contador", contexto, versao) is not None:
+                        break
+
+        threads = [threading.Thread(target=incrementar) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+
+        self.assertEqual(self.store.carregar("contador"), ({"n": 100}, 100))
+
+    def test_ttl_e_delete(self):
+        RedisSessionStore(url=self.servidor.url, ttl=0.01).set("curta", {"n": 1})
+        self.store.set("s", {"n": 1})
+        time.sleep(0.02)
+        self.servidor.expirar()
+
+        self.assertIsNone(self.store.get("curta"))
+        self.store.delete("s")
+        self.assertIsNone(self.store.get("s"))
+
+    def test_cache_local_recarrega_versao_desatualizada(self):
+        worker_a = ReadThroughSessionStore(self.store, metrics=Metrics())
+        worker_b = ReadThroughSessionStore(RedisSessionStore(url=self.servidor.url), metrics=Metrics())
+        worker_a.set("s", {"n": 1})
+        self.assertEqual(worker_b.get("s"), {"n": 1})
+
+        worker_b.set("s", {"n": 2})
+
+        self.assertEqual(worker_a.get("s"), {"n": 2})
+        with self.assertRaises(SessionConflict):
+            ReadThroughSessionStore(self.store, metrics=Metrics()).set("s", {"n": 3})
+
+
+class ReadThroughSessionStoreTests(TestCase):
+    """Cache local por processo à frente do armazenamento compartilhado."""
+
+    def test_leitura_dentro_da_validade_nao_consulta_o_banco(self):
+        store = ReadThroughSessionStore(DatabaseSessionStore(), validade=60.0, metrics=Metrics())
+        store.set("s", {"n": 1})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(store.get("s"), {"n": 1})
+
+    def test_sem_validade_confirma_so_a_versao(self):
+        registro = Metrics()
+        store = ReadThroughSessionStore(DatabaseSessionStore(), validade=0.0, nome="rt", metrics=registro)
+        store.set("s", {"n": 1})
+
+        with self.assertNumQueries(1):
+            self.assertEqual(store.get("s"), {"n": 1})
+        self.assertEqual(registro.snapshot()["contadores"]["rt.acertos"], 1)
+
+    def test_versao_desatualizada_e_recarregada(self):
+        backend = DatabaseSessionStore()
+        registro = Metrics()
+        store = ReadThroughSessionStore(backend, validade=0.0, nome="rt", metrics=registro)
+        store.set("s", {"n": 1})
+        backend.gravar("s", {"n": 2}, 1)
+
+        self.assertEqual(store.get("s"), {"n": 2})
+        self.assertEqual(registro.snapshot()["contadores"]["rt.desatualizadas"], 1)
+        store.set("s", {"n": 3})
+        self.assertEqual(backend.carregar("s"), ({"n": 3}, 3))
+
+    def test_sessao_expirada_no_banco_some_do_cache(self):
+        store = ReadThroughSessionStore(DatabaseSessionStore(), validade=0.0, metrics=Metrics())
+        store.set("s", {"n": 1})
+        SessaoAssistente.objects.filter(session_id="s").update(expira_em=timezone.now() - timedelta(seconds=1))
+
+        self.assertIsNone(store.get("s"))
+        self.assertEqual(store.stats()["sessoes_locais"], 0)
+
+
+class _ServidorHTTPFalso(ThreadingHTTPServer):
+    """
+    Servidor HTTP local para os testes das integrações.
+
+    Responde aos POSTs com os status de `respostas` (em ordem; depois deles,
+    200) após `atraso` segundos, e registra as requisições e as conexões de
+    cliente usadas.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, respostas=(), atraso=0.0, corpo=None):
+        self.respostas = list(respostas)
+        self.atraso = atraso
+        self.corpo = corpo or {"ok": True}
+        self.requisicoes = []
+        self.conexoes = set()
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), _RequisicaoHTTPFalsa)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d/" % self.server_address[1]
+
+    def fechar(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _RequisicaoHTTPFalsa(BaseHTTPRequestHandler):
+    """Atende uma requisição do servidor HTTP falso, mantendo a conexão aberta."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        corpo = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requisicoes.append(corpo)
+            self.server.conexoes.add(self.client_address)
+            status = self.server.respostas.pop(0) if self.server.respostas else 200
+        if self.server.atraso:
+            time.sleep(self.server.atraso)
+
+        resposta = json.dumps(self.server.corpo if status == 200 else {"erro": status}).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(resposta)))
+            self.end_headers()
+            self.wfile.write(resposta)
+        except (BrokenPipeError, ConnectionResetError):
+            # Cliente desistiu pelo prazo de leitura
+            self.close_connection = True
+
+
+class FallbackRulesTests(SimpleTestCase):
+    """Motor de regras do modo degradado (integrations/fallback_rules.py)."""
+
+    def _regras(self, saudacao="Olá do arquivo!"):
+        return {
+            "intencoes": [
+                {"intencao": "saudacao", "palavras": ["oi"], "resposta": saudacao},
+                {"intencao": "cancelamento", "palavras": ["cancelar"], "resposta": "Vamos cancelar."}
+            ],
+            "resposta_padrao": "Não entendi."
+        }
+
+    def _arquivo(self, conteudo, mtime_ns):
+        with open(self.caminho, "w", encoding="utf-8") as arquivo:
+            arquivo.write(conteudo if isinstance(conteudo, str) else json.dumps(conteudo))
+        os.utime(self.caminho, ns=(mtime_ns, mtime_ns))
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.caminho = os.path.join(diretorio.name, "regras.json")
+
+    def test_intencao_de_maior_prioridade_vence(self):
+        regras = FallbackRules(intervalo_recarga=None, metrics=Metrics())
+
+        self.assertEqual(regras.processar("oi, quero pagar")["intencao"], "saudacao")
+        self.assertEqual(regras.processar("quero cancelar o pagamento")["intencao"], "pagamento")
+        resultado = regras.processar("quero pagar o plano premium")
+        self.assertEqual((resultado["intencao"], resultado["entidades"]), ("info_plano", {"plano": "premium"}))
+
+    def test_resposta_especifica_da_entidade(self):
+        regras = FallbackRules(intervalo_recarga=None, metrics=Metrics())
+
+        pix = regras.processar("quero pagar com pix")
+        self.assertEqual(pix["entidades"], {"metodo_pagamento": "pix"})
+        self.assertEqual(pix["resposta"], REGRAS_PADRAO["intencoes"][2]["respostas"]["pix"])
+
+        # Sinônimo da tabela ("básico") e dados do catálogo na resposta por plano
+        basico = regras.processar("quanto custa o plano básico?")
+        self.assertEqual(basico["entidades"], {"plano": "basico"})
+        self.assertIn("R$29,99", basico["resposta"])
+
+        # Sem a entidade, a resposta geral da intenção
+        geral = regras.processar("quanto custa o plano?")
+        self.assertEqual(geral["entidades"], {})
+        self.assertIn("Básico (R$29,99) e Premium (R$59,90)", geral["resposta"])
+
+        self.assertEqual(regras.processar("blá blá")["resposta"], REGRAS_PADRAO["resposta_padrao"])
+
+    def test_recarrega_quando_o_arquivo_muda(self):
+        self._arquivo(self._regras(), 1_000_000_000)
+        regras = FallbackRules(self.caminho, intervalo_recarga=0.0, metrics=Metrics())
+        self.assertEqual(regras.processar("oi")["resposta"], "Olá do arquivo!")
+
+        self._arquivo(self._regras("Olá da versão nova!"), 2_000_000_000)
+
+        self.assertEqual(regras.processar("oi")["resposta"], "Olá da versão nova!")
+        self.assertEqual(regras.metrics.snapshot()["contadores"]["fallback.recargas"], 2)
+
+    def test_json_invalido_mantem_a_tabela_anterior(self):
+        self._arquivo(self._regras(), 1_000_000_000)
+        regras = FallbackRules(self.caminho, intervalo_recarga=0.0, metrics=Metrics())
+
+        self._arquivo('{"intencoes": [', 2_000_000_000)
+
+        self.assertEqual(regras.processar("oi")["resposta"], "Olá do arquivo!")
+        self.assertEqual(regras.processar("quero cancelar")["intencao"], "cancelamento")
+        self.assertEqual(regras.metrics.snapshot()["contadores"]["fallback.erros_recarga"], 1)
+
+    def test_arquivo_invalido_desde_o_inicio_usa_a_tabela_padrao(self):
+        self._arquivo("não é json", 1_000_000_000)
+
+        regras = FallbackRules(self.caminho, intervalo_recarga=None, metrics=Metrics())
+
+        self.assertEqual(regras.processar("quero pagar com pix")["entidades"], {"metodo_pagamento": "pix"})
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """Transições do disjuntor das integrações (integrations/circuit_breaker.py)."""
+
+    def setUp(self):
+        self.agora = 1000.0
+        relogio = mock.patch.object(modulo_circuito, "time", types.SimpleNamespace(monotonic=lambda: self.agora))
+        relogio.start()
+        self.addCleanup(relogio.stop)
+        self.disjuntor = CircuitBreaker(
+            min_chamadas=4, limiar_erros=0.5, limite_lentidao=1.0, tempo_aberto=15.0, sondas=1, metrics=Metrics()
+        )
+
+    def _abrir(self):
+        for _ in range(4):
+            self.disjuntor.registrar_falha()
+        self.assertEqual(self.disjuntor.estado, ABERTO)
+
+    def test_abre_ao_atingir_o_limiar_de_erros(self):
+        self.disjuntor.registrar_sucesso(0.1)
+        self.disjuntor.registrar_sucesso(0.1)
+        self.disjuntor.registrar_falha()
+        # Abaixo de min_chamadas as taxas não são avaliadas
+        self.assertEqual(self.disjuntor.estado, FECHADO)
+
+        self.disjuntor.registrar_falha()
+
+        self.assertEqual(self.disjuntor.estado, ABERTO)
+        self.assertFalse(self.disjuntor.permitir())
+        with self.assertRaises(CircuitOpenError):
+            self.disjuntor.chamar(lambda: "não chamada")
+
+    def test_chamadas_lentas_tambem_abrem(self):
+        for _ in range(4):
+            self.disjuntor.registrar_sucesso(2.0)
+
+        self.assertEqual(self.disjuntor.estado, ABERTO)
+
+    def test_semiaberto_apos_o_tempo_aberto_com_uma_unica_sonda(self):
+        self._abrir()
+        self.agora += 14.9
+        self.assertFalse(self.disjuntor.permitir())
+
+        self.agora += 0.1
+
+        self.assertEqual(self.disjuntor.estado, SEMI_ABERTO)
+        self.assertTrue(self.disjuntor.permitir())
+        # Enquanto a sonda não volta, as demais chamadas são recusadas
+        self.assertFalse(self.disjuntor.permitir())
+
+    def test_sonda_bem_sucedida_fecha(self):
+        self._abrir()
+        self.agora += 15.0
+        self.assertTrue(self.disjuntor.permitir())
+
+        self.disjuntor.registrar_sucesso(0.1)
+
+        self.assertEqual(self.disjuntor.estado, FECHADO)
+        # A janela recomeça: as falhas que abriram o disjuntor não contam mais
+        self.disjuntor.registrar_falha()
+        self.assertEqual(self.disjuntor.estado, FECHADO)
+        self.assertEqual(self.disjuntor.snapshot()["transicoes"], {
+            "fechado->aberto": 1, "aberto->semi_aberto": 1, "semi_aberto->fechado": 1
+        })
+
+    def test_sonda_com_falha_reabre_e_reinicia_o_tempo_aberto(self):
+        self._abrir()
+        self.agora += 15.0
+        self.assertTrue(self.disjuntor.permitir())
+
+        self.disjuntor.registrar_falha()
+
+        self.assertEqual(self.disjuntor.estado, ABERTO)
+        self.agora += 14.9
+        self.assertFalse(self.disjuntor.permitir())
+        self.agora += 0.1
+        self.assertTrue(self.disjuntor.permitir())
+
+    def test_sonda_lenta_reabre(self):
+        self._abrir()
+        self.agora += 15.0
+        self.assertTrue(self.disjuntor.permitir())
+
+        self.disjuntor.registrar_sucesso(2.0)
+
+        self.assertEqual(self.disjuntor.estado, ABERTO)
+
+
+class _ContadorPalavras:
+    """Contador de tokens determinístico: um token por palavra."""
+
+    def contar(self, texto):
+        return len(texto.split())
+
+
+class PromptBuilderTests(SimpleTestCase):
+    """Ajuste do histórico ao orçamento de tokens (integrations/prompt_builder.py)."""
+
+    # Cada item custa (4 + 3) + (4 + 11) = 22 tokens
+    HISTORICO = [
+        {
+            "texto_usuario": f"pergunta numero {numero}",
+            "texto_assistente": f"resposta numero {numero} com detalhes sobre todos os planos e pagamentos"
+        }
+        for numero in range(1, 6)
+    ]
+
+    def _builder(self, orcamento, **kwargs):
+        return PromptBuilder(
+            "contexto do sistema", "responda em json", orcamento_tokens=orcamento,
+            contador=_ContadorPalavras(), metrics=Metrics(), **kwargs
+        )
+
+    @staticmethod
+    def _custo(mensagens):
+        return sum(TOKENS_POR_MENSAGEM + len(m["content"].split()) for m in mensagens) + 3
+
+    @staticmethod
+    def _historico(prompt):
+        return [m["content"] for m in prompt.mensagens if m["role"] in ("user", "assistant")][:-1]
+
+    def test_historico_inteiro_quando_cabe(self):
+        prompt = self._builder(1000).montar("quanto custa", self.HISTORICO)
+
+        self.assertEqual((prompt.historico_incluido, prompt.historico_resumido), (5, 0))
+        self.assertEqual(len(self._historico(prompt)), 10)
+        self.assertEqual(prompt.tokens, self._custo(prompt.mensagens))
+
+    def test_mais_antigos_saem_primeiro(self):
+        builder = self._builder(1000)
+        base = builder.montar("quanto custa").tokens
+
+        # Espaço para dois itens e meio: o terceiro mais recente já não cabe, nem resumido
+        prompt = self._builder(base + 2 * 22 + 11, resumo_max_tokens=0).montar("quanto custa", self.HISTORICO)
+
+        self.assertEqual(self._historico(prompt), [
+            texto for item in self.HISTORICO[3:] for texto in (item["texto_usuario"], item["texto_assistente"])
+        ])
+        self.assertEqual((prompt.historico_incluido, prompt.historico_resumido), (2, 0))
+
+    def test_tokens_nunca_passam_do_orcamento(self):
+        base = self._builder(1000).montar("quanto custa").tokens
+        for orcamento in range(base, base + 5 * 22 + 40):
+            with self.subTest(orcamento=orcamento):
+                prompt = self._builder(orcamento).montar("quanto custa", self.HISTORICO)
+
+                self.assertLessEqual(prompt.tokens, orcamento)
+                self.assertEqual(prompt.tokens, self._custo(prompt.mensagens))
+                # O que entra inteiro é sempre o final do histórico
+                incluidos = self.HISTORICO[len(self.HISTORICO) - prompt.historico_incluido:]
+                self.assertEqual(
+                    self._historico(prompt),
+                    [texto for item in incluidos for texto in (item["texto_usuario"], item["texto_assistente"])]
+                )
+
+    def test_resumo_so_entra_quando_cabe(self):
+        base = self._builder(1000).montar("quanto custa").tokens
+        # Sobram 19 tokens, menos que um item inteiro: o resumo dos 3 mais antigos
+        # tem 6 palavras fixas e 3 por item
+        orcamento = base + 2 * 22 + TOKENS_POR_MENSAGEM + 6 + 9
+
+        com_resumo = self._builder(orcamento).montar("quanto custa", self.HISTORICO)
+        sem_espaco = self._builder(orcamento - 12).montar("quanto custa", self.HISTORICO)
+
+        resumo = com_resumo.mensagens[1]
+        self.assertEqual(resumo["role"], "system")
+        self.assertIn("pergunta numero 1; pergunta numero 2; pergunta numero 3", resumo["content"])
+        self.assertEqual((com_resumo.historico_incluido, com_resumo.historico_resumido), (2, 3))
+        self.assertLessEqual(com_resumo.tokens, orcamento)
+
+        # Sem espaço nem para um trecho, nenhuma mensagem de resumo é criada
+        self.assertEqual(sem_espaco.historico_resumido, 0)
+        self.assertEqual([m["role"] for m in sem_espaco.mensagens[:2]], ["system", "user"])
+
+
+class HTTPClientTests(SimpleTestCase):
+    """Cliente HTTP com pool keep-alive e repetições (integrations/http_client.py)."""
+
+    def _servidor(self, **kwargs):
+        servidor = _ServidorHTTPFalso(**kwargs)
+        self.addCleanup(servidor.fechar)
+        return servidor
+
+    def _cliente(self, **kwargs):
+        registro = Metrics()
+        parametros = dict(backoff_base=0.001, backoff_max=0.01, nome="http", metrics=registro)
+        parametros.update(kwargs)
+        cliente = HTTPClient(**parametros)
+        self.addCleanup(cliente.close)
+        return cliente, registro
+
+    def test_conexao_keep_alive_e_reaproveitada(self):
+        servidor = self._servidor()
+        cliente, _ = self._cliente()
+
+        for numero in range(5):
+            self.assertEqual(cliente.post_json(servidor.url, {"n": numero}).json(), {"ok": True})
+
+        self.assertEqual(len(servidor.requisicoes), 5)
+        self.assertEqual(len(servidor.conexoes), 1)
+
+    def test_status_transitorio_e_repetido(self):
+        servidor = self._servidor(respostas=[503, 502])
+        cliente, registro = self._cliente(max_retries=2)
+
+        response = cliente.post_json(servidor.url, {})
+
+        self.assertEqual(response.status_code, 200)
+        contadores = registro.snapshot()["contadores"]
+        self.assertEqual((contadores["http.tentativas"], contadores["http.retentativas"]), (3, 2))
+        # As conexões devolvidas ao pool antes de cada espera continuam em uso
+        self.assertEqual(len(servidor.conexoes), 1)
+
+    def test_tentativas_esgotadas_devolvem_a_ultima_resposta(self):
+        servidor = self._servidor(respostas=[503, 503, 503])
+        cliente, registro = self._cliente(max_retries=1)
+
+        response = cliente.post_json(servidor.url, {})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(servidor.requisicoes), 2)
+        self.assertEqual(registro.snapshot()["contadores"]["http.erros"], 1)
+
+    def test_status_definitivo_nao_e_repetido(self):
+        servidor = self._servidor(respostas=[400])
+        cliente, _ = self._cliente(max_retries=2)
+
+        self.assertEqual(cliente.post_json(servidor.url, {}).status_code, 400)
+        self.assertEqual(len(servidor.requisicoes), 1)
+
+    def test_prazo_de_leitura_e_repetido_e_depois_levantado(self):
+        servidor = self._servidor(atraso=0.3)
+        cliente, registro = self._cliente(read_timeout=0.05, max_retries=1)
+
+        with self.assertRaises(requests.Timeout):
+            cliente.post_json(servidor.url, {})
+
+        self.assertEqual(registro.snapshot()["contadores"]["http.tentativas"], 2)
+
+    def test_orcamento_de_repeticoes_interrompe_as_tentativas(self):
+        servidor = self._servidor(respostas=[503, 503, 503])
+        cliente, registro = self._cliente(max_retries=5, backoff_base=0.2, backoff_max=0.2, retry_budget=0.0)
+
+        self.assertEqual(cliente.post_json(servidor.url, {}).status_code, 503)
+        self.assertEqual(len(servidor.requisicoes), 1)
+        self.assertEqual(registro.snapshot()["contadores"]["http.orcamento_esgotado"], 1)
+
+    def test_conexao_recusada_levanta_erro_de_rede(self):
+        servidor = self._servidor()
+        url = servidor.url
+        servidor.fechar()
+        cliente, registro = self._cliente(max_retries=1)
+
+        with self.assertRaises(requests.ConnectionError):
+            cliente.post_json(url, {})
+
+        self.assertEqual(registro.snapshot()["contadores"]["http.tentativas"], 2)
+
+    def test_cliente_assincrono_repete_e_reaproveita_a_conexao(self):
+        servidor = self._servidor(respostas=[503])
+        registro = Metrics()
+
+        async def cenario():
+            cliente = AsyncHTTPClient(backoff_base=0.001, backoff_max=0.01, nome="http", metrics=registro)
+            try:
+                return [(await cliente.post_json(servidor.url, {"n": numero})).status_code for numero in range(3)]
+            finally:
+                await cliente.aclose()
+
+        self.assertEqual(asyncio.run(cenario()), [200, 200, 200])
+        self.assertEqual(len(servidor.requisicoes), 4)
+        self.assertEqual(len(servidor.conexoes), 1)
+        self.assertEqual(registro.snapshot()["contadores"]["http.retentativas"], 1)
+
+
+class LLMRouterTests(SimpleTestCase):
+    """Roteamento e hedging entre endpoints da API de LLM (integrations/llm_router.py)."""
+
+    def setUp(self):
+        self.registro = Metrics()
+        self.cliente = HTTPClient(max_retries=0, nome="http", metrics=self.registro)
+        self.addCleanup(self.cliente.close)
+
+    def _servidores(self, *atrasos):
+        servidores = [_ServidorHTTPFalso(atraso=atraso) for atraso in atrasos]
+        for servidor in servidores:
+            self.addCleanup(servidor.fechar)
+        return servidores
+
+    def _roteador(self, servidores, **kwargs):
+        roteador = LLMRouter([servidor.url for servidor in servidores], nome="roteador",
+                             metrics=self.registro, **kwargs)
+        self.addCleanup(lambda: roteador._executor and roteador._executor.shutdown(wait=False))
+        return roteador
+
+    def _servidor_do(self, roteador, servidores, endpoint):
+        return servidores[roteador.endpoints.index(endpoint)]
+
+    def test_endpoint_mais_rapido_recebe_as_requisicoes(self):
+        servidores = self._servidores(0.0, 0.05)
+        roteador = self._roteador(servidores)
+
+        for numero in range(10):
+            self.assertEqual(roteador.post_json(self.cliente, {"n": numero}).status_code, 200)
+
+        # Cada endpoint é experimentado uma vez; depois só o mais rápido é escolhido
+        self.assertEqual([len(servidor.requisicoes) for servidor in servidores], [9, 1])
+
+    def test_falhas_rapidas_nao_reduzem_a_latencia_e_suspendem(self):
+        servidores = self._servidores(0.0, 0.05)
+        servidores[0].respostas = [503] * 10
+        roteador = self._roteador(servidores, max_falhas=3)
+
+        for _ in range(6):
+            roteador.post_json(self.cliente, {})
+
+        falho, saudavel = roteador.endpoints
+        self.assertIsNone(falho.ewma)
+        self.assertEqual(len(servidores[0].requisicoes), 3)
+        self.assertGreater(falho.suspenso_ate, time.monotonic())
+        self.assertIsNotNone(saudavel.ewma)
+        self.assertEqual(self.registro.snapshot()["contadores"]["roteador.suspensoes"], 1)
+
+    def _aquecer(self, roteador):
+        """Acumula amostras suficientes para o atraso de hedging."""
+        for _ in range(RECALCULO_ATRASO):
+            roteador.post_json(self.cliente, {})
+        self.assertIsNotNone(roteador.atraso_hedge())
+
+    def test_hedging_responde_pelo_segundo_endpoint(self):
+        servidores = self._servidores(0.0, 0.0)
+        roteador = self._roteador(servidores, hedge=True, hedge_min_amostras=1, hedge_atraso_minimo=0.02)
+        self._aquecer(roteador)
+
+        lento = self._servidor_do(roteador, servidores, roteador.escolher())
+        lento.atraso = 0.5
+        inicio = time.monotonic()
+        response = roteador.post_json(self.cliente, {"hedge": True})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(time.monotonic() - inicio, 0.4)
+        self.assertEqual(sum(servidor.requisicoes.count({"hedge": True}) for servidor in servidores), 2)
+        contadores = self.registro.snapshot()["contadores"]
+        self.assertEqual((contadores["roteador.hedge.disparos"], contadores["roteador.hedge.vitorias"]), (1, 1))
+
+    def test_hedging_assincrono_cancela_a_perdedora_sem_mudar_a_latencia(self):
+        servidores = self._servidores(0.0, 0.0)
+        roteador = self._roteador(servidores, hedge=True, hedge_min_amostras=1, hedge_atraso_minimo=0.02)
+        self._aquecer(roteador)
+
+        primario = roteador.escolher()
+        self._servidor_do(roteador, servidores, primario).atraso = 0.5
+        ewma = primario.ewma
+
+        async def cenario():
+            cliente = AsyncHTTPClient(max_retries=0, nome="http", metrics=self.registro)
+            try:
+                return await roteador.apost_json(cliente, {})
+            finally:
+                await cliente.aclose()
+
+        self.assertEqual(asyncio.run(cenario()).status_code, 200)
+        # A perdedora cancelada não entra na EWMA nem conta como falha
+        self.assertEqual(primario.ewma, ewma)
+        self.assertEqual((primario.em_andamento, primario.falhas_consecutivas), (0, 0))
+        self.assertEqual(self.registro.snapshot()["contadores"]["roteador.hedge.vitorias"], 1)
+
+
+class ShadowEvaluatorTests(TestCase):
+    """Motor registrado pela avaliação em modo sombra (services/shadow_evaluator.py)."""
+
+    ANALISE = {"intencao": "info_plano", "entidades": {"plano": "Plano Premium"}, "resposta": "O premium custa..."}
+
+    def _processador(self, respostas=()):
+        servidor = _ServidorHTTPFalso(
+            respostas=respostas, corpo={"choices": [{"message": {"content": json.dumps(self.ANALISE)}}]}
+        )
+        self.addCleanup(servidor.fechar)
+        registro = Metrics()
+        cliente = HTTPClient(max_retries=0, nome="http", metrics=registro)
+        self.addCleanup(cliente.close)
+        return AdvancedNLPProcessor(
+            api_key="chave-de-teste", model="modelo-teste", http_client=cliente,
+            roteador=LLMRouter([servidor.url], metrics=registro),
+            circuit_breaker=CircuitBreaker(metrics=registro),
+            response_cache=SemanticResponseCache(metrics=registro),
+            single_flight=SingleFlight(metrics=registro)
+        )
+
+    def _avaliar(self, processador):
+        avaliador = ShadowEvaluator(processador=processador, metrics=Metrics())
+        avaliador._avaliar("quanto custa o plano premium", {}, "info_plano", "premium", "lexica", 0.001, "s1")
+        return AvaliacaoShadow.objects.get(), avaliador.metrics.snapshot()["contadores"]
+
+    def test_resposta_da_api_registra_o_modelo(self):
+        avaliacao, _ = self._avaliar(self._processador())
+
+        self.assertEqual(avaliacao.motor, "llm:modelo-teste")
+        self.assertTrue(avaliacao.concordou)
+        self.assertEqual(avaliacao.plano_shadow, "premium")
+        self.assertEqual(avaliacao.erro, "")
+
+    def test_resposta_do_fallback_nao_conta_como_avaliacao_do_llm(self):
+        # A API falha e o processador responde pelas regras locais
+        avaliacao, contadores = self._avaliar(self._processador(respostas=[500]))
+
+        self.assertEqual(avaliacao.motor, MOTOR_FALLBACK)
+        self.assertFalse(avaliacao.concordou)
+        self.assertNotEqual(avaliacao.erro, "")
+        self.assertIsNone(avaliacao.latencia_shadow_ms)
+        self.assertEqual(contadores["shadow.fallback"], 1)
+
+
+class TextoLivreTests(SimpleTestCase):
+    """Geração de texto para mensagens sem intenção mapeada (DialogManager)."""
+
+    def setUp(self):
+        self.servidor = None
+        self.gerenciador = DialogManager(session_store=InMemorySessionStore(metrics=Metrics()))
+        self.local = mock.patch.object(
+            self.gerenciador.nlp_processor, "gerar_resposta_texto", return_value="texto local"
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _usar_api(self, respostas=(), circuito=None):
+        self.servidor = _ServidorHTTPFalso(
+            respostas=respostas, corpo={"choices": [{"message": {"content": "texto do LLM"}}]}
+        )
+        self.addCleanup(self.servidor.fechar)
+        registro = Metrics()
+        self.gerenciador.llm_processor = AdvancedNLPProcessor(
+            api_key="chave-de-teste", model="modelo-teste",
+            roteador=LLMRouter([self.servidor.url], metrics=registro),
+            circuit_breaker=circuito or CircuitBreaker(metrics=registro)
+        )
+
+    def _gerar_async(self):
+        async def cenario():
+            cliente = AsyncHTTPClient(max_retries=0, nome="http", metrics=Metrics())
+            self.gerenciador.llm_processor._async_http_client = cliente
+            try:
+                return await self.gerenciador.agerar_texto_livre({"nome": "Ana"}, "me conta uma curiosidade")
+            finally:
+                await cliente.aclose()
+
+        return asyncio.run(cenario())
+
+    def test_endpoint_sincrono_usa_o_gerador_local(self):
+        self._usar_api()
+
+        self.assertEqual(self.gerenciador.gerar_texto_livre({}, "me conta uma curiosidade"), "texto local")
+        self.assertEqual(self.servidor.requisicoes, [])
+
+    def test_endpoint_assincrono_usa_a_api(self):
+        self._usar_api()
+
+        self.assertEqual(self._gerar_async(), "texto do LLM")
+        self.local.assert_not_called()
+
+    def test_falha_da_api_cai_no_gerador_local(self):
+        self._usar_api(respostas=[500])
+
+        # Nunca devolve o texto do usuário ecoado na mensagem de erro
+        self.assertEqual(self._gerar_async(), "texto local")
+        self.assertEqual(len(self.servidor.requisicoes), 1)
+
+    def test_disjuntor_aberto_cai_no_gerador_local_sem_chamar_a_api(self):
+        circuito = CircuitBreaker(min_chamadas=1, metrics=Metrics())
+        circuito.registrar_falha()
+        self._usar_api(circuito=circuito)
+
+        self.assertEqual(self._gerar_async(), "texto local")
+        self.assertEqual(self.servidor.requisicoes, [])
+
+    def test_sem_api_configurada_usa_o_gerador_local(self):
+        self.gerenciador.llm_processor.api_key = None
+
+        self.assertEqual(self._gerar_async(), "texto local")
+
+
+class ProcessamentoAssincronoTests(SimpleTestCase):
+    """Threads usadas por `DialogManager.aprocessar_mensagem`."""
+
+    def setUp(self):
+        self.threads = {"classificar": set(), "sessao": set()}
+        self.gerenciador = DialogManager(session_store=InMemorySessionStore(metrics=Metrics()))
+        self.gerenciador.llm_processor.api_key = None
+        self._registrar(self.gerenciador.nlp_processor, "classificar", "classificar")
+        self._registrar(self.gerenciador.session_store, "get", "sessao")
+        self._registrar(self.gerenciador.session_store, "set", "sessao")
+
+    def _registrar(self, objeto, metodo, grupo):
+        original = getattr(objeto, metodo)
+
+        def registrado(*args, **kwargs):
+            self.threads[grupo].add(threading.get_ident())
+            return original(*args, **kwargs)
+
+        patcher = mock.patch.object(objeto, metodo, side_effect=registrado)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _enviar(self, *mensagens):
+        async def cenario():
+            return [await self.gerenciador.aprocessar_mensagem(mensagem, "s", {"nome": "Ana"}) for mensagem in mensagens]
+
+        return asyncio.run(cenario())
+
+    def test_sessao_na_thread_compartilhada_e_classificacao_fora_dela(self):
+        respostas = self._enviar("olá", "quanto custa o plano premium?")
+
+        self.assertEqual([r["intencao"] for r in respostas], ["saudacao", "info_plano"])
+        # thread_sensitive=True: todo acesso à sessão passa pela mesma thread
+        self.assertEqual(len(self.threads["sessao"]), 1)
+        self.assertTrue(self.threads["classificar"])
+        self.assertTrue(self.threads["classificar"].isdisjoint(self.threads["sessao"]))
+        # A classificação calculada fora do turno não é refeita dentro dele
+        self.assertEqual(self.gerenciador.nlp_processor.classificar.call_count, 2)
+
+    def test_dados_do_cartao_nao_sao_classificados(self):
+        contexto = self.gerenciador.get_session_context("s", {"nome": "Ana"})
+        contexto["plano_atual"] = "premium"
+        contexto["etapa_cartao"] = 1
+        self.gerenciador.salvar_contexto("s", contexto)
+
+        resposta, = self._enviar("4111 1111 1111 1111")
+
+        self.assertEqual(resposta["camada"], "slot")
+        self.gerenciador.nlp_processor.classificar.assert_not_called()
+
+
+class EnvelopeParserTests(SimpleTestCase):
+    """Interpretação incremental do envelope JSON do LLM (integrations/streaming.py)."""
+
+    ENVELOPE = {
+        "intencao": "info_plano",
+        "entidades": {"plano": "premium", "extras": [{"nome": "{suporte}", "valor": [1, 2.5]}]},
+        "resposta": "Olá, \"Ana\"!\nO plano custa R$59,90 \U0001F680 – até já\\",
+        "acoes_sugeridas": {"mostrar": ["premium", "basico"]}
+    }
+
+    def _eventos(self, pedacos):
+        parser = EnvelopeParser()
+        eventos = [evento for pedaco in pedacos for evento in parser.feed(pedaco)]
+        resposta = "".join(evento[1] for evento in eventos if evento[0] == "resposta")
+        campos = {evento[1]: evento[2] for evento in eventos if evento[0] == "campo"}
+        return parser, resposta, campos
+
+    def _conferir(self, pedacos):
+        parser, resposta, campos = self._eventos(pedacos)
+
+        self.assertTrue(parser.concluido)
+        self.assertEqual(resposta, self.ENVELOPE["resposta"])
+        self.assertEqual(campos, {
+            nome: self.ENVELOPE[nome] for nome in ("intencao", "entidades", "acoes_sugeridas")
+        })
+
+    def test_envelope_em_um_pedaco(self):
+        # ensure_ascii codifica o emoji como o par substituto \ud83d\ude80
+        self._conferir(["```json\n" + json.dumps(self.ENVELOPE) + "\n```"])
+
+    def test_qualquer_ponto_de_corte_entre_dois_pedacos(self):
+        texto = json.dumps(self.ENVELOPE)
+        for corte in range(1, len(texto)):
+            with self.subTest(corte=corte, em=texto[corte - 3:corte + 3]):
+                self._conferir([texto[:corte], texto[corte:]])
+
+    def test_um_caractere_por_pedaco(self):
+        self._conferir(list(json.dumps(self.ENVELOPE)))
+        self._conferir(list(json.dumps(self.ENVELOPE, ensure_ascii=False)))
+
+    def test_campos_sao_entregues_assim_que_concluidos(self):
+        parser = EnvelopeParser()
+
+        self.assertEqual(parser.feed('{"intencao": "pagam'), [])
+        self.assertEqual(parser.feed('ento", "resposta": "Cer'), [
+            ("resposta", "Cer"), ("campo", "intencao", "pagamento")
+        ])
+        self.assertEqual(parser.feed('to", "entidades": {"plano": {"id'), [("resposta", "to")])
+        self.assertEqual(parser.feed('": 2}}, "acoes'), [("campo", "entidades", {"plano": {"id": 2}})])
+        self.assertFalse(parser.concluido)
+        self.assertEqual(parser.feed('_sugeridas": null}'), [("campo", "acoes_sugeridas", None)])
+        self.assertTrue(parser.concluido)
+
+
+class RespostaEmFluxoTests(TestCase):
+    """Endpoint SSE com a análise da API de LLM em fluxo (api/chat_api.py)."""
+
+    URL = "/api/assistente/resposta-stream/"
+
+    def setUp(self):
+        from .api import chat_api
+
+        self.llm = chat_api.dialog_manager.llm_processor
+        envelope = json.dumps({
+            "intencao": "duvida", "resposta": "Posso ajudar!", "acoes_sugeridas": {"mostrar_planos": True}
+        })
+        patchers = [
+            mock.patch.object(self.llm, "api_key", "chave-de-teste"),
+            mock.patch.object(self.llm, "use_fallback", False),
+            mock.patch.object(self.llm, "_fluxo_da_api", return_value=iter([envelope[:25], envelope[25:]])),
+            mock.patch.object(chat_api.dialog_manager.shadow_evaluator, "submeter"),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _eventos(self, mensagem):
+        response = self.client.post(self.URL, json.dumps({"mensagem": mensagem}), content_type="application/json")
+        eventos = []
+        for bloco in b"".join(response.streaming_content).decode("utf-8").strip().split("\n\n"):
+            nome, dados = bloco.split("\n")
+            eventos.append((nome[len("event: "):], json.loads(dados[len("data: "):])))
+        return eventos
+
+    def test_campos_do_envelope_viram_eventos(self):
+        eventos = self._eventos("vocês atendem aos domingos")
+
+        nomes = [nome for nome, _ in eventos]
+        self.assertEqual(nomes[0], "inicio")
+        self.assertEqual(nomes[-1], "fim")
+        self.assertIn({"nome": "acoes_sugeridas", "valor": {"mostrar_planos": True}},
+                      [dados for nome, dados in eventos if nome == "campo"])
+        self.assertEqual("".join(dados["texto"] for nome, dados in eventos if nome == "trecho"), "Posso ajudar!")
+        self.assertEqual(eventos[-1][1], {"resposta": "Posso ajudar!"})
+
+    def test_intencao_mapeada_nao_chama_a_api(self):
+        eventos = self._eventos("olá")
+
+        self.assertNotIn("campo", [nome for nome, _ in eventos])
+        self.llm._fluxo_da_api.assert_not_called()
+
+
+class _ClassificadorFalso:
+    """Classificador treinado que sempre escolhe `pagamento`."""
+
+    def prever(self, texto):
+        return "pagamento", 0.95
+
+
+class ClassificadorNLPTests(SimpleTestCase):
+    """Classificador de intenções do NLPProcessor: arquivo e cache de análises."""
+
+    TEXTO = "quero pagar o plano premium, qual o preço?"
+
+    def setUp(self):
+        self.liberar = threading.Event()
+        self.addCleanup(self.liberar.set)
+        self.registro = ModelRegistry()
+        self.registro.register("spacy", lambda: None)
+        self.registro.register("stopwords", lambda: None)
+        self.registro.register("classificador", self._carregar)
+
+    def _carregar(self):
+        self.liberar.wait(5)
+        return _ClassificadorFalso()
+
+    def _processador(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, "classificador_intencoes.npz")
+            open(caminho, "wb").close()
+            with override_settings(NLP_CLASSIFICADOR_PATH=caminho):
+                return NLPProcessor(registry=self.registro, inference_client=False)
+
+    def _aguardar_classificador(self):
+        self.registro.load_async("classificador")
+        self.liberar.set()
+        limite = time.monotonic() + 5
+        while not self.registro.is_ready("classificador") and time.monotonic() < limite:
+            time.sleep(0.01)
+
+    def test_arquivo_do_classificador_e_verificado_uma_vez(self):
+        nlp = self._processador()
+        self._aguardar_classificador()
+
+        with mock.patch("os.path.exists") as exists:
+            for _ in range(3):
+                nlp.limpar_cache()
+                self.assertEqual(nlp.classificar(self.TEXTO)["intencao"], "pagamento")
+        exists.assert_not_called()
+
+    def test_carregamento_do_classificador_descarta_o_cache(self):
+        nlp = self._processador()
+
+        # Enquanto o classificador carrega, a camada léxica decide e o resultado fica em cache
+        analise = nlp.classificar(self.TEXTO)
+        self.assertEqual((analise["intencao"], analise["camada"]), ("info_plano", "lexica"))
+
+        self._aguardar_classificador()
+        analise = nlp.classificar(self.TEXTO)
+        self.assertEqual((analise["intencao"], analise["camada"]), ("pagamento", "classificador"))
+
+    def test_sem_arquivo_o_classificador_nao_e_carregado(self):
+        with override_settings(NLP_CLASSIFICADOR_PATH="/caminho/inexistente.npz"):
+            nlp = NLPProcessor(registry=self.registro, inference_client=False)
+
+        self.assertIsNone(nlp.classificador)
+        self.assertEqual(self.registro.status()["classificador"], "pendente")
+
+
+class _StreamerFalso:
+    """TextIteratorStreamer mínimo: entrega os trechos postos por `generate`."""
+
+    FIM = object()
+
+    def __init__(self, tokenizer, skip_prompt=False, skip_special_tokens=False, timeout=None):
+        self.fila = queue.Queue()
+        self.timeout = timeout
+
+    def __iter__(self):
+        while True:
+            trecho = self.fila.get(timeout=self.timeout)
+            if trecho is self.FIM:
+                return
+            yield trecho
+
+
+class _GeradorFalso:
+    """Pipeline de geração que produz um token a cada poucos milissegundos até ser parado."""
+
+    def __init__(self, atraso_inicial=0.0):
+        self.atraso_inicial = atraso_inicial
+        self.tokens = 0
+        self.terminou = threading.Event()
+        self.tokenizer = mock.Mock(return_value={}, pad_token_id=0)
+        self.model = types.SimpleNamespace(generate=self._generate)
+
+    def _generate(self, streamer, stopping_criteria, **kwargs):
+        time.sleep(self.atraso_inicial)
+        try:
+            while self.tokens < 1000 and not any(criterio(None, None) for criterio in stopping_criteria):
+                self.tokens += 1
+                streamer.fila.put(f"t{self.tokens} ")
+                time.sleep(0.005)
+            streamer.fila.put(_StreamerFalso.FIM)
+        finally:
+            self.terminou.set()
+
+
+class GeracaoEmFluxoTests(SimpleTestCase):
+    """Interrupção da geração local em fluxo (NLPProcessor.gerar_resposta_texto_stream)."""
+
+    def setUp(self):
+        transformers = types.ModuleType("transformers")
+        transformers.TextIteratorStreamer = _StreamerFalso
+        transformers.StoppingCriteria = object
+        transformers.StoppingCriteriaList = list
+        patcher = mock.patch.dict(sys.modules, {"transformers": transformers})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.processador = NLPProcessor(inference_client=False)
+        self.addCleanup(self.processador.generation_pool._executor.shutdown, wait=False)
+
+    def _fluxo(self, gerador):
+        patcher = mock.patch.object(NLPProcessor, "generator", new_callable=mock.PropertyMock, return_value=gerador)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return self.processador.gerar_resposta_texto_stream({"nome": "Ana"}, "me conta uma história")
+
+    def test_cliente_desconectado_interrompe_a_geracao(self):
+        gerador = _GeradorFalso()
+        fluxo = self._fluxo(gerador)
+
+        self.assertEqual(next(fluxo), "t1 ")
+        # O Django fecha o gerador da resposta quando o cliente desconecta
+        fluxo.close()
+
+        self.assertTrue(gerador.terminou.wait(2))
+        self.assertLess(gerador.tokens, 1000)
+
+    def test_prazo_esgotado_interrompe_a_geracao(self):
+        self.processador.generation_pool.timeout = 0.05
+        gerador = _GeradorFalso(atraso_inicial=0.2)
+
+        self.assertEqual(list(self._fluxo(gerador)), [])
+
+        self.assertTrue(gerador.terminou.wait(2))
+        self.assertEqual(gerador.tokens, 0)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    """Agrupamento de entradas concorrentes em lotes (utils/generation.py)."""
+
+    def setUp(self):
+        self.lotes = []
+        self.liberar = threading.Event()
+        self.liberar.set()
+        self.addCleanup(self.liberar.set)
+
+    def _batcher(self, processar=None, **kwargs):
+        return MicroBatcher(processar or self._dobrar, nome="teste.lote", metrics=Metrics(), **kwargs)
+
+    def _dobrar(self, entradas):
+        self.liberar.wait(2)
+        self.lotes.append(list(entradas))
+        return [entrada * 2 for entrada in entradas]
+
+    def test_agrupa_ate_max_itens(self):
+        batcher = self._batcher(max_itens=3, max_espera=0.5)
+
+        futures = [batcher.submit(numero) for numero in range(5)]
+
+        self.assertEqual([future.result(timeout=2) for future in futures], [0, 2, 4, 6, 8])
+        self.assertEqual(self.lotes, [[0, 1, 2], [3, 4]])
+
+    def test_lote_incompleto_sai_apos_max_espera(self):
+        batcher = self._batcher(max_itens=8, max_espera=0.05)
+
+        inicio = time.monotonic()
+        self.assertEqual(batcher.submit(21).result(timeout=2), 42)
+
+        self.assertLess(time.monotonic() - inicio, 0.5)
+        self.assertEqual(self.lotes, [[21]])
+
+    def test_entradas_canceladas_ficam_fora_do_lote(self):
+        batcher = self._batcher(max_itens=1, max_espera=0.0)
+        self.liberar.clear()
+        primeira = batcher.submit(1)
+        # Enquanto o primeiro lote não termina, as demais esperam na fila
+        desistente, segunda = batcher.submit(2), batcher.submit(3)
+
+        self.assertTrue(desistente.cancel())
+        self.liberar.set()
+
+        self.assertEqual((primeira.result(timeout=2), segunda.result(timeout=2)), (2, 6))
+        self.assertEqual(self.lotes, [[1], [3]])
+
+    def test_erro_do_lote_chega_a_todas_as_entradas(self):
+        def falhar(entradas):
+            self.liberar.wait(2)
+            raise OSError("modelo indisponível")
+
+        batcher = self._batcher(falhar, max_itens=3, max_espera=0.5)
+        futures = [batcher.submit(numero) for numero in range(3)]
+
+        for future in futures:
+            with self.assertRaisesMessage(OSError, "modelo indisponível"):
+                future.result(timeout=2)
+        self.assertEqual(batcher.metrics.snapshot()["contadores"]["teste.lote.erros"], 1)
+
+    def test_resultados_faltando_nao_deixam_entradas_pendentes(self):
+        batcher = self._batcher(lambda entradas: entradas[:1], max_itens=3, max_espera=0.5)
+
+        futures = [batcher.submit(numero) for numero in range(3)]
+
+        self.assertEqual(futures[0].result(timeout=2), 0)
+        for future in futures[1:]:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=2)
+
+
+class ProtocoloInferenciaTests(SimpleTestCase):
+    """Mensagens com prefixo de tamanho do servidor de inferência (utils/inference_server.py)."""
+
+    def setUp(self):
+        self.a, self.b = socket.socketpair()
+        self.addCleanup(self.a.close)
+        self.addCleanup(self.b.close)
+
+    def test_ida_e_volta_com_leituras_parciais(self):
+        mensagens = [{"id": 1, "op": "gerar", "dados": {"prompt": "Olá, ação — 🚀"}}, {"id": 2}, {}]
+        for mensagem in mensagens:
+            enviar_mensagem(self.a, mensagem)
+
+        # Leituras de no máximo 3 bytes cortam o cabeçalho e os caracteres multibyte
+        ler = lambda tamanho: self.b.recv(min(tamanho, 3))
+        self.assertEqual([receber_mensagem(ler) for _ in mensagens], mensagens)
+
+    def test_conexao_encerrada(self):
+        enviar_mensagem(self.a, {"id": 1})
+        self.a.close()
+
+        self.assertEqual(receber_mensagem(self.b.recv), {"id": 1})
+        self.assertIsNone(receber_mensagem(self.b.recv))
+
+    def test_mensagem_acima_do_tamanho_maximo(self):
+        self.a.sendall(struct.pack(">I", TAMANHO_MAXIMO + 1))
+
+        with self.assertRaises(ValueError):
+            receber_mensagem(self.b.recv)
+
+
+class ServidorInferenciaTests(SimpleTestCase):
+    """Servidor de inferência e seu cliente sobre um socket Unix de verdade."""
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.caminho = os.path.join(diretorio.name, "nlp.sock")
+        self.liberar = threading.Event()
+        self.addCleanup(self.liberar.set)
+
+    def _iniciar_servidor(self, timeout=2.0):
+        nlp = types.SimpleNamespace(
+            extrair_palavras_chave_lote=lambda textos: [("premium", "preco", {"plano", "custo"}) for _ in textos],
+            generation_batcher=MicroBatcher(self._gerar_lote, nome="teste.geracao", metrics=Metrics()),
+            registry=ModelRegistry()
+        )
+        servidor = InferenceServer(self.caminho, nlp_processor=nlp, timeout=timeout)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        self.addCleanup(servidor.shutdown)
+        prazo = time.monotonic() + 2
+        while not os.path.exists(self.caminho) and time.monotonic() < prazo:
+            time.sleep(0.01)
+        return servidor
+
+    def _gerar_lote(self, prompts):
+        if "demorado" in prompts:
+            self.liberar.wait(2)
+        return [prompt.upper() for prompt in prompts]
+
+    def test_operacoes_pelo_cliente(self):
+        self._iniciar_servidor()
+        cliente = InferenceClient(self.caminho, timeout=2.0)
+        self.addCleanup(cliente._fechar)
+
+        self.assertEqual(cliente.gerar("olá"), "OLÁ")
+        self.assertEqual(cliente.extrair_palavras_chave("quanto custa o premium"), ("premium", "preco", {"plano", "custo"}))
+        self.assertEqual(cliente.status(), {})
+
+    def test_prazo_esgotado_no_servidor_vira_erro_no_cliente(self):
+        self._iniciar_servidor(timeout=0.1)
+        cliente = InferenceClient(self.caminho, timeout=2.0)
+        self.addCleanup(cliente._fechar)
+
+        inicio = time.monotonic()
+        with self.assertRaisesMessage(InferenceUnavailable, "Prazo"):
+            cliente.gerar("demorado")
+        self.assertLess(time.monotonic() - inicio, 1.0)
+
+        # A conexão continua utilizável depois do erro
+        self.liberar.set()
+        self.assertEqual(cliente.gerar("olá"), "OLÁ")
+
+    def test_servidor_fora_do_ar(self):
+        cliente = InferenceClient(self.caminho, timeout=0.5)
+
+        with self.assertRaises(InferenceUnavailable):
+            cliente.gerar("olá")
+
+        processador = NLPProcessor(inference_client=cliente)
+        self.assertEqual(processador.gerar_resposta_texto({"nome": "Ana"}, "olá"), MENSAGEM_AQUECIMENTO)
+
+
+class ModelRegistryTests(SimpleTestCase):
+    """Carregamento de modelos sob demanda (utils/model_registry.py)."""
+
+    def setUp(self):
+        self.tentativas = 0
+        self.registro = ModelRegistry(backoff_base=0.1, backoff_max=0.2)
+        self.registro.register("modelo", self._carregar)
+
+    def _carregar(self):
+        self.tentativas += 1
+        if self.tentativas < 3:
+            raise OSError("modelo ainda não instalado")
+        return "modelo pronto"
+
+    def _aguardar(self, estado):
+        limite = time.monotonic() + 5
+        while self.registro.status()["modelo"] != estado and time.monotonic() < limite:
+            time.sleep(0.005)
+        self.assertEqual(self.registro.status()["modelo"], estado)
+
+    def test_falha_em_segundo_plano_e_tentada_de_novo_apos_a_espera(self):
+        self.assertIsNone(self.registro.get("modelo", block=False))
+        self._aguardar("erro")
+
+        # Dentro da espera, nenhuma nova tentativa
+        self.assertIsNone(self.registro.get("modelo", block=False))
+        self.assertEqual(self.tentativas, 1)
+
+        for tentativas in (2, 3):
+            time.sleep(0.2)
+            self.registro.get("modelo", block=False)
+            self._aguardar("pronto" if tentativas == 3 else "erro")
+            self.assertEqual(self.tentativas, tentativas)
+
+        self.assertEqual(self.registro.get("modelo", block=False), "modelo pronto")
+
+    def test_get_bloqueante_tenta_sem_esperar(self):
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                self.registro.get("modelo")
+
+        self.assertEqual(self.registro.get("modelo"), "modelo pronto")
+        self.assertEqual(self.registro.status()["modelo"], "pronto")
+
+
+class MetricasEndpointTests(TestCase):
+    """Acesso ao endpoint de métricas (api/chat_api.py)."""
+
+    URL = "/api/metricas/"
+
+    def _usuario(self, **kwargs):
+        return get_user_model().objects.create_user("operador", "operador@example.com", "senha-teste", **kwargs)
+
+    def test_anonimo_nao_ve_as_metricas(self):
+        response = self.client.get(self.URL)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn("contadores", response.json())
+
+    def test_usuario_comum_nao_ve_as_metricas(self):
+        self.client.force_login(self._usuario())
+
+        self.assertEqual(self.client.get(self.URL).status_code, 403)
+
+    def test_equipe_ve_as_metricas(self):
+        self.client.force_login(self._usuario(is_staff=True))
+
+        response = self.client.get(self.URL)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("contadores", response.json())
+
+    @override_settings(METRICAS_PUBLICAS=True)
+    def test_metricas_publicas_dispensam_autenticacao(self):
+        self.assertEqual(self.client.get(self.URL).status_code, 200)
+
+
+class SemanticResponseCacheTests(SimpleTestCase):
+    """Cache de respostas da API de LLM (integrations/response_cache.py)."""
+
+    def setUp(self):
+        self.versao = "v1"
+        self.calculos_versao = 0
+        self.cache = SemanticResponseCache(versao=self._versao, intervalo_versao=0.0, metrics=Metrics())
+
+    def _versao(self):
+        self.calculos_versao += 1
+        return self.versao
+
+    def _contadores(self):
+        return self.cache.metrics.snapshot()["contadores"]
+
+    def test_acerto_exato_ignora_pontuacao_e_acentos(self):
+        self.cache.set("Quanto custa o plano Premium?", None, {"intencao": "info_plano"})
+
+        self.assertEqual(self.cache.get("quanto custa o plano premium"), {"intencao": "info_plano"})
+        self.assertEqual(self._contadores()["cache.acertos_exatos"], 1)
+
+    def test_acerto_por_quase_duplicata(self):
+        self.cache.set("qual o preço do plano premium", None, {"intencao": "info_plano"})
+
+        self.assertEqual(self.cache.get("qual é o preço do plano premium"), {"intencao": "info_plano"})
+        self.assertEqual(self._contadores()["cache.acertos_similares"], 1)
+
+    def test_grupos_diferentes_nao_se_misturam(self):
+        self.cache.set("quero pagar o plano premium com pix", None, {"metodo": "pix"})
+
+        # Outro termo distintivo, outro plano ou outro contexto
+        self.assertIsNone(self.cache.get("quero pagar o plano premium com boleto"))
+        self.assertIsNone(self.cache.get("quero pagar o plano basico com pix"))
+        self.assertIsNone(self.cache.get("quero pagar o plano premium com pix", {"plano_atual": "basico"}))
+        self.assertEqual(self._contadores()["cache.faltas"], 3)
+
+    def test_copia_devolvida_nao_altera_o_cache(self):
+        self.cache.set("oi", None, {"entidades": {}})
+        self.cache.get("oi")["entidades"]["plano"] = "premium"
+
+        self.assertEqual(self.cache.get("oi"), {"entidades": {}})
+
+    def test_mudanca_do_catalogo_esvazia_o_cache(self):
+        self.cache.set("quanto custa o plano premium", None, {"intencao": "info_plano"})
+        self.versao = "v2"
+
+        self.assertIsNone(self.cache.get("quanto custa o plano premium"))
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self._contadores()["cache.invalidacoes"], 1)
+
+    def test_versao_e_verificada_no_maximo_a_cada_intervalo(self):
+        self.cache.intervalo_versao = 60.0
+        self.cache.set("quanto custa o plano premium", None, {"intencao": "info_plano"})
+        self.versao = "v2"
+        for _ in range(10):
+            self.assertIsNotNone(self.cache.get("quanto custa o plano premium"))
+
+        self.assertEqual(self.calculos_versao, 1)
+
+        self.cache._proxima_verificacao = 0.0
+        self.assertIsNone(self.cache.get("quanto custa o plano premium"))
+
+    def test_negacao_nao_reaproveita_a_resposta_afirmativa(self):
+        self.cache.set("quero assinar o plano premium agora", None, {"intencao": "pagamento"})
+
+        self.assertIsNone(self.cache.get("não quero assinar o plano premium agora"))
+        self.assertIsNone(self.cache.get("nunca quero assinar o plano premium agora"))
+        self.assertEqual(self.cache.get("eu quero assinar o plano premium agora"), {"intencao": "pagamento"})
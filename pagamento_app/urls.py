@@ -13,5 +13,8 @@ urlpatterns = [
     
     # APIs
     path('api/assistente/resposta/', views.chatbot_response, name='chatbot_response'),
+    path('api/assistente/resposta-async/', views.chatbot_response_async, name='chatbot_response_async'),
+    path('api/assistente/resposta-stream/', views.chatbot_response_stream, name='chatbot_response_stream'),
     path('api/pagamento/processar/', views.process_payment, name='process_payment'),
+    path('api/metricas/', views.metricas, name='metricas'),
 ]
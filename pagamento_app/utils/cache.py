@@ -0,0 +1,113 @@
+"""
+Cache em memória para o Assistente Virtual de Pagamentos.
+Implementa um cache LRU limitado, com expiração opcional por tempo e contadores de uso.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Cache LRU limitado em número de entradas, com TTL opcional.
+
+    Seguro para uso concorrente entre threads. Mantém contadores de acertos,
+    falhas, remoções por capacidade e expirações.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        """
+        Inicializa o cache.
+
+        Args:
+            maxsize (int, optional): Número máximo de entradas
+            ttl (float, optional): Tempo de vida das entradas em segundos. Se None, não expiram.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, chave, default=None):
+        """
+        Obtém um valor do cache, marcando-o como usado recentemente.
+
+        Args:
+            chave: Chave da entrada
+            default (optional): Valor retornado se a chave não existir ou tiver expirado
+
+        Returns:
+            object: Valor armazenado ou default
+        """
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is None:
+                self.misses += 1
+                return default
+
+            valor, expira_em = entrada
+            if expira_em is not None and expira_em <= time.monotonic():
+                del self._dados[chave]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._dados.move_to_end(chave)
+            self.hits += 1
+            return valor
+
+    def set(self, chave, valor):
+        """
+        Armazena um valor, removendo a entrada menos usada se o cache estiver cheio.
+
+        Args:
+            chave: Chave da entrada
+            valor: Valor a armazenar
+        """
+        expira_em = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._dados[chave] = (valor, expira_em)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.maxsize:
+                self._dados.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, chave):
+        """
+        Remove uma entrada, se existir.
+
+        Args:
+            chave: Chave da entrada
+        """
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def clear(self):
+        """Remove todas as entradas do cache, mantendo os contadores."""
+        with self._lock:
+            self._dados.clear()
+
+    def __len__(self):
+        return len(self._dados)
+
+    def stats(self):
+        """
+        Retorna os contadores de uso do cache.
+
+        Returns:
+            dict: Tamanho atual, capacidade, acertos, falhas, remoções e expirações
+        """
+        with self._lock:
+            return {
+                "tamanho": len(self._dados),
+                "capacidade": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
@@ -0,0 +1,279 @@
+"""
+Execução controlada da geração de texto para o Assistente Virtual de Pagamentos.
+Isola a geração (intensiva em CPU) das threads que atendem as requisições.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from .metrics import metrics
+
+
+class GenerationPool:
+    """
+    Pool limitado de threads dedicado à geração de texto.
+
+    Cada chamada espera no máximo `timeout` segundos pelo resultado. Quando o
+    prazo estoura ou quando já há `max_workers + max_queue` gerações em
+    andamento, a chamada retorna imediatamente a resposta de contingência.
+    """
+
+    def __init__(self, max_workers=2, max_queue=8, timeout=8.0, nome="geracao", metrics=metrics):
+        """
+        Inicializa o pool.
+
+        Args:
+            max_workers (int, optional): Número de threads de geração
+            max_queue (int, optional): Gerações que podem aguardar por uma thread livre
+            timeout (float, optional): Prazo em segundos para cada geração
+            nome (str, optional): Prefixo das métricas e das threads
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.nome = nome
+        self.metrics = metrics
+        self._vagas = threading.BoundedSemaphore(max_workers + max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=nome)
+        self._em_andamento = 0
+        self._lock = threading.Lock()
+
+        metrics.register_gauge(f"{nome}.em_andamento", lambda: self._em_andamento)
+
+    def run(self, funcao, *args, fallback=None, timeout=None, **kwargs):
+        """
+        Executa a função no pool respeitando o prazo e o limite da fila.
+
+        Args:
+            funcao (callable): Função de geração
+            *args: Argumentos posicionais da função
+            fallback (optional): Valor retornado em caso de rejeição, prazo estourado ou erro
+            timeout (float, optional): Prazo específico desta chamada
+            **kwargs: Argumentos nomeados da função
+
+        Returns:
+            object: Resultado da função ou o valor de contingência
+        """
+        return self._executar(
+            lambda: self._executor.submit(funcao, *args, **kwargs), fallback, timeout
+        )
+
+    def run_batched(self, batcher, entrada, fallback=None, timeout=None):
+        """
+        Envia uma entrada a um MicroBatcher respeitando o prazo e o limite da fila.
+
+        Args:
+            batcher (MicroBatcher): Agendador que executa as entradas em lotes
+            entrada: Entrada a ser processada
+            fallback (optional): Valor retornado em caso de rejeição, prazo estourado ou erro
+            timeout (float, optional): Prazo específico desta chamada
+
+        Returns:
+            object: Resultado da entrada ou o valor de contingência
+        """
+        return self._executar(lambda: batcher.submit(entrada), fallback, timeout)
+
+    def submit(self, funcao, *args, **kwargs):
+        """
+        Envia a função ao pool sem aguardar o resultado.
+
+        Usado quando o resultado é consumido aos poucos (ex.: geração em fluxo);
+        a vaga é devolvida quando a função termina.
+
+        Args:
+            funcao (callable): Função de geração
+            *args: Argumentos posicionais da função
+            **kwargs: Argumentos nomeados da função
+
+        Returns:
+            Future: Execução da função, ou None se a fila estiver cheia
+        """
+        return self._admitir(lambda: self._executor.submit(funcao, *args, **kwargs))
+
+    def _admitir(self, enviar):
+        """Reserva uma vaga e envia o trabalho; retorna None se não houver vaga."""
+        if not self._vagas.acquire(blocking=False):
+            self.metrics.incr(f"{self.nome}.rejeitadas")
+            return None
+
+        with self._lock:
+            self._em_andamento += 1
+
+        try:
+            future = enviar()
+        except Exception:
+            self._liberar(None)
+            raise
+        future.add_done_callback(self._liberar)
+        return future
+
+    def _executar(self, enviar, fallback, timeout):
+        """Controla a admissão, envia o trabalho e aguarda o resultado dentro do prazo."""
+        inicio = time.monotonic()
+        future = self._admitir(enviar)
+        if future is None:
+            return fallback
+
+        try:
+            resultado = future.result(timeout=self.timeout if timeout is None else timeout)
+        except FuturesTimeoutError:
+            # Se ainda não começou, a geração é descartada; se já começou, termina em segundo plano
+            future.cancel()
+            self.metrics.incr(f"{self.nome}.prazo_esgotado")
+            return fallback
+        except Exception as e:
+            print(f"Erro na geração de texto: {e}")
+            self.metrics.incr(f"{self.nome}.erros")
+            return fallback
+
+        self.metrics.observe(f"{self.nome}.latencia", time.monotonic() - inicio)
+        self.metrics.incr(f"{self.nome}.concluidas")
+        return resultado
+
+    def _liberar(self, future):
+        """Devolve a vaga quando a geração termina ou é cancelada."""
+        with self._lock:
+            self._em_andamento -= 1
+        self._vagas.release()
+
+    def shutdown(self, wait=False):
+        """Encerra as threads do pool."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class MicroBatcher:
+    """
+    Agendador que agrupa entradas concorrentes em pequenos lotes.
+
+    Cada thread de trabalho espera a primeira entrada e então reúne outras
+    por até `max_espera` segundos ou até `max_itens` entradas. O lote é
+    processado de uma vez e cada resultado é entregue ao Future de quem o enviou.
+    """
+
+    def __init__(self, processar_lote, max_itens=8, max_espera=0.02, workers=1,
+                 nome="lote", metrics=metrics):
+        """
+        Inicializa o agendador.
+
+        Args:
+            processar_lote (callable): Função que recebe uma lista de entradas e
+                retorna a lista de resultados na mesma ordem
+            max_itens (int, optional): Tamanho máximo de cada lote
+            max_espera (float, optional): Tempo máximo, em segundos, para completar um lote
+            workers (int, optional): Threads que processam lotes em paralelo
+            nome (str, optional): Prefixo das métricas e das threads
+            metrics (Metrics, optional): Registro onde as métricas são publicadas
+        """
+        self.processar_lote = processar_lote
+        self.max_itens = max_itens
+        self.max_espera = max_espera
+        self.workers = workers
+        self.nome = nome
+        self.metrics = metrics
+        self._fila = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+        metrics.register_gauge(f"{nome}.fila", self._fila.qsize)
+
+    def submit(self, entrada):
+        """
+        Enfileira uma entrada para o próximo lote.
+
+        Args:
+            entrada: Entrada a ser processada
+
+        Returns:
+            Future: Resultado da entrada quando o lote for processado
+        """
+        self._iniciar()
+        future = Future()
+        self._fila.put((entrada, future))
+        return future
+
+    def _iniciar(self):
+        """Cria as threads de trabalho no primeiro uso."""
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for indice in range(self.workers):
+                thread = threading.Thread(
+                    target=self._loop, name=f"{self.nome}-{indice}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _coletar_lote(self):
+        """Bloqueia até a primeira entrada e completa o lote dentro da janela de espera."""
+        lote = [self._fila.get()]
+        prazo = time.monotonic() + self.max_espera
+        while len(lote) < self.max_itens:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _loop(self):
+        """Processa lotes continuamente."""
+        while True:
+            lote = self._coletar_lote()
+
+            # Ignorar entradas cujo solicitante já desistiu (prazo esgotado)
+            ativos = [(entrada, future) for entrada, future in lote if future.set_running_or_notify_cancel()]
+            if not ativos:
+                continue
+
+            inicio = time.monotonic()
+            try:
+                resultados = list(self.processar_lote([entrada for entrada, _ in ativos]))
+            except Exception as e:
+                for _, future in ativos:
+                    future.set_exception(e)
+                self.metrics.incr(f"{self.nome}.erros")
+                continue
+
+            for (_, future), resultado in zip(ativos, resultados):
+                future.set_result(resultado)
+            if len(resultados) != len(ativos):
+                # Sem o resultado, quem enviou a entrada esperaria até o próprio prazo
+                erro = RuntimeError(
+                    f"Lote de {len(ativos)} entradas devolveu {len(resultados)} resultados"
+                )
+                for _, future in ativos[len(resultados):]:
+                    future.set_exception(erro)
+                self.metrics.incr(f"{self.nome}.erros")
+                continue
+
+            self.metrics.observe(f"{self.nome}.latencia_lote", time.monotonic() - inicio)
+            self.metrics.incr(f"{self.nome}.lotes")
+            self.metrics.incr(f"{self.nome}.itens", len(ativos))
+
+
+def criterio_parada(evento):
+    """
+    Critério de parada do `generate` do transformers controlado por um evento.
+
+    Permite interromper uma geração em fluxo que ninguém mais está lendo
+    (cliente desconectado ou prazo esgotado), liberando a thread do pool.
+
+    Args:
+        evento (threading.Event): Sinalizado para interromper a geração
+
+    Returns:
+        StoppingCriteriaList: Critérios a passar em `stopping_criteria`
+    """
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class _ParadaPorEvento(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return evento.is_set()
+
+    return StoppingCriteriaList([_ParadaPorEvento()])
@@ -0,0 +1,292 @@
+"""
+Servidor local de inferência de NLP para o Assistente Virtual de Pagamentos.
+Mantém uma única cópia do spaCy e do gerador de texto, compartilhada pelos workers via socket Unix.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from .generation import MicroBatcher
+from .metrics import metrics
+
+# Cada mensagem é um JSON UTF-8 precedido do seu tamanho em 4 bytes (big-endian)
+_CABECALHO = struct.Struct(">I")
+
+# Tamanho máximo aceito para uma mensagem do protocolo
+TAMANHO_MAXIMO = 4 * 1024 * 1024
+
+
+class InferenceUnavailable(Exception):
+    """O servidor de inferência não respondeu ou retornou erro."""
+
+
+def enviar_mensagem(sock, mensagem):
+    """
+    Envia uma mensagem do protocolo por um socket.
+
+    Args:
+        sock (socket.socket): Socket conectado
+        mensagem (dict): Conteúdo serializável em JSON
+    """
+    corpo = json.dumps(mensagem, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    sock.sendall(_CABECALHO.pack(len(corpo)) + corpo)
+
+
+def _ler_exato(ler, tamanho):
+    """Lê exatamente `tamanho` bytes usando a função de leitura informada."""
+    partes = []
+    restante = tamanho
+    while restante:
+        parte = ler(restante)
+        if not parte:
+            return None
+        partes.append(parte)
+        restante -= len(parte)
+    return b"".join(partes)
+
+
+def receber_mensagem(ler):
+    """
+    Recebe uma mensagem do protocolo.
+
+    Args:
+        ler (callable): Função que lê até n bytes (ex.: `sock.recv`, `arquivo.read`)
+
+    Returns:
+        dict: Mensagem recebida, ou None se a conexão foi encerrada
+    """
+    cabecalho = _ler_exato(ler, _CABECALHO.size)
+    if cabecalho is None:
+        return None
+    (tamanho,) = _CABECALHO.unpack(cabecalho)
+    if tamanho > TAMANHO_MAXIMO:
+        raise ValueError(f"Mensagem excede o tamanho máximo: {tamanho} bytes")
+    corpo = _ler_exato(ler, tamanho)
+    if corpo is None:
+        return None
+    return json.loads(corpo.decode("utf-8"))
+
+
+class _ConexaoHandler(socketserver.BaseRequestHandler):
+    """Atende uma conexão persistente de um worker, uma requisição por vez."""
+
+    def handle(self):
+        servidor = self.server.inference_server
+        while True:
+            try:
+                requisicao = receber_mensagem(self.request.recv)
+            except (OSError, ValueError):
+                return
+            if requisicao is None:
+                return
+
+            resposta = {"id": requisicao.get("id")}
+            try:
+                resposta["resultado"] = servidor.executar(requisicao.get("op"), requisicao.get("dados"))
+                resposta["ok"] = True
+            except Exception as e:
+                resposta["ok"] = False
+                resposta["erro"] = str(e)
+
+            try:
+                enviar_mensagem(self.request, resposta)
+            except OSError:
+                return
+
+
+class _ServidorUnix(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class InferenceServer:
+    """
+    Servidor de inferência que atende todos os workers de um nó.
+
+    As requisições de análise e de geração vindas de workers diferentes
+    são agrupadas em micro-lotes antes de passar pelos modelos. Cada uma
+    espera no máximo `timeout` segundos pelo seu lote; depois disso o worker
+    recebe um erro e a entrada é descartada se o lote ainda não começou.
+    """
+
+    def __init__(self, caminho_socket, nlp_processor=None, timeout=8.0):
+        """
+        Inicializa o servidor.
+
+        Args:
+            caminho_socket (str): Caminho do socket Unix
+            nlp_processor (NLPProcessor, optional): Processador que executa os modelos localmente
+            timeout (float, optional): Prazo em segundos para cada análise ou geração;
+                deve ser menor que o prazo dos clientes
+        """
+        if nlp_processor is None:
+            from .nlp_processor import NLPProcessor
+            nlp_processor = NLPProcessor(inference_client=False)
+
+        self.caminho_socket = caminho_socket
+        self.nlp_processor = nlp_processor
+        self.timeout = timeout
+        self.analysis_batcher = MicroBatcher(
+            nlp_processor.extrair_palavras_chave_lote,
+            nome="servidor_nlp.analise"
+        )
+        self._servidor = None
+
+    def aquecer(self):
+        """Carrega os modelos antes de aceitar conexões."""
+        registry = self.nlp_processor.registry
+        for nome in ("spacy", "stopwords", "gerador"):
+            registry.get(nome)
+
+    def executar(self, operacao, dados):
+        """
+        Executa uma operação do protocolo.
+
+        Args:
+            operacao (str): analisar, gerar ou status
+            dados (dict): Parâmetros da operação
+
+        Returns:
+            object: Resultado serializável em JSON
+
+        Raises:
+            TimeoutError: Se a análise ou a geração não terminar dentro do prazo
+        """
+        if operacao == "analisar":
+            plano, tipo_informacao, palavras_chave = self._aguardar(self.analysis_batcher.submit(dados["texto"]))
+            return {
+                "plano": plano,
+                "tipo_informacao": tipo_informacao,
+                "palavras_chave": sorted(palavras_chave)
+            }
+        if operacao == "gerar":
+            return self._aguardar(self.nlp_processor.generation_batcher.submit(dados["prompt"]))
+        if operacao == "status":
+            return self.nlp_processor.registry.status()
+        raise ValueError(f"Operação desconhecida: {operacao}")
+
+    def _aguardar(self, future):
+        """Aguarda o resultado de um lote dentro do prazo, desistindo da entrada se ele estourar."""
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            # Se o lote ainda não começou, a entrada é descartada pelo MicroBatcher
+            future.cancel()
+            metrics.incr("servidor_nlp.prazo_esgotado")
+            raise TimeoutError(f"Prazo de {self.timeout}s esgotado no servidor de inferência")
+
+    def serve_forever(self):
+        """Abre o socket e atende os workers até ser interrompido."""
+        if os.path.exists(self.caminho_socket):
+            os.unlink(self.caminho_socket)
+
+        self._servidor = _ServidorUnix(self.caminho_socket, _ConexaoHandler)
+        self._servidor.inference_server = self
+        try:
+            self._servidor.serve_forever()
+        finally:
+            self._servidor.server_close()
+            if os.path.exists(self.caminho_socket):
+                os.unlink(self.caminho_socket)
+
+    def shutdown(self):
+        """Interrompe o laço de atendimento."""
+        if self._servidor is not None:
+            self._servidor.shutdown()
+
+
+class InferenceClient:
+    """
+    Cliente do servidor de inferência usado pelo NLPProcessor dos workers.
+
+    Cada thread mantém sua própria conexão persistente com o servidor.
+    """
+
+    def __init__(self, caminho_socket, timeout=10.0):
+        """
+        Inicializa o cliente sem abrir conexões.
+
+        Args:
+            caminho_socket (str): Caminho do socket Unix do servidor
+            timeout (float, optional): Prazo em segundos para cada requisição
+        """
+        self.caminho_socket = caminho_socket
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def extrair_palavras_chave(self, texto):
+        """
+        Executa a análise com spaCy no servidor.
+
+        Args:
+            texto (str): Texto do usuário
+
+        Returns:
+            tuple: (plano, tipo_informacao, palavras_chave)
+        """
+        resultado = self._requisitar("analisar", {"texto": texto})
+        return resultado["plano"], resultado["tipo_informacao"], set(resultado["palavras_chave"])
+
+    def gerar(self, prompt):
+        """
+        Gera uma resposta de texto no servidor.
+
+        Args:
+            prompt (str): Prompt enviado ao modelo
+
+        Returns:
+            str: Resposta gerada
+        """
+        return self._requisitar("gerar", {"prompt": prompt})
+
+    def status(self):
+        """Retorna o estado dos modelos no servidor."""
+        return self._requisitar("status", {})
+
+    def _conectar(self):
+        """Abre a conexão desta thread, se necessário."""
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.caminho_socket)
+            self._local.sock = sock
+            self._local.proximo_id = 0
+        return sock
+
+    def _fechar(self):
+        """Descarta a conexão desta thread."""
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _requisitar(self, operacao, dados):
+        """Envia uma requisição, reconectando uma vez se a conexão tiver caído."""
+        for tentativa in range(2):
+            try:
+                sock = self._conectar()
+                self._local.proximo_id += 1
+                enviar_mensagem(sock, {"id": self._local.proximo_id, "op": operacao, "dados": dados})
+                resposta = receber_mensagem(sock.recv)
+            except (OSError, ValueError) as e:
+                self._fechar()
+                if tentativa == 0 and not isinstance(e, socket.timeout):
+                    continue
+                raise InferenceUnavailable(f"Servidor de inferência indisponível: {e}")
+
+            if resposta is None:
+                self._fechar()
+                if tentativa == 0:
+                    continue
+                raise InferenceUnavailable("Servidor de inferência encerrou a conexão")
+
+            if not resposta.get("ok"):
+                raise InferenceUnavailable(resposta.get("erro", "Erro no servidor de inferência"))
+            return resposta["resultado"]
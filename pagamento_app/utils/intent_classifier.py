@@ -0,0 +1,229 @@
+"""
+Classificador de intenções leve para o Assistente Virtual de Pagamentos.
+Combina um vetorizador por hashing com regressão logística multinomial, usando apenas NumPy.
+"""
+
+import zlib
+import numpy as np
+from .text_normalizer import analisar_texto
+
+
+class IntentClassifier:
+    """
+    Classificador linear de intenções treinado a partir das mensagens registradas.
+
+    Cada texto vira um vetor esparso de `n_features` posições preenchido por
+    hashing de palavras, pares de palavras e trigramas de caracteres. Os pesos
+    cabem em um pequeno arquivo `.npz` e a inferência é feita em lote com NumPy.
+    """
+
+    def __init__(self, pesos, vieses, classes, n_features):
+        """
+        Inicializa o classificador com parâmetros já treinados.
+
+        Args:
+            pesos (numpy.ndarray): Matriz (n_features, n_classes)
+            vieses (numpy.ndarray): Vetor (n_classes,)
+            classes (list): Nomes das intenções, na ordem das colunas
+            n_features (int): Dimensão do espaço de hashing
+        """
+        self.pesos = pesos.astype(np.float32)
+        self.vieses = vieses.astype(np.float32)
+        self.classes = list(classes)
+        self.n_features = int(n_features)
+
+    @staticmethod
+    def extrair_features(texto):
+        """
+        Extrai as features textuais de uma mensagem.
+
+        Args:
+            texto (str): Texto do usuário
+
+        Returns:
+            list: Features como strings (palavras, pares e trigramas)
+        """
+        tokens = analisar_texto(texto).tokens
+        features = [f"w:{token}" for token in tokens]
+        features.extend(f"b:{a}_{b}" for a, b in zip(tokens, tokens[1:]))
+        for token in tokens:
+            marcado = f"<{token}>"
+            features.extend(f"c:{marcado[i:i + 3]}" for i in range(len(marcado) - 2))
+        return features
+
+    @classmethod
+    def vetorizar(cls, textos, n_features):
+        """
+        Converte textos em uma matriz esparsa no formato CSR.
+
+        Args:
+            textos (list): Textos dos usuários
+            n_features (int): Dimensão do espaço de hashing
+
+        Returns:
+            tuple: (indptr, indices, valores) com linhas normalizadas pela norma L2
+        """
+        indptr = [0]
+        indices = []
+        valores = []
+        for texto in textos:
+            contagem = {}
+            for feature in cls.extrair_features(texto):
+                codigo = zlib.crc32(feature.encode("utf-8"))
+                # O bit mais alto define o sinal, reduzindo o viés das colisões
+                sinal = 1.0 if codigo & 0x80000000 else -1.0
+                coluna = codigo % n_features
+                contagem[coluna] = contagem.get(coluna, 0.0) + sinal
+
+            linha = np.fromiter(contagem.values(), dtype=np.float32, count=len(contagem))
+            norma = float(np.sqrt((linha * linha).sum())) or 1.0
+            indices.extend(contagem.keys())
+            valores.extend((linha / norma).tolist())
+            indptr.append(len(indices))
+
+        return (
+            np.asarray(indptr, dtype=np.int64),
+            np.asarray(indices, dtype=np.int64),
+            np.asarray(valores, dtype=np.float32)
+        )
+
+    @staticmethod
+    def _produto(indptr, indices, valores, pesos):
+        """Calcula X @ W para X esparsa em CSR e W densa."""
+        n_linhas = len(indptr) - 1
+        resultado = np.zeros((n_linhas, pesos.shape[1]), dtype=np.float32)
+        if len(indices) == 0:
+            return resultado
+        contribuicoes = pesos[indices] * valores[:, None]
+        linhas = np.repeat(np.arange(n_linhas), np.diff(indptr))
+        np.add.at(resultado, linhas, contribuicoes)
+        return resultado
+
+    @staticmethod
+    def _softmax(logits):
+        """Softmax estável por linha."""
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    @classmethod
+    def treinar(cls, textos, intencoes, n_features=2 ** 14, epocas=200,
+                taxa_aprendizado=0.5, regularizacao=1e-4):
+        """
+        Treina o classificador por descida de gradiente em lote completo.
+
+        Args:
+            textos (list): Textos de treino
+            intencoes (list): Intenção de cada texto
+            n_features (int, optional): Dimensão do espaço de hashing
+            epocas (int, optional): Número de passos de gradiente
+            taxa_aprendizado (float, optional): Tamanho do passo
+            regularizacao (float, optional): Peso da penalidade L2
+
+        Returns:
+            IntentClassifier: Classificador treinado
+        """
+        classes = sorted(set(intencoes))
+        indice_classe = {classe: i for i, classe in enumerate(classes)}
+        y = np.asarray([indice_classe[intencao] for intencao in intencoes], dtype=np.int64)
+        alvo = np.zeros((len(y), len(classes)), dtype=np.float32)
+        alvo[np.arange(len(y)), y] = 1.0
+
+        indptr, indices, valores = cls.vetorizar(textos, n_features)
+        linhas = np.repeat(np.arange(len(y)), np.diff(indptr))
+
+        pesos = np.zeros((n_features, len(classes)), dtype=np.float32)
+        vieses = np.zeros(len(classes), dtype=np.float32)
+        n = float(len(y))
+
+        for _ in range(epocas):
+            probabilidades = cls._softmax(cls._produto(indptr, indices, valores, pesos) + vieses)
+            erro = (probabilidades - alvo) / n
+
+            # Gradiente de X.T @ erro acumulado apenas nas colunas usadas
+            gradiente = np.zeros_like(pesos)
+            np.add.at(gradiente, indices, erro[linhas] * valores[:, None])
+            gradiente += regularizacao * pesos
+
+            pesos -= taxa_aprendizado * gradiente
+            vieses -= taxa_aprendizado * erro.sum(axis=0)
+
+        return cls(pesos, vieses, classes, n_features)
+
+    def salvar(self, caminho):
+        """
+        Salva os parâmetros em um arquivo `.npz` compactado.
+
+        Args:
+            caminho (str): Caminho do arquivo
+        """
+        np.savez_compressed(
+            caminho,
+            pesos=self.pesos,
+            vieses=self.vieses,
+            classes=np.asarray(self.classes),
+            n_features=np.asarray(self.n_features)
+        )
+
+    @classmethod
+    def carregar(cls, caminho):
+        """
+        Carrega um classificador salvo com `salvar`.
+
+        Args:
+            caminho (str): Caminho do arquivo `.npz`
+
+        Returns:
+            IntentClassifier: Classificador carregado
+        """
+        with np.load(caminho, allow_pickle=False) as dados:
+            return cls(
+                dados["pesos"],
+                dados["vieses"],
+                [str(classe) for classe in dados["classes"]],
+                int(dados["n_features"])
+            )
+
+    def probabilidades(self, textos):
+        """
+        Calcula a distribuição de probabilidade das intenções para cada texto.
+
+        Args:
+            textos (list): Textos dos usuários
+
+        Returns:
+            numpy.ndarray: Matriz (len(textos), n_classes)
+        """
+        indptr, indices, valores = self.vetorizar(textos, self.n_features)
+        return self._softmax(self._produto(indptr, indices, valores, self.pesos) + self.vieses)
+
+    def prever_lote(self, textos):
+        """
+        Prevê a intenção de vários textos de uma vez.
+
+        Args:
+            textos (list): Textos dos usuários
+
+        Returns:
+            list: Tuplas (intencao, probabilidade), na ordem dos textos
+        """
+        if not textos:
+            return []
+        probabilidades = self.probabilidades(textos)
+        melhores = probabilidades.argmax(axis=1)
+        return [
+            (self.classes[indice], float(probabilidades[linha, indice]))
+            for linha, indice in enumerate(melhores)
+        ]
+
+    def prever(self, texto):
+        """
+        Prevê a intenção de um texto.
+
+        Args:
+            texto (str): Texto do usuário
+
+        Returns:
+            tuple: (intencao, probabilidade)
+        """
+        return self.prever_lote([texto])[0]
@@ -0,0 +1,120 @@
+"""
+Reconhecedor de intenções por palavras-chave para o Assistente Virtual de Pagamentos.
+Compila todas as palavras-chave em uma única expressão regular percorrida uma vez por texto.
+"""
+
+import re
+import threading
+from collections import namedtuple
+from .text_normalizer import normalizar_texto
+
+# Correspondência encontrada no texto: intenção, palavra-chave e posição
+IntentMatch = namedtuple("IntentMatch", ["intencao", "palavra_chave", "inicio", "fim"])
+
+# Tabela compilada; substituída por inteiro quando as palavras-chave mudam
+_TabelaCompilada = namedtuple("_TabelaCompilada", ["regex", "intencoes_por_palavra", "prioridade"])
+
+
+class IntentMatcher:
+    """
+    Reconhecedor de múltiplas palavras-chave compilado uma única vez.
+
+    Todas as palavras-chave de todas as intenções formam uma só alternância
+    com limites de palavra, de modo que o custo de uma busca não cresce com
+    o número de intenções e sinônimos cadastrados. Plurais simples
+    ("plano" -> "planos") também são reconhecidos.
+
+    Diferente da antiga busca por substring, uma palavra só é reconhecida
+    inteira: "oi" não aparece em "depois". E, quando um plural está
+    cadastrado como palavra-chave própria, ele pertence só à sua intenção:
+    "pagamentos" (historico) não conta também como "pagamento" (pagamento).
+    """
+
+    def __init__(self, intent_keywords, normalizar=normalizar_texto):
+        """
+        Compila o reconhecedor.
+
+        Args:
+            intent_keywords (dict): Mapeamento intenção -> lista de palavras-chave
+            normalizar (callable, optional): Função aplicada às palavras-chave,
+                que deve ser a mesma aplicada aos textos pesquisados
+        """
+        self._normalizar = normalizar
+        self._lock = threading.Lock()
+        self._tabela = self._compilar(intent_keywords)
+
+    def atualizar(self, intent_keywords):
+        """
+        Recompila o reconhecedor com novas palavras-chave.
+
+        A nova tabela é montada por completo antes de substituir a atual,
+        então buscas concorrentes veem a tabela antiga ou a nova, nunca uma parcial.
+
+        Args:
+            intent_keywords (dict): Mapeamento intenção -> lista de palavras-chave
+        """
+        tabela = self._compilar(intent_keywords)
+        with self._lock:
+            self._tabela = tabela
+
+    def encontrar(self, texto):
+        """
+        Encontra todas as palavras-chave presentes no texto em uma única passada.
+
+        Args:
+            texto (str): Texto já normalizado
+
+        Returns:
+            list: Lista de IntentMatch na ordem em que aparecem no texto
+        """
+        return self._encontrar(self._tabela, texto)
+
+    def intencoes(self, texto):
+        """
+        Retorna as intenções distintas encontradas no texto, por ordem de prioridade.
+
+        A prioridade é a ordem em que as intenções foram cadastradas.
+
+        Args:
+            texto (str): Texto já normalizado
+
+        Returns:
+            list: Intenções encontradas
+        """
+        tabela = self._tabela
+        encontradas = {match.intencao for match in self._encontrar(tabela, texto)}
+        return sorted(encontradas, key=tabela.prioridade.__getitem__)
+
+    def _encontrar(self, tabela, texto):
+        """Percorre o texto uma vez com a tabela informada."""
+        if tabela.regex is None:
+            return []
+
+        correspondencias = []
+        for match in tabela.regex.finditer(texto):
+            palavra = match.group(1)
+            for intencao in tabela.intencoes_por_palavra[palavra]:
+                correspondencias.append(IntentMatch(intencao, palavra, match.start(), match.end()))
+        return correspondencias
+
+    def _compilar(self, intent_keywords):
+        """Monta a expressão regular e os índices a partir das palavras-chave."""
+        intencoes_por_palavra = {}
+        prioridade = {}
+        for ordem, (intencao, palavras) in enumerate(intent_keywords.items()):
+            prioridade[intencao] = ordem
+            for palavra in palavras:
+                palavra = self._normalizar(palavra).strip()
+                if not palavra:
+                    continue
+                destinos = intencoes_por_palavra.setdefault(palavra, [])
+                if intencao not in destinos:
+                    destinos.append(intencao)
+
+        if not intencoes_por_palavra:
+            return _TabelaCompilada(None, intencoes_por_palavra, prioridade)
+
+        # Palavras mais longas primeiro para que "pagamentos" vença "pagamento"
+        alternativas = sorted(intencoes_por_palavra, key=len, reverse=True)
+        padrao = r"\b(" + "|".join(re.escape(p) for p in alternativas) + r")(?:e?s)?\b"
+        return _TabelaCompilada(re.compile(padrao), intencoes_por_palavra, prioridade)
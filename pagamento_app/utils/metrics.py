@@ -0,0 +1,156 @@
+"""
+Métricas em memória para o Assistente Virtual de Pagamentos.
+Mantém contadores, amostras de latência e indicadores calculados sob demanda.
+"""
+
+import threading
+from collections import deque
+
+
+class LatencySummary:
+    """
+    Resumo de latências com janela deslizante das amostras mais recentes.
+    """
+
+    def __init__(self, janela=1024):
+        """
+        Inicializa o resumo.
+
+        Args:
+            janela (int, optional): Número de amostras mantidas para os percentis
+        """
+        self.amostras = deque(maxlen=janela)
+        self.total = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def observe(self, segundos):
+        """Registra uma amostra de latência em segundos."""
+        self.amostras.append(segundos)
+        self.total += 1
+        self.soma += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+
+    def percentil(self, p):
+        """
+        Calcula um percentil sobre a janela de amostras.
+
+        Args:
+            p (float): Percentil entre 0 e 100
+
+        Returns:
+            float: Latência no percentil, ou None se não houver amostras
+        """
+        if not self.amostras:
+            return None
+        ordenadas = sorted(self.amostras)
+        indice = min(len(ordenadas) - 1, int(round(p / 100.0 * (len(ordenadas) - 1))))
+        return ordenadas[indice]
+
+    def snapshot(self):
+        """Retorna o resumo atual das latências."""
+        return {
+            "total": self.total,
+            "media": self.soma / self.total if self.total else None,
+            "p50": self.percentil(50),
+            "p95": self.percentil(95),
+            "p99": self.percentil(99),
+            "max": self.maximo
+        }
+
+
+class Metrics:
+    """
+    Registro de métricas do processo.
+
+    Contadores e latências são alimentados pelos componentes; indicadores
+    registrados como funções são avaliados apenas quando o snapshot é gerado.
+    """
+
+    def __init__(self):
+        """Inicializa o registro vazio."""
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._latencias = {}
+        self._indicadores = {}
+
+    def incr(self, nome, valor=1):
+        """
+        Incrementa um contador.
+
+        Args:
+            nome (str): Nome do contador
+            valor (int, optional): Valor a somar
+        """
+        with self._lock:
+            self._contadores[nome] = self._contadores.get(nome, 0) + valor
+
+    def observe(self, nome, segundos):
+        """
+        Registra uma amostra de latência.
+
+        Args:
+            nome (str): Nome da métrica de latência
+            segundos (float): Duração observada
+        """
+        with self._lock:
+            resumo = self._latencias.get(nome)
+            if resumo is None:
+                resumo = self._latencias[nome] = LatencySummary()
+            resumo.observe(segundos)
+
+    def percentil(self, nome, p):
+        """
+        Retorna um percentil de uma métrica de latência.
+
+        Args:
+            nome (str): Nome da métrica de latência
+            p (float): Percentil entre 0 e 100
+
+        Returns:
+            float: Latência no percentil, ou None se não houver amostras
+        """
+        with self._lock:
+            resumo = self._latencias.get(nome)
+            return resumo.percentil(p) if resumo else None
+
+    def register_gauge(self, nome, funcao):
+        """
+        Registra um indicador calculado sob demanda.
+
+        Args:
+            nome (str): Nome do indicador
+            funcao (callable): Função sem argumentos que retorna um valor serializável
+        """
+        with self._lock:
+            self._indicadores[nome] = funcao
+
+    def snapshot(self):
+        """
+        Retorna todas as métricas em um dicionário serializável em JSON.
+
+        Returns:
+            dict: Contadores, latências e indicadores
+        """
+        with self._lock:
+            contadores = dict(self._contadores)
+            latencias = {nome: resumo.snapshot() for nome, resumo in self._latencias.items()}
+            indicadores = dict(self._indicadores)
+
+        valores = {}
+        for nome, funcao in indicadores.items():
+            try:
+                valores[nome] = funcao()
+            except Exception as e:
+                valores[nome] = f"erro: {e}"
+
+        return {
+            "contadores": contadores,
+            "latencias": latencias,
+            "indicadores": valores
+        }
+
+
+# Registro compartilhado por todo o processo
+metrics = Metrics()
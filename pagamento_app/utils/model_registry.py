@@ -0,0 +1,166 @@
+"""
+Registro de modelos carregados sob demanda para o Assistente Virtual de Pagamentos.
+Evita que spaCy, NLTK e Transformers sejam carregados na importação dos módulos.
+"""
+
+import threading
+import time
+
+
+class ModelRegistry:
+    """
+    Registro de modelos compartilhados entre todas as sessões do processo.
+    Cada modelo é carregado uma única vez: na primeira vez em que uma etapa
+    de NLP precisa dele ou por uma thread de aquecimento em segundo plano.
+    Um carregamento que falhou volta a ser tentado em segundo plano depois de
+    uma espera que dobra a cada falha seguida; `get` bloqueante tenta na hora.
+    """
+
+    def __init__(self, backoff_base=5.0, backoff_max=300.0):
+        """
+        Inicializa o registro vazio.
+
+        Args:
+            backoff_base (float, optional): Segundos de espera após a primeira falha de um modelo
+            backoff_max (float, optional): Espera máxima entre duas tentativas em segundo plano
+        """
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._loaders = {}
+        self._models = {}
+        self._errors = {}
+        self._falhas = {}
+        self._nova_tentativa = {}
+        self._locks = {}
+        self._carregando = set()
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        """
+        Registra a função responsável por carregar um modelo.
+
+        Args:
+            name (str): Nome do modelo no registro
+            loader (callable): Função sem argumentos que retorna o modelo carregado
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+
+    def is_ready(self, name):
+        """
+        Verifica se um modelo já está carregado.
+
+        Args:
+            name (str): Nome do modelo
+
+        Returns:
+            bool: True se o modelo estiver pronto para uso
+        """
+        return name in self._models
+
+    def get(self, name, block=True):
+        """
+        Obtém um modelo, carregando-o se necessário.
+
+        Args:
+            name (str): Nome do modelo
+            block (bool, optional): Se False, não espera o carregamento; dispara
+                o carregamento em segundo plano e retorna None
+
+        Returns:
+            object: Modelo carregado ou None se ainda não estiver pronto
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if not block:
+            self.load_async(name)
+            return None
+
+        return self._load(name)
+
+    def load_async(self, name):
+        """
+        Dispara o carregamento de um modelo em uma thread de segundo plano.
+
+        Um modelo cujo último carregamento falhou só é tentado de novo depois
+        da espera correspondente.
+
+        Args:
+            name (str): Nome do modelo
+        """
+        with self._lock:
+            if name in self._models or name in self._carregando:
+                return
+            if name in self._errors and time.monotonic() < self._nova_tentativa[name]:
+                return
+            self._carregando.add(name)
+
+        threading.Thread(
+            target=self._load_silently,
+            args=(name,),
+            name=f"model-loader-{name}",
+            daemon=True
+        ).start()
+
+    def warm_up(self, names=None):
+        """
+        Aquece os modelos em segundo plano sem bloquear a requisição atual.
+
+        Args:
+            names (list, optional): Modelos a carregar. Se None, carrega todos.
+        """
+        for name in names or list(self._loaders):
+            self.load_async(name)
+
+    def status(self):
+        """
+        Retorna o estado de carregamento de cada modelo registrado.
+
+        Returns:
+            dict: Mapeamento nome -> estado (pronto, carregando, erro, pendente)
+        """
+        estados = {}
+        for name in self._loaders:
+            if name in self._models:
+                estados[name] = "pronto"
+            elif name in self._carregando:
+                estados[name] = "carregando"
+            elif name in self._errors:
+                estados[name] = "erro"
+            else:
+                estados[name] = "pendente"
+        return estados
+
+    def _load(self, name):
+        """Carrega o modelo garantindo uma única execução do loader por nome."""
+        with self._locks[name]:
+            if name not in self._models:
+                try:
+                    self._models[name] = self._loaders[name]()
+                    self._errors.pop(name, None)
+                    self._falhas.pop(name, None)
+                except Exception as e:
+                    falhas = self._falhas.get(name, 0) + 1
+                    self._falhas[name] = falhas
+                    self._nova_tentativa[name] = time.monotonic() + min(
+                        self.backoff_max, self.backoff_base * 2 ** (falhas - 1)
+                    )
+                    self._errors[name] = e
+                    raise
+                finally:
+                    self._carregando.discard(name)
+        return self._models[name]
+
+    def _load_silently(self, name):
+        """Carrega o modelo em segundo plano registrando falhas sem propagá-las."""
+        try:
+            self._load(name)
+        except Exception as e:
+            print(f"Erro ao carregar o modelo '{name}': {e}")
+
+
+# Registro compartilhado por todas as instâncias do processo
+registry = ModelRegistry()
@@ -3,32 +3,159 @@ Módulo de processamento de linguagem natural para o Assistente Virtual de Pagam
 Responsável por analisar e extrair intenções e entidades das mensagens dos usuários.
 """
 
-import unicodedata
-import spacy
-import nltk
-from nltk.corpus import stopwords
-from transformers import pipeline
+import os
+import queue
+import threading
+from django.conf import settings
+from . import text_normalizer
+from .cache import LRUCache
+from .generation import GenerationPool, MicroBatcher, criterio_parada
+from .inference_server import InferenceClient, InferenceUnavailable
+from .intent_matcher import IntentMatcher
+from .metrics import metrics
+from .model_registry import registry
+
+# Resposta enquanto os modelos de linguagem ainda estão sendo carregados
+MENSAGEM_AQUECIMENTO = (
+    "Estou terminando de carregar meus modelos de linguagem. Enquanto isso, "
+    "posso ajudar com informações sobre planos e pagamentos."
+)
+
+# Resposta quando a geração de texto está sobrecarregada ou demora demais
+MENSAGEM_SOBRECARGA = (
+    "Desculpe, não consegui elaborar uma resposta agora. Posso ajudar com "
+    "informações sobre planos, pagamentos ou histórico de transações."
+)
+
+# Camadas de classificação, da mais barata para a mais cara
+CAMADA_LEXICA = "lexica"
+CAMADA_CLASSIFICADOR = "classificador"
+CAMADA_SPACY = "spacy"
+
+# Intenções que só são respondidas com precisão quando há plano ou tipo de informação
+INTENCOES_COM_ENTIDADES = ("info_plano", "pagamento")
+
+# Palavras (normalizadas) que indicam uma pergunta por informação
+PALAVRAS_INTERROGATIVAS = frozenset(["qual", "quais", "quanto", "quanta", "quantos", "quantas", "como", "onde", "quando"])
+
+# Componentes do spaCy necessários para obter lema e classe gramatical.
+# Os demais (parser, ner, etc.) são excluídos no carregamento do modelo.
+COMPONENTES_SPACY = ("tok2vec", "tagger", "morphologizer", "attribute_ruler", "lemmatizer")
+
+# Componentes excluídos quando não é possível ler a lista do próprio modelo
+EXCLUSOES_SPACY_PADRAO = ("parser", "ner", "senter", "entity_ruler", "textcat")
+
+
+def _garantir_recursos_nltk():
+    """Garante que os recursos necessários do NLTK estejam disponíveis."""
+    import nltk
+    nltk.download("stopwords", quiet=True)
+
+
+def _carregar_spacy():
+    """Carrega o modelo do spaCy para português apenas com os componentes usados."""
+    import spacy
+    from spacy.util import get_model_meta, get_package_path
+
+    modelo = getattr(settings, "NLP_SPACY_MODEL", "pt_core_news_lg")
+    componentes = set(getattr(settings, "NLP_SPACY_COMPONENTES", COMPONENTES_SPACY))
+
+    try:
+        pipeline_modelo = get_model_meta(get_package_path(modelo)).get("pipeline", [])
+        exclusoes = [nome for nome in pipeline_modelo if nome not in componentes]
+    except Exception:
+        exclusoes = [nome for nome in EXCLUSOES_SPACY_PADRAO if nome not in componentes]
+
+    return spacy.load(modelo, exclude=exclusoes)
+
+
+def _carregar_stopwords():
+    """Carrega as stopwords do NLTK para português."""
+    _garantir_recursos_nltk()
+    from nltk.corpus import stopwords
+    return set(stopwords.words("portuguese"))
+
+
+def _carregar_classificador():
+    """Carrega o classificador de intenções treinado com `treinar_classificador`."""
+    from .intent_classifier import IntentClassifier
+    return IntentClassifier.carregar(settings.NLP_CLASSIFICADOR_PATH)
+
+
+def _carregar_gerador():
+    """Carrega o modelo de geração de texto."""
+    from transformers import pipeline
+    gerador = pipeline("text-generation", model="pierreguillou/gpt2-small-portuguese")
+    
+    # O GPT-2 não tem token de preenchimento; necessário para gerar em lote.
+    # Modelos apenas-decodificador precisam do preenchimento à esquerda.
+    gerador.tokenizer.pad_token_id = gerador.model.config.eos_token_id
+    gerador.tokenizer.padding_side = "left"
+    return gerador
+
+
+registry.register("spacy", _carregar_spacy)
+registry.register("stopwords", _carregar_stopwords)
+registry.register("classificador", _carregar_classificador)
+registry.register("gerador", _carregar_gerador)
 
-# Garantir que os recursos necessários do NLTK estejam disponíveis
-nltk.download("punkt", quiet=True)
-nltk.download("stopwords", quiet=True)
 
 class NLPProcessor:
     """
     Processador de linguagem natural que utiliza spaCy, NLTK e Transformers
     para compreender as intenções do usuário e extrair entidades relevantes.
+    
+    Os modelos são obtidos do registro compartilhado e carregados sob demanda.
+    Enquanto não estiverem prontos, o processador usa apenas as palavras-chave.
     """
     
-    def __init__(self):
-        """Inicializa o processador de linguagem natural com os modelos necessários."""
-        # Carregar modelo do spaCy para português
-        self.nlp = spacy.load("pt_core_news_lg")
+    def __init__(self, registry=registry, inference_client=None):
+        """
+        Inicializa o processador de linguagem natural sem carregar modelos.
+        
+        Args:
+            registry (ModelRegistry, optional): Registro de onde os modelos são obtidos
+            inference_client (InferenceClient, optional): Cliente do servidor de inferência
+                compartilhado. Se None, é criado quando `NLP_INFERENCE_SOCKET` estiver
+                configurado; se False, os modelos sempre rodam neste processo.
+        """
+        self.registry = registry
+        
+        # Com o servidor de inferência, spaCy e gerador rodam fora deste processo
+        if inference_client is None and getattr(settings, "NLP_INFERENCE_SOCKET", None):
+            inference_client = InferenceClient(
+                settings.NLP_INFERENCE_SOCKET,
+                timeout=getattr(settings, "NLP_INFERENCE_TIMEOUT", 10.0)
+            )
+        self.inference_client = inference_client or None
+        
+        # Cache da parte da análise que não depende do contexto da sessão
+        self.cache = LRUCache(
+            maxsize=getattr(settings, "NLP_CACHE_MAXSIZE", 2048),
+            ttl=getattr(settings, "NLP_CACHE_TTL", 600)
+        )
+        metrics.register_gauge("nlp.cache", self.cache.stats)
         
-        # Configurar stopwords do NLTK
-        self.stop_words = set(stopwords.words("portuguese"))
+        # O arquivo do classificador é procurado uma única vez; treinar um novo exige reiniciar
+        caminho = getattr(settings, "NLP_CLASSIFICADOR_PATH", None)
+        self._classificador_configurado = bool(caminho) and os.path.exists(caminho)
+        self._classificador_em_uso = None
         
-        # Carregar modelo de geração de texto
-        self.generator = pipeline("text-generation", model="pierreguillou/gpt2-small-portuguese")
+        # Pool dedicado à geração de texto, com prazo e fila limitados
+        self.generation_pool = GenerationPool(
+            max_workers=getattr(settings, "NLP_GERACAO_WORKERS", 2),
+            max_queue=getattr(settings, "NLP_GERACAO_FILA", 8),
+            timeout=getattr(settings, "NLP_GERACAO_TIMEOUT", 8.0)
+        )
+        
+        # Prompts de sessões concorrentes são gerados juntos em lotes
+        self.generation_batcher = MicroBatcher(
+            self._gerar_lote,
+            max_itens=getattr(settings, "NLP_GERACAO_LOTE_MAX", 8),
+            max_espera=getattr(settings, "NLP_GERACAO_LOTE_ESPERA_MS", 20) / 1000.0,
+            workers=getattr(settings, "NLP_GERACAO_WORKERS", 2),
+            nome="geracao.lote"
+        )
         
         # Mapeamento de intenções e palavras-chave
         self.intent_keywords = {
@@ -39,6 +166,68 @@ class NLPProcessor:
             "historico": ["histórico", "transações", "pagamentos", "compras"],
             "cancelamento": ["cancelar", "cancelamento", "desistir"]
         }
+        
+        # Reconhecedor compilado a partir das palavras-chave acima
+        self.intent_matcher = IntentMatcher(self.intent_keywords, self.normalizar_texto)
+    
+    def atualizar_palavras_chave(self, intent_keywords):
+        """
+        Substitui o mapeamento de intenções e recompila o reconhecedor.
+        
+        Args:
+            intent_keywords (dict): Mapeamento intenção -> lista de palavras-chave
+        """
+        self.intent_matcher.atualizar(intent_keywords)
+        self.intent_keywords = intent_keywords
+        self.limpar_cache()
+    
+    def limpar_cache(self):
+        """Descarta as análises em cache, por exemplo após mudar a configuração de intenções."""
+        self.cache.clear()
+    
+    @property
+    def nlp(self):
+        """Modelo do spaCy, ou None enquanto estiver sendo carregado."""
+        return self.registry.get("spacy", block=False)
+    
+    @property
+    def stop_words(self):
+        """Stopwords em português, ou conjunto vazio enquanto estiverem sendo carregadas."""
+        return self.registry.get("stopwords", block=False) or set()
+    
+    @property
+    def classificador(self):
+        """
+        Classificador de intenções treinado, ou None se indisponível.
+        
+        Quando o registro passa a entregar outro classificador (o primeiro
+        carregamento ou uma recarga), as análises em cache, feitas sem ele,
+        são descartadas.
+        """
+        if not self._classificador_configurado:
+            return None
+        classificador = self.registry.get("classificador", block=False)
+        if classificador is not self._classificador_em_uso:
+            self._classificador_em_uso = classificador
+            self.limpar_cache()
+        return classificador
+    
+    @property
+    def generator(self):
+        """Pipeline de geração de texto, ou None enquanto estiver sendo carregado."""
+        return self.registry.get("gerador", block=False)
+    
+    def tokenizar(self, texto):
+        """
+        Divide o texto em tokens.
+        
+        Args:
+            texto (str): Texto normalizado
+            
+        Returns:
+            list: Tokens do texto
+        """
+        return text_normalizer.tokenizar(texto)
     
     def normalizar_texto(self, texto):
         """
@@ -50,83 +239,163 @@ class NLPProcessor:
         Returns:
             str: Texto normalizado
         """
-        texto = texto.replace("PIX", "pix")
-        texto = unicodedata.normalize('NFKD', texto)
-        texto = "".join([c for c in texto if not unicodedata.combining(c)])
-        return texto.lower()
+        return text_normalizer.normalizar_texto(texto)
+    
+    def analisar_texto(self, texto):
+        """
+        Normaliza e tokeniza a mensagem uma única vez para todas as etapas seguintes.
+        
+        Args:
+            texto (str): Texto do usuário
+            
+        Returns:
+            MensagemAnalisada: Texto original, normalizado, tokens e tokens sem stopwords
+        """
+        return text_normalizer.analisar_texto(texto, self.stop_words)
     
-    def extrair_palavras_chave(self, texto):
+    def extrair_palavras_chave(self, texto, analise=None):
         """
         Extrai palavras-chave, plano e tipo de informação do texto do usuário.
         
         Args:
             texto (str): Texto do usuário
+            analise (MensagemAnalisada, optional): Mensagem já normalizada e tokenizada
             
         Returns:
             tuple: (plano, tipo_informacao, palavras_chave)
         """
-        texto_normalizado = self.normalizar_texto(texto)
-        tokens = nltk.word_tokenize(texto_normalizado)
-        tokens_limpos = [word for word in tokens if word not in self.stop_words]
+        if analise is None:
+            analise = self.analisar_texto(texto)
+        tokens_limpos = analise.tokens_limpos
+
+        nlp = self.nlp
+        if nlp is None:
+            # Modelo ainda carregando: usar apenas as palavras do texto
+            palavras_chave = set(tokens_limpos)
+        else:
+            palavras_chave = self._palavras_chave_doc(nlp(" ".join(tokens_limpos)))
 
-        doc = self.nlp(" ".join(tokens_limpos))
-        palavras_chave = {token.lemma_ for token in doc if token.pos_ in ["NOUN", "VERB", "ADJ"]}
+        return self._classificar_palavras_chave(palavras_chave, tokens_limpos)
+    
+    def extrair_palavras_chave_lote(self, textos, batch_size=None, n_process=None):
+        """
+        Extrai palavras-chave de vários textos de uma vez usando `nlp.pipe`.
+        
+        Args:
+            textos (list): Textos dos usuários
+            batch_size (int, optional): Quantidade de textos por lote do spaCy
+            n_process (int, optional): Número de processos usados pelo spaCy
+            
+        Returns:
+            list: Lista de tuplas (plano, tipo_informacao, palavras_chave), na ordem dos textos
+        """
+        if batch_size is None:
+            batch_size = getattr(settings, "NLP_SPACY_BATCH_SIZE", 64)
+        if n_process is None:
+            n_process = getattr(settings, "NLP_SPACY_N_PROCESS", 1)
+        
+        lista_tokens = [self.analisar_texto(texto).tokens_limpos for texto in textos]
 
+        nlp = self.nlp
+        if nlp is None:
+            lista_palavras = [set(tokens) for tokens in lista_tokens]
+        else:
+            docs = nlp.pipe(
+                (" ".join(tokens) for tokens in lista_tokens),
+                batch_size=batch_size,
+                n_process=n_process
+            )
+            lista_palavras = [self._palavras_chave_doc(doc) for doc in docs]
+        
+        return [
+            self._classificar_palavras_chave(palavras_chave, tokens)
+            for palavras_chave, tokens in zip(lista_palavras, lista_tokens)
+        ]
+    
+    def _palavras_chave_doc(self, doc):
+        """Extrai os lemas de substantivos, verbos e adjetivos de um documento do spaCy."""
+        return {token.lemma_ for token in doc if token.pos_ in ["NOUN", "VERB", "ADJ"]}
+    
+    def _classificar_palavras_chave(self, palavras_chave, tokens_limpos):
+        """
+        Identifica plano e tipo de informação a partir das palavras-chave.
+        
+        Args:
+            palavras_chave (set): Palavras-chave extraídas
+            tokens_limpos (list): Tokens do texto sem stopwords
+            
+        Returns:
+            tuple: (plano, tipo_informacao, palavras_chave)
+        """
         if 'pix' in tokens_limpos:
             palavras_chave.add('pix')
 
         plano, tipo_informacao = None, None
         
+        # Comparar também as formas no singular ("benefícios" -> "beneficio")
+        termos = palavras_chave | {text_normalizer.singularizar(palavra) for palavra in palavras_chave}
+        
         # Identificar plano mencionado
-        if "basico" in palavras_chave:
+        if "basico" in termos:
             plano = "basico"
-        elif "premium" in palavras_chave:
+        elif "premium" in termos:
             plano = "premium"
         
         # Identificar tipo de informação solicitada
-        if "preco" in palavras_chave or "valor" in palavras_chave:
+        if "preco" in termos or "valor" in termos:
             tipo_informacao = "preço"
-        elif any(kw in palavras_chave for kw in ["beneficio", "vantagem", "oferece", "oferecer"]):
+        elif any(kw in termos for kw in ["beneficio", "vantagem", "oferece", "oferecer"]):
             tipo_informacao = "benefícios"
-        elif "descricao" in palavras_chave or "informacao" in palavras_chave:
+        elif "descricao" in termos or "informacao" in termos:
             tipo_informacao = "descrição"
-        elif "pagamento" in palavras_chave or "forma de pagamento" in palavras_chave:
+        elif "pagamento" in termos or "forma de pagamento" in termos:
             tipo_informacao = "pagamento"
-        elif "pix" in palavras_chave:
+        elif "pix" in termos:
             tipo_informacao = "prosseguir_pagamento_pix"
-        elif "boleto" in palavras_chave:
+        elif "boleto" in termos:
             tipo_informacao = "prosseguir_pagamento_boleto"
-        elif "cartao" in palavras_chave or "cartão" in palavras_chave:
+        elif "cartao" in termos or "cartão" in termos:
             tipo_informacao = "prosseguir_pagamento_cartao"
-        elif "assinar" in palavras_chave:
+        elif "assinar" in termos:
             tipo_informacao = "assinatura"
-        elif "cancelar" in palavras_chave:
+        elif "cancelar" in termos:
             tipo_informacao = "cancelamento"
         elif any(kw in palavras_chave for kw in ["planos", "disponivel", "existem"]):
             tipo_informacao = "planos_disponiveis"
             
         return plano, tipo_informacao, palavras_chave
     
-    def identificar_intencao(self, texto, palavras_chave=None):
+    def identificar_intencao(self, texto, palavras_chave=None, analise=None):
         """
         Identifica a intenção principal do usuário com base no texto.
         
         Args:
             texto (str): Texto do usuário
             palavras_chave (set, optional): Conjunto de palavras-chave já extraídas
+            analise (MensagemAnalisada, optional): Mensagem já normalizada e tokenizada
             
         Returns:
             str: Intenção identificada
         """
-        texto_normalizado = self.normalizar_texto(texto)
+        texto_normalizado = analise.normalizado if analise else self.normalizar_texto(texto)
         
-        if palavras_chave is None:
-            _, _, palavras_chave = self.extrair_palavras_chave(texto)
+        # Buscar todas as intenções em uma única passada pelo texto
+        intencoes = self.intent_matcher.intencoes(texto_normalizado)
+        return self._intencao_principal(texto_normalizado, intencoes)
+    
+    def _intencao_principal(self, texto_normalizado, intencoes):
+        """
+        Escolhe a intenção principal entre as encontradas pelo reconhecedor.
         
-        # Verificar cada intenção por correspondência de palavras-chave
-        for intent, keywords in self.intent_keywords.items():
-            if any(keyword in texto_normalizado for keyword in keywords):
-                return intent
+        Args:
+            texto_normalizado (str): Texto normalizado
+            intencoes (list): Intenções encontradas, por ordem de prioridade
+            
+        Returns:
+            str: Intenção identificada
+        """
+        if intencoes:
+            return intencoes[0]
                 
         # Verificar menções específicas a métodos de pagamento
         if "pix" in texto_normalizado:
@@ -153,28 +422,309 @@ class NLPProcessor:
         nome = contexto.get("nome", "Usuário")
         prompt = f"{nome} perguntou: '{entrada_usuario}'"
         
-        # Gerar resposta com o modelo
-        resposta_gerada = self.generator(
-            prompt, 
+        if self.inference_client is not None:
+            # O servidor de inferência agrupa os prompts de todos os workers
+            return self.generation_pool.run(
+                self._gerar_remoto, prompt, fallback=MENSAGEM_SOBRECARGA
+            )
+        
+        generator = self.generator
+        if generator is None:
+            return MENSAGEM_AQUECIMENTO
+        
+        # Gerar fora da thread da requisição, em lote, com prazo e limite de fila
+        return self.generation_pool.run_batched(
+            self.generation_batcher, prompt, fallback=MENSAGEM_SOBRECARGA
+        )
+    
+    def gerar_resposta_texto_stream(self, contexto, entrada_usuario):
+        """
+        Gera uma resposta personalizada entregando o texto à medida que é produzido.
+        
+        A geração roda no pool de geração; esta função apenas consome os
+        trechos decodificados. Se o consumo termina antes da geração (prazo
+        esgotado ou cliente desconectado), a geração é interrompida no
+        próximo token. Sem o gerador local (servidor de inferência ou modelo
+        carregando), a resposta completa é entregue de uma vez.
+        
+        Args:
+            contexto (dict): Contexto da conversa
+            entrada_usuario (str): Texto do usuário
+            
+        Returns:
+            generator: Trechos da resposta gerada
+        """
+        if self.inference_client is not None:
+            yield self.gerar_resposta_texto(contexto, entrada_usuario)
+            return
+        
+        generator = self.generator
+        if generator is None:
+            yield MENSAGEM_AQUECIMENTO
+            return
+        
+        from transformers import TextIteratorStreamer
+        
+        nome = contexto.get("nome", "Usuário")
+        prompt = f"{nome} perguntou: '{entrada_usuario}'"
+        
+        # O prazo vale para a espera de cada trecho, não para a geração inteira
+        streamer = TextIteratorStreamer(
+            generator.tokenizer,
+            skip_prompt=True,
+            skip_special_tokens=True,
+            timeout=self.generation_pool.timeout
+        )
+        entradas = generator.tokenizer(prompt, return_tensors="pt")
+        parar = threading.Event()
+        future = self.generation_pool.submit(
+            generator.model.generate,
+            **entradas,
+            streamer=streamer,
+            stopping_criteria=criterio_parada(parar),
+            max_length=100,
+            do_sample=True,
+            temperature=0.7,
+            pad_token_id=generator.tokenizer.pad_token_id
+        )
+        if future is None:
+            yield MENSAGEM_SOBRECARGA
+            return
+        
+        try:
+            for trecho in streamer:
+                if trecho:
+                    yield trecho
+        except queue.Empty:
+            metrics.incr(f"{self.generation_pool.nome}.stream_prazo_esgotado")
+        finally:
+            # Sem efeito se a geração já terminou; senão ela para no próximo token
+            parar.set()
+            future.cancel()
+    
+    def _gerar_remoto(self, prompt):
+        """Gera a resposta no servidor de inferência."""
+        try:
+            return self.inference_client.gerar(prompt)
+        except InferenceUnavailable as e:
+            print(f"Erro no servidor de inferência: {e}")
+            return MENSAGEM_AQUECIMENTO
+    
+    def _gerar_lote(self, prompts):
+        """
+        Executa o modelo de geração para um lote de prompts de uma só vez.
+        
+        Args:
+            prompts (list): Prompts enviados ao modelo
+            
+        Returns:
+            list: Respostas geradas, na ordem dos prompts
+        """
+        generator = self.registry.get("gerador")
+        
+        # Gerar respostas com o modelo em um único passe preenchido
+        saidas = generator(
+            prompts,
             max_length=100,
             num_return_sequences=1,
-            temperature=0.7
-        )[0]["generated_text"]
+            temperature=0.7,
+            batch_size=len(prompts)
+        )
         
-        # Limpar a resposta para remover o prompt original
+        return [
+            self._limpar_resposta_gerada(prompt, saida[0]["generated_text"])
+            for prompt, saida in zip(prompts, saidas)
+        ]
+    
+    def _limpar_resposta_gerada(self, prompt, resposta_gerada):
+        """
+        Remove o prompt original do texto gerado.
+        
+        Args:
+            prompt (str): Prompt enviado ao modelo
+            resposta_gerada (str): Texto gerado pelo modelo
+            
+        Returns:
+            str: Resposta sem o prompt
+        """
         if prompt in resposta_gerada:
             resposta_limpa = resposta_gerada[len(prompt):].strip()
             return resposta_limpa
             
         return resposta_gerada
     
-    def processar_mensagem(self, texto, contexto=None):
+    def classificar(self, texto):
+        """
+        Classifica a mensagem em camadas.
+        
+        A camada léxica usa apenas o reconhecedor de palavras-chave e tokens
+        obtidos por expressão regular. A lematização do spaCy só é executada
+        quando essa camada é ambígua ou não encontra plano nem tipo de informação.
+        
+        O resultado independe do contexto da sessão e fica em cache, indexado
+        pelo texto normalizado.
+        
+        Args:
+            texto (str): Texto do usuário
+            
+        Returns:
+            dict: intencao, plano, tipo_informacao, palavras_chave e a camada que decidiu
+        """
+        # Normalização e tokenização únicas, compartilhadas por todas as camadas
+        analise_texto = self.analisar_texto(texto)
+        texto_normalizado = analise_texto.normalizado
+        
+        # Consultado antes do cache: a chegada do classificador invalida o que está nele
+        classificador = self.classificador
+        em_cache = self.cache.get(texto_normalizado)
+        if em_cache is not None:
+            return dict(em_cache, palavras_chave=set(em_cache["palavras_chave"]))
+        
+        intencoes = self.intent_matcher.intencoes(texto_normalizado)
+        intencao = self._intencao_principal(texto_normalizado, intencoes)
+        camada = CAMADA_LEXICA
+        
+        # Classificador treinado: desempata ou recupera intenções sem palavra-chave
+        if len(intencoes) != 1:
+            prevista = self._prever_intencao(texto, intencoes, classificador)
+            if prevista:
+                intencao = prevista
+                intencoes = [prevista]
+                camada = CAMADA_CLASSIFICADOR
+        
+        # Camada léxica: palavras do próprio texto, sem modelos
+        tokens_limpos = analise_texto.tokens_limpos
+        plano, tipo_informacao, palavras_chave = self._classificar_palavras_chave(
+            set(tokens_limpos), tokens_limpos
+        )
+        confiante = self._camada_lexica_confiante(intencoes, plano, tipo_informacao, analise_texto)
+        
+        if not confiante:
+            # Camada do spaCy: lemas podem revelar plano ou tipo de informação
+            resultado_spacy = self._extrair_com_spacy(texto, analise_texto)
+            if resultado_spacy is not None:
+                plano, tipo_informacao, palavras_chave = resultado_spacy
+                camada = CAMADA_SPACY
+        
+        analise = {
+            "intencao": intencao,
+            "plano": plano,
+            "tipo_informacao": tipo_informacao,
+            "palavras_chave": palavras_chave,
+            "camada": camada
+        }
+        
+        # Não guardar resultados degradados enquanto o spaCy ainda carrega
+        if confiante or camada == CAMADA_SPACY:
+            self.cache.set(texto_normalizado, dict(analise, palavras_chave=frozenset(palavras_chave)))
+        
+        return analise
+    
+    def _extrair_com_spacy(self, texto, analise_texto):
+        """
+        Executa a camada do spaCy localmente ou no servidor de inferência.
+        
+        Args:
+            texto (str): Texto do usuário
+            analise_texto (MensagemAnalisada): Mensagem já normalizada e tokenizada
+            
+        Returns:
+            tuple: (plano, tipo_informacao, palavras_chave), ou None se o modelo estiver indisponível
+        """
+        if self.inference_client is not None:
+            try:
+                return self.inference_client.extrair_palavras_chave(texto)
+            except InferenceUnavailable as e:
+                print(f"Erro no servidor de inferência: {e}")
+                return None
+        
+        if self.nlp is None:
+            return None
+        return self.extrair_palavras_chave(texto, analise_texto)
+    
+    def _prever_intencao(self, texto, intencoes, classificador):
+        """
+        Consulta o classificador treinado quando as palavras-chave não bastam.
+        
+        Args:
+            texto (str): Texto do usuário
+            intencoes (list): Intenções encontradas pelas palavras-chave
+            classificador (IntentClassifier): Classificador em uso, ou None
+            
+        Returns:
+            str: Intenção prevista com confiança suficiente, ou None
+        """
+        if classificador is None:
+            return None
+        
+        intencao, probabilidade = classificador.prever(texto)
+        if intencao == "desconhecido" or probabilidade < getattr(settings, "NLP_CLASSIFICADOR_LIMIAR", 0.6):
+            return None
+        # Havendo palavras-chave, o classificador apenas escolhe entre elas
+        if intencoes and intencao not in intencoes:
+            return None
+        return intencao
+    
+    def prever_intencoes_lote(self, textos):
+        """
+        Identifica a intenção de vários textos com uma única inferência vetorizada.
+        
+        Usa o classificador treinado quando disponível e as palavras-chave
+        para os textos em que ele não tem confiança suficiente.
+        
+        Args:
+            textos (list): Textos dos usuários
+            
+        Returns:
+            list: Intenções, na ordem dos textos
+        """
+        intencoes = [self.identificar_intencao(texto) for texto in textos]
+        classificador = self.classificador
+        if classificador is None:
+            return intencoes
+        
+        limiar = getattr(settings, "NLP_CLASSIFICADOR_LIMIAR", 0.6)
+        for i, (prevista, probabilidade) in enumerate(classificador.prever_lote(textos)):
+            if prevista != "desconhecido" and probabilidade >= limiar:
+                intencoes[i] = prevista
+        return intencoes
+    
+    def _camada_lexica_confiante(self, intencoes, plano, tipo_informacao, analise_texto):
+        """
+        Decide se o resultado da camada léxica dispensa a lematização.
+        
+        Um plano sozinho só basta quando a mensagem não é uma pergunta: em
+        "quais os benefícios do plano premium?" falta o tipo de informação.
+        
+        Args:
+            intencoes (list): Intenções encontradas pelo reconhecedor
+            plano (str): Plano identificado
+            tipo_informacao (str): Tipo de informação identificado
+            analise_texto (MensagemAnalisada): Mensagem já normalizada e tokenizada
+            
+        Returns:
+            bool: True se o resultado léxico for suficiente
+        """
+        if tipo_informacao:
+            return True
+        if plano:
+            return not self._e_pergunta(analise_texto)
+        return len(intencoes) == 1 and intencoes[0] not in INTENCOES_COM_ENTIDADES
+    
+    @staticmethod
+    def _e_pergunta(analise_texto):
+        """Indica se a mensagem pede alguma informação (interrogação ou pronome interrogativo)."""
+        return "?" in analise_texto.texto or not PALAVRAS_INTERROGATIVAS.isdisjoint(analise_texto.tokens)
+    
+    def processar_mensagem(self, texto, contexto=None, analise=None):
         """
         Processa uma mensagem do usuário e extrai informações relevantes.
         
         Args:
             texto (str): Texto do usuário
             contexto (dict, optional): Contexto da conversa
+            analise (dict, optional): Resultado de `classificar(texto)` já calculado
+                por quem chamou (ex.: fora da thread que acessa o banco)
             
         Returns:
             dict: Informações extraídas da mensagem
@@ -182,11 +732,10 @@ class NLPProcessor:
         if contexto is None:
             contexto = {}
             
-        # Extrair palavras-chave, plano e tipo de informação
-        plano, tipo_informacao, palavras_chave = self.extrair_palavras_chave(texto)
-        
-        # Identificar intenção
-        intencao = self.identificar_intencao(texto, palavras_chave)
+        # Classificar a mensagem começando pela camada mais barata
+        if analise is None:
+            analise = self.classificar(texto)
+        plano = analise["plano"]
         
         # Registrar entrada atual no contexto
         contexto["entrada_atual"] = texto
@@ -197,9 +746,10 @@ class NLPProcessor:
             
         return {
             "texto": texto,
-            "intencao": intencao,
+            "intencao": analise["intencao"],
             "plano": plano,
-            "tipo_informacao": tipo_informacao,
-            "palavras_chave": palavras_chave,
+            "tipo_informacao": analise["tipo_informacao"],
+            "palavras_chave": analise["palavras_chave"],
+            "camada": analise["camada"],
             "contexto": contexto
         }
@@ -0,0 +1,171 @@
+"""
+Validadores dos campos (slots) do fluxo de pagamento com cartão do Assistente Virtual de Pagamentos.
+Cada validador recebe a resposta do usuário e devolve o valor normalizado, ou None se for inválido.
+"""
+
+import re
+from collections import namedtuple
+from datetime import date
+
+# Separadores aceitos entre grupos de dígitos (espaços, pontos, hífens e barras)
+_SEPARADORES_RE = re.compile(r"[\s.\-/]+")
+_DIGITOS_RE = re.compile(r"\d+")
+_VALIDADE_RE = re.compile(r"(\d{1,2})\s*[/\-.\s]?\s*(\d{2}|\d{4})")
+_CVV_RE = re.compile(r"\d{3,4}")
+_NOME_RE = re.compile(r"[^\W\d_]+(?:['\-][^\W\d_]+)*(?:\s+[^\W\d_]+(?:['\-][^\W\d_]+)*)+")
+
+
+def _digitos(texto):
+    """Remove os separadores; devolve None se sobrar algo além de dígitos."""
+    digitos = _SEPARADORES_RE.sub("", texto or "")
+    return digitos if _DIGITOS_RE.fullmatch(digitos) else None
+
+
+def luhn_valido(digitos):
+    """
+    Verifica o dígito verificador de Luhn.
+
+    Args:
+        digitos (str): Sequência de dígitos
+
+    Returns:
+        bool: True se a soma de Luhn for múltipla de 10
+    """
+    soma = 0
+    for posicao, caractere in enumerate(reversed(digitos)):
+        valor = ord(caractere) - 48
+        if posicao % 2:
+            valor *= 2
+            if valor > 9:
+                valor -= 9
+        soma += valor
+    return soma % 10 == 0
+
+
+def validar_numero_cartao(texto):
+    """
+    Valida o número do cartão (13 a 19 dígitos com dígito de Luhn).
+
+    Args:
+        texto (str): Resposta do usuário
+
+    Returns:
+        str: Dígitos do cartão, ou None se inválido
+    """
+    digitos = _digitos(texto)
+    if digitos is None or not 13 <= len(digitos) <= 19 or not luhn_valido(digitos):
+        return None
+    return digitos
+
+
+def validar_validade(texto, hoje=None):
+    """
+    Valida a validade no formato MM/AA (também aceita MM/AAAA e MMAA).
+
+    O cartão vale até o último dia do mês informado.
+
+    Args:
+        texto (str): Resposta do usuário
+        hoje (date, optional): Data de referência; por padrão, a atual
+
+    Returns:
+        str: Validade como MM/AA, ou None se inválida ou vencida
+    """
+    correspondencia = _VALIDADE_RE.fullmatch((texto or "").strip())
+    if correspondencia is None:
+        return None
+
+    mes = int(correspondencia.group(1))
+    ano = int(correspondencia.group(2)) % 100
+    if not 1 <= mes <= 12:
+        return None
+
+    hoje = hoje or date.today()
+    if (2000 + ano, mes) < (hoje.year, hoje.month):
+        return None
+    return f"{mes:02d}/{ano:02d}"
+
+
+def validar_cvv(texto):
+    """
+    Valida o código de segurança (3 ou 4 dígitos).
+
+    Args:
+        texto (str): Resposta do usuário
+
+    Returns:
+        str: CVV, ou None se inválido
+    """
+    cvv = (texto or "").strip()
+    return cvv if _CVV_RE.fullmatch(cvv) else None
+
+
+def validar_nome_cartao(texto):
+    """
+    Valida o nome impresso no cartão (ao menos nome e sobrenome, só letras).
+
+    Args:
+        texto (str): Resposta do usuário
+
+    Returns:
+        str: Nome em maiúsculas com espaços simples, ou None se inválido
+    """
+    nome = " ".join((texto or "").split())
+    if len(nome) > 26 or not _NOME_RE.fullmatch(nome):
+        return None
+    return nome.upper()
+
+
+def validar_cpf(texto):
+    """
+    Valida o CPF pelos dois dígitos verificadores.
+
+    Args:
+        texto (str): Resposta do usuário
+
+    Returns:
+        str: Os 11 dígitos do CPF, ou None se inválido
+    """
+    cpf = _digitos(texto)
+    if cpf is None or len(cpf) != 11 or cpf == cpf[0] * 11:
+        return None
+
+    numeros = [ord(caractere) - 48 for caractere in cpf]
+    for tamanho in (9, 10):
+        soma = sum(numero * peso for numero, peso in zip(numeros, range(tamanho + 1, 1, -1)))
+        digito = soma * 10 % 11 % 10
+        if digito != numeros[tamanho]:
+            return None
+    return cpf
+
+
+# Slots do fluxo de cartão, na ordem em que são pedidos (a etapa N preenche SLOTS_CARTAO[N - 1])
+SlotCartao = namedtuple("SlotCartao", "campo validador pergunta erro")
+
+SLOTS_CARTAO = (
+    SlotCartao(
+        "numero_cartao", validar_numero_cartao,
+        "por favor, insira o número do cartão.",
+        "o número do cartão informado não é válido."
+    ),
+    SlotCartao(
+        "validade", validar_validade,
+        "agora, informe a validade (MM/AA).",
+        "a validade deve estar no formato MM/AA e o cartão não pode estar vencido."
+    ),
+    SlotCartao(
+        "cvv", validar_cvv,
+        "insira o CVV do cartão.",
+        "o CVV deve ter 3 ou 4 dígitos."
+    ),
+    SlotCartao(
+        "nome_cartao", validar_nome_cartao,
+        "informe o nome que está no cartão.",
+        "informe o nome completo, como impresso no cartão."
+    ),
+    SlotCartao(
+        "cpf", validar_cpf,
+        "por fim, informe o CPF.",
+        "o CPF informado não é válido."
+    ),
+)
@@ -0,0 +1,119 @@
+"""
+Normalização e tokenização de texto para o Assistente Virtual de Pagamentos.
+Executa em uma única passada o trabalho compartilhado por todas as etapas de NLP.
+"""
+
+import re
+import unicodedata
+from collections import namedtuple
+
+# Mensagem já normalizada e tokenizada, reutilizada por todas as etapas de NLP
+MensagemAnalisada = namedtuple("MensagemAnalisada", ["texto", "normalizado", "tokens", "tokens_limpos"])
+
+# Tokenizador de palavras usado no caminho principal
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _remover_acentos_lento(texto):
+    """Remove acentos caractere a caractere via decomposição NFKD."""
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def _montar_tabela_acentos():
+    """Pré-calcula a tabela de tradução para os caracteres latinos acentuados."""
+    tabela = {}
+    for codigo in range(0x00C0, 0x0250):
+        caractere = chr(codigo)
+        sem_acento = _remover_acentos_lento(caractere)
+        if sem_acento != caractere:
+            tabela[caractere] = sem_acento
+    return tabela
+
+
+_TABELA_ACENTOS = _montar_tabela_acentos()
+
+# Localiza apenas os caracteres presentes na tabela; o restante do texto é copiado
+# sem consulta, o que é mais rápido que `str.translate` com um dicionário
+_ACENTOS_RE = re.compile("[" + "".join(_TABELA_ACENTOS) + "]")
+
+
+def _traduzir_acento(match):
+    """Substitui um caractere acentuado pela sua versão sem acento."""
+    return _TABELA_ACENTOS[match.group()]
+
+
+def normalizar_texto(texto):
+    """
+    Remove acentos e converte o texto para minúsculas.
+
+    Textos só com ASCII são apenas convertidos para minúsculas. Os caracteres
+    latinos acentuados são traduzidos por uma tabela pré-calculada; a
+    decomposição NFKD só é usada se ainda restarem caracteres fora do ASCII.
+
+    Args:
+        texto (str): Texto original
+
+    Returns:
+        str: Texto normalizado
+    """
+    if not texto.isascii():
+        texto = _ACENTOS_RE.sub(_traduzir_acento, texto)
+        if not texto.isascii():
+            texto = _remover_acentos_lento(texto)
+    return texto.lower()
+
+
+def singularizar(token):
+    """
+    Reduz um token normalizado (sem acentos) ao singular por regras simples do português.
+
+    Cobre os plurais do vocabulário do assistente (benefícios, vantagens,
+    valores, preços, informações, cartões); palavras já no singular voltam
+    inalteradas.
+
+    Args:
+        token (str): Token normalizado
+
+    Returns:
+        str: Forma singular aproximada
+    """
+    if len(token) <= 3 or not token.endswith("s"):
+        return token
+    if token.endswith(("oes", "aes")):
+        return token[:-3] + "ao"
+    if token.endswith("ns"):
+        return token[:-2] + "m"
+    if token.endswith(("res", "zes")):
+        return token[:-2]
+    return token[:-1]
+
+
+def tokenizar(texto):
+    """
+    Divide o texto em palavras usando uma expressão regular compilada.
+
+    Args:
+        texto (str): Texto normalizado
+
+    Returns:
+        list: Tokens do texto
+    """
+    return _TOKEN_RE.findall(texto)
+
+
+def analisar_texto(texto, stop_words=frozenset()):
+    """
+    Normaliza e tokeniza a mensagem uma única vez.
+
+    Args:
+        texto (str): Texto original do usuário
+        stop_words (set, optional): Palavras removidas de `tokens_limpos`
+
+    Returns:
+        MensagemAnalisada: Texto original, normalizado, tokens e tokens sem stopwords
+    """
+    normalizado = normalizar_texto(texto)
+    tokens = _TOKEN_RE.findall(normalizado)
+    tokens_limpos = [token for token in tokens if token not in stop_words]
+    return MensagemAnalisada(texto, normalizado, tokens, tokens_limpos)
@@ -6,7 +6,10 @@ Responsável por renderizar templates e coordenar a interação com o usuário.
 from django.shortcuts import render
 from django.http import JsonResponse
 from .api.chat_api import chatbot_response as api_chatbot_response
+from .api.chat_api import chatbot_response_async as api_chatbot_response_async
+from .api.chat_api import chatbot_response_stream as api_chatbot_response_stream
 from .api.chat_api import process_payment as api_process_payment
+from .api.chat_api import metricas as api_metricas
 
 def inicial_view(request):
     """
@@ -63,6 +66,32 @@ def chatbot_response(request):
     """
     return api_chatbot_response(request)
 
+async def chatbot_response_async(request):
+    """
+    View assíncrona para processar mensagens do chatbot sob ASGI.
+    Delega para a API correspondente.
+    
+    Args:
+        request: Requisição HTTP
+        
+    Returns:
+        JsonResponse: Resposta do assistente
+    """
+    return await api_chatbot_response_async(request)
+
+def chatbot_response_stream(request):
+    """
+    View para processar mensagens do chatbot com resposta em fluxo (SSE).
+    Delega para a API correspondente.
+    
+    Args:
+        request: Requisição HTTP
+        
+    Returns:
+        StreamingHttpResponse: Eventos da resposta do assistente
+    """
+    return api_chatbot_response_stream(request)
+
 def process_payment(request):
     """
     View para processar pagamentos.
@@ -75,3 +104,16 @@ def process_payment(request):
         JsonResponse: Resultado do processamento
     """
     return api_process_payment(request)
+
+def metricas(request):
+    """
+    View para consultar as métricas do processo.
+    Delega para a API correspondente.
+    
+    Args:
+        request: Requisição HTTP
+        
+    Returns:
+        JsonResponse: Métricas do processo
+    """
+    return api_metricas(request)
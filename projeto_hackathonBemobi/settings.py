@@ -90,6 +90,141 @@ TEMPLATES = [
     },
 ]
 
+# Carregar os modelos de NLP em segundo plano assim que o processo iniciar.
+# Desativado por padrão: os modelos são carregados na primeira mensagem do chat.
+NLP_WARMUP_ON_STARTUP = os.environ.get('NLP_WARMUP_ON_STARTUP', '') == '1'
+
+# Modelo do spaCy e componentes carregados (os demais são excluídos)
+NLP_SPACY_MODEL = 'pt_core_news_lg'
+NLP_SPACY_COMPONENTES = ['tok2vec', 'tagger', 'morphologizer', 'attribute_ruler', 'lemmatizer']
+
+# Parâmetros do processamento em lote com nlp.pipe
+NLP_SPACY_BATCH_SIZE = 64
+NLP_SPACY_N_PROCESS = 1
+
+# Cache das análises de mensagens (entradas e tempo de vida em segundos)
+NLP_CACHE_MAXSIZE = 2048
+NLP_CACHE_TTL = 600
+
+# Classificador de intenções treinado com `manage.py treinar_classificador`
+# e probabilidade mínima para que sua previsão seja usada
+NLP_CLASSIFICADOR_PATH = os.path.join(BASE_DIR, 'modelos', 'classificador_intencoes.npz')
+NLP_CLASSIFICADOR_LIMIAR = 0.6
+
+# Geração de texto: threads dedicadas, gerações em espera e prazo em segundos
+NLP_GERACAO_WORKERS = 2
+NLP_GERACAO_FILA = 8
+NLP_GERACAO_TIMEOUT = 8.0
+
+# Servidor de inferência compartilhado (`manage.py servidor_nlp`). Quando
+# configurado, os workers não carregam spaCy nem o gerador de texto. O servidor
+# aplica NLP_GERACAO_TIMEOUT a cada requisição; o prazo dos workers
+# (NLP_INFERENCE_TIMEOUT) deve ser maior, para que recebam o erro do servidor.
+NLP_INFERENCE_SOCKET = os.environ.get('NLP_INFERENCE_SOCKET') or None
+NLP_INFERENCE_TIMEOUT = 10.0
+
+# Micro-lotes de geração: prompts por lote e espera máxima para completá-lo (ms)
+NLP_GERACAO_LOTE_MAX = 8
+NLP_GERACAO_LOTE_ESPERA_MS = 20
+
+# Cliente HTTP da API de LLM: conexões mantidas por host, prazos de conexão e
+# de leitura (s), repetições de falhas transitórias e tempo máximo gasto com elas (s)
+LLM_HTTP_POOL_MAXSIZE = 32
+LLM_HTTP_CONNECT_TIMEOUT = 3.05
+LLM_HTTP_READ_TIMEOUT = 30.0
+LLM_HTTP_MAX_RETENTATIVAS = 2
+LLM_HTTP_BACKOFF_BASE = 0.2
+LLM_HTTP_BACKOFF_MAX = 2.0
+LLM_HTTP_ORCAMENTO_RETENTATIVAS = 5.0
+
+# Disjuntor da API de LLM: janela (s) e chamadas mínimas para avaliar as taxas,
+# fração de erros ou de chamadas lentas (acima do limite em s) que o abre,
+# tempo aberto (s) e sondas bem-sucedidas necessárias para fechá-lo
+LLM_CIRCUITO_JANELA = 30.0
+LLM_CIRCUITO_MIN_CHAMADAS = 10
+LLM_CIRCUITO_LIMIAR_ERROS = 0.5
+LLM_CIRCUITO_LIMITE_LENTIDAO = 10.0
+LLM_CIRCUITO_LIMIAR_LENTIDAO = 0.8
+LLM_CIRCUITO_TEMPO_ABERTO = 15.0
+LLM_CIRCUITO_SONDAS = 2
+
+# Cache das análises da API de LLM: respostas guardadas, tempo de vida (s) e
+# similaridade MinHash mínima para reaproveitar a resposta de uma pergunta
+# parecida (None desativa). O cache é esvaziado quando `data.planos` muda,
+# o que é verificado no máximo a cada LLM_CACHE_INTERVALO_VERSAO segundos.
+LLM_CACHE_MAXSIZE = 1024
+LLM_CACHE_TTL = 600
+LLM_CACHE_LIMIAR_SIMILARIDADE = 0.8
+LLM_CACHE_PERMUTACOES = 64
+LLM_CACHE_INTERVALO_VERSAO = 5.0
+
+# Orçamento de tokens dos prompts enviados ao LLM; o histórico que não couber é resumido
+LLM_PROMPT_ORCAMENTO_TOKENS = 1200
+LLM_PROMPT_MAX_HISTORICO = 5
+LLM_PROMPT_RESUMO_MAX_TOKENS = 120
+
+# Endpoints equivalentes da API de LLM (vazio: usa apenas LLM_API_URL). O roteador
+# escolhe pela latência média (EWMA) e suspende endpoints após falhas seguidas;
+# com o hedging ativo, duplica em outro endpoint a requisição que passar do percentil
+LLM_API_URLS = []
+LLM_ROTEADOR_ALFA = 0.3
+LLM_ROTEADOR_MAX_FALHAS = 3
+LLM_ROTEADOR_TEMPO_SUSPENSAO = 30.0
+LLM_ROTEADOR_HEDGE = False
+LLM_ROTEADOR_HEDGE_PERCENTIL = 95
+LLM_ROTEADOR_HEDGE_MIN_AMOSTRAS = 20
+LLM_ROTEADOR_HEDGE_ATRASO_MINIMO = 0.05
+LLM_ROTEADOR_HEDGE_WORKERS = 16
+
+# Modo sombra: fração das mensagens também analisada pelo processador de LLM em
+# segundo plano (0 desativa), amostras aguardando na fila e preço de mil tokens
+# de prompt para a estimativa de custo. Relatório: manage.py relatorio_shadow
+LLM_SHADOW_TAXA = 0.0
+LLM_SHADOW_FILA = 100
+LLM_SHADOW_CUSTO_1K_TOKENS = 0.0015
+
+# Regras do modo degradado do LLM: arquivo JSON no formato de
+# integrations.fallback_rules.REGRAS_PADRAO (None usa a tabela padrão) e
+# intervalo (s) entre verificações de mudança no arquivo ou em data.planos
+LLM_FALLBACK_REGRAS_PATH = None
+LLM_FALLBACK_INTERVALO_RECARGA = 5.0
+
+# Contexto das sessões do assistente: número máximo de sessões, segundos sem
+# acesso até expirar e tamanho aproximado máximo em bytes (None não limita)
+SESSOES_MAX_ENTRADAS = 10000
+SESSOES_TTL = 1800.0
+SESSOES_MAX_BYTES = None
+
+# Sessões em memória divididas em shards com locks independentes (os limites
+# acima são repartidos entre eles) e listras do registro de locks por sessão
+SESSOES_SHARDS = 16
+SESSOES_LOCK_LISTRAS = 64
+
+# Onde o contexto das sessões é guardado: 'memoria' (apenas o processo atual),
+# 'banco' (tabela do Django) ou 'redis', os dois últimos compartilhados entre
+# processos com cache local. A cópia local é usada sem consultar o
+# armazenamento por SESSOES_CACHE_VALIDADE segundos; depois disso cada leitura
+# confirma só a versão. Uma cópia desatualizada não perde gravações: a
+# gravação é condicional e, havendo conflito, o turno é refeito com o contexto
+# recarregado. Com 0, toda leitura consulta a versão e os turnos refeitos são mais raros
+SESSOES_BACKEND = 'memoria'
+SESSOES_REDIS_URL = 'redis://localhost:6379/0'
+SESSOES_CACHE_VALIDADE = 2.0
+
+# Registros mantidos por sessão: turnos da conversa e pagamentos (os mais antigos são descartados)
+SESSOES_MAX_HISTORICO = 20
+SESSOES_MAX_PAGAMENTOS = 50
+
+# Dados do cartão entre os turnos do fluxo de pagamento: guardados no contexto só
+# cifrados (Fernet) com esta chave, a mesma em todos os workers (vazia: derivada da
+# SECRET_KEY), e descartados após CARTAO_DADOS_VALIDADE segundos sem concluir o fluxo
+CARTAO_CHAVE_CIFRA = os.environ.get('CARTAO_CHAVE_CIFRA') or None
+CARTAO_DADOS_VALIDADE = 600
+
+# Endpoint /api/metricas/: por padrão só usuários da equipe (is_staff) o consultam;
+# True o deixa aberto, por exemplo quando só é alcançável pela rede interna do coletor
+METRICAS_PUBLICAS = False
+
 # Configurações de envio de e-mails para o envio de boletos
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'  # Configuração para o Gmail